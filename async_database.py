@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+import asyncio, os, time
+from itertools import islice
+from pathlib import Path
+from typing import AsyncIterator, TYPE_CHECKING
+
+from database import (
+    Driver, ResultCache, _record_to_row, _default_path_msg,
+    _FINGERPRINT_CYPHER, _FINGERPRINT_TTL, _MARKS_CYPHER, _DEFAULT_BATCH_ROWS, _marks_in, page_key,
+)
+from sinks import TextSink, STRUCTURED_SINKS, STDOUT
+from util import greenify, handle_export, color_enabled
+from log import log_error, log_no_results, log_yellow
+import metrics
+
+if TYPE_CHECKING:
+    from jinja2 import Environment
+
+
+class _AsyncCountingIterator:
+    """Async twin of database._CountingIterator."""
+    def __init__(self, iterable):
+        self._it = iterable.__aiter__()
+        self.count = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self._it.__anext__()
+        self.count += 1
+        return item
+
+
+async def _asingle_value(result):
+    """Async `database._single_value`."""
+    record = await result.single()
+    return None if record is None else record["value"]
+
+
+class AsyncDriver(Driver):
+    """
+    Driver counterpart on `neo4j.AsyncGraphDatabase`.
+
+    Catalog, params, templates and the result cache are inherited from
+    Driver (cache entries are shared between the two); `run_query`,
+    `run_queries` and `run_queries_to_html` are coroutines that overlap
+    independent queries on one event loop instead of a thread per query.
+    The async neo4j driver is bound to the loop it was first used on, so
+    use one instance per `asyncio.run`, ideally as `async with`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._async_driver = None
+        self._afingerprint_lock: asyncio.Lock | None = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    @property
+    def async_driver(self):
+        """The async neo4j driver, connected on first use."""
+        if self._async_driver is None:
+            if self.offline:
+                raise RuntimeError("the async driver needs a Neo4j server; drop --async for offline graphs")
+            from neo4j import AsyncGraphDatabase
+            self._async_driver = AsyncGraphDatabase.driver(self.uri, auth=self._auth,
+                                                           **self._driver_kwargs)
+        return self._async_driver
+
+    async def aclose(self):
+        if self._async_driver is not None:
+            await self._async_driver.close()
+            self._async_driver = None
+        self._afingerprint_lock = None
+        self.close()
+
+    # --------------------------------------------------------------------- #
+    # rows
+    # --------------------------------------------------------------------- #
+    async def _aiter_rows(self, query_data: dict) -> AsyncIterator[dict]:
+        """Async `Driver._iter_rows`, same rows and same cache keys."""
+        cypher     = self._render_cypher_template(query_data)
+        parameters = self._query_parameters(cypher)
+        is_path    = self._is_path_query(query_data)
+        metrics.update(cypher=cypher)
+
+        key = None
+        if self.cache_enabled:
+            key = ResultCache.make_key(self.database, query_data.get("id"), cypher,
+                                       self._referenced_params(cypher), await self._agraph_fingerprint(),
+                                       await self._agraph_marks([cypher]))
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                metrics.update(cached=True)
+                for row in cached:
+                    yield row
+                return
+
+        rows = self._aiter_neo4j_rows(cypher, parameters, is_path,
+                                      query_data.get("fetch_size"))
+        if key:
+            rows = self.result_cache.arecord(key, rows)
+        async for row in rows:
+            yield row
+
+    async def _aiter_neo4j_rows(self, cypher: str, parameters: dict, is_path: bool,
+                                fetch_size: int | None = None) -> AsyncIterator[dict]:
+        if is_path and self.native_paths and not self.offline:
+            # the path engine is synchronous: step it on a worker thread a
+            # batch at a time so other queries keep running on the loop
+            rows = self._iter_neo4j_rows(cypher, parameters, is_path, fetch_size)
+            size = fetch_size or self.fetch_size or _DEFAULT_BATCH_ROWS
+            try:
+                while batch := await asyncio.to_thread(lambda: list(islice(rows, size))):
+                    for row in batch:
+                        yield row
+            finally:
+                rows.close()
+            return
+        # async sessions are never shared: concurrent queries need their own
+        async with self.async_driver.session(**self._session_config(fetch_size)) as session:
+            result = await session.run(cypher, parameters)
+            async for rec in result:
+                row = _record_to_row(rec, is_path)
+                if row is not None:
+                    yield row
+            metrics.note_summary(await result.consume())
+
+    async def _arow_batches(self, query_data: dict) -> AsyncIterator[list[dict]]:
+        size = query_data.get("fetch_size") or self.fetch_size or _DEFAULT_BATCH_ROWS
+        batch = []
+        async for row in self._aiter_rows(query_data):
+            batch.append(row)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _alock(self) -> asyncio.Lock:
+        # created lazily: an asyncio.Lock belongs to the loop it is first used on
+        if self._afingerprint_lock is None:
+            self._afingerprint_lock = asyncio.Lock()
+        return self._afingerprint_lock
+
+    async def _agraph_fingerprint(self) -> str:
+        """Async `Driver._graph_fingerprint`; one lookup shared by all tasks."""
+        async with self._alock():
+            now = time.monotonic()
+            if self._fingerprint and now - self._fingerprint[0] < _FINGERPRINT_TTL:
+                return self._fingerprint[1]
+            state = {}
+            async with self.async_driver.session(**self._session_config()) as session:
+                for name, cypher in _FINGERPRINT_CYPHER.items():
+                    state[name] = await _asingle_value(await session.run(cypher))
+            fingerprint = ResultCache.make_key(state)
+            self._fingerprint = (now, fingerprint)
+            return fingerprint
+
+    async def _agraph_marks(self, texts: list[str]) -> dict[str, str]:
+        """Async `Driver._graph_marks`."""
+        wanted = _marks_in(texts)
+        if not wanted:
+            return {}
+        async with self._alock():
+            digests = self._fresh_marks()
+            missing = [m for m in wanted if m not in digests]
+            if missing:
+                async with self.async_driver.session(**self._session_config()) as session:
+                    for mark in missing:
+                        ids = await _asingle_value(await session.run(_MARKS_CYPHER.format(mark))) or []
+                        digests[mark] = ResultCache.make_key(sorted(map(str, ids)))
+            return {m: digests[m] for m in wanted}
+
+    # --------------------------------------------------------------------- #
+    # single query
+    # --------------------------------------------------------------------- #
+    async def run_query(self, option: str, outfile: str, fmt: str = "text",
+                        fetch_size: int | None = None, echo: bool = True) -> int | None:
+        """
+        Async `Driver.run_query`. With `echo` off, text output goes to
+        `outfile` only, so concurrent queries do not interleave on screen.
+        """
+        try:
+            q = self.queries.get(option)
+            if not q:
+                log_error("Cypher does not exist!")
+                return None
+            if fetch_size:
+                q = {**q, "fetch_size": fetch_size}
+            with self.metrics.measure(q["id"], q["desc"], "export" if outfile else "run") as m:
+                if fmt in STRUCTURED_SINKS:
+                    m.rows = await self._aexport_structured(q, outfile, fmt)
+                else:
+                    m.rows = await self._ahandle_text(q, outfile, echo)
+            return m.rows
+        except Exception as e:
+            log_error(e)
+        return None
+
+    async def _ahandle_text(self, query_data: dict, outfile: str, echo: bool) -> int:
+        template = self._get_template(query_data, "msg")
+        colour = color_enabled() and not outfile
+        is_path = self._is_path_query(query_data)
+
+        count = 0
+        with TextSink(outfile, echo=echo) as sink:
+            async for batch in self._arow_batches(query_data):
+                start = time.perf_counter()
+                msgs = []
+                for row in batch:
+                    if is_path:
+                        msg = self._render_path_msg(template, row, count + len(msgs) + 1, colour)
+                    else:
+                        msg = self._render_standard_msg(template, row, colour)
+                    if msg:
+                        msgs.append(msg)
+                metrics.add_render_time(time.perf_counter() - start)
+                count += sink.write_batch(msgs)
+        metrics.update(bytes=sink.bytes_written)
+
+        if outfile:
+            handle_export(count, outfile)
+        elif count == 0:
+            log_no_results()
+        return count
+
+    async def _aexport_structured(self, query_data: dict, outfile: str, fmt: str) -> int:
+        is_path = self._is_path_query(query_data)
+        count = 0
+        with STRUCTURED_SINKS[fmt](outfile) as sink:
+            async for row in self._aiter_rows(query_data):
+                count += 1
+                sink.write_row({"path_num": count, **row} if is_path else row)
+
+        if outfile != STDOUT:
+            metrics.update(bytes=os.path.getsize(outfile))
+            handle_export(count, outfile)
+        elif count == 0:
+            log_no_results()
+        return count
+
+    # --------------------------------------------------------------------- #
+    # many queries
+    # --------------------------------------------------------------------- #
+    def _chosen(self, query_ids: list[str] | None) -> list[str]:
+        chosen = []
+        for qid in (query_ids or list(self.queries.keys())):
+            if str(qid) not in self.queries:
+                log_yellow(f"[!] Unknown query id {qid}; skipping")
+                continue
+            chosen.append(str(qid))
+        return chosen
+
+    async def run_queries(
+            self,
+            query_ids: list[str] | None,
+            out_dir: str | Path,
+            fmt: str = "jsonl",
+            jobs: int = 8,
+            fetch_size: int | None = None,
+        ) -> dict[str, int | None]:
+        """
+        Run several queries, at most `jobs` at a time, each streaming into
+        its own `q-<id>_<slug>.<ext>` file under `out_dir` as rows arrive.
+
+        :return: query id → rows written (None if the query failed).
+        """
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        ext = "txt" if fmt == "text" else fmt
+        limit = asyncio.Semaphore(max(1, jobs))
+
+        async def one(qid: str) -> tuple[str, int | None]:
+            slug = self._slugify(self.queries[qid]["desc"])[:60]
+            async with limit:
+                count = await self.run_query(qid, str(out_dir / f"q-{qid.zfill(2)}_{slug}.{ext}"),
+                                             fmt, fetch_size, echo=False)
+            return qid, count
+
+        chosen = self._chosen(query_ids)
+        counts = dict(await asyncio.gather(*(one(qid) for qid in chosen)))
+        return {qid: counts[qid] for qid in chosen}
+
+    async def run_queries_to_html(
+            self,
+            query_ids: list[str] | None,
+            report_root: str | Path,
+            jobs: int = 8,
+            previous: str | Path | None = None,
+        ) -> int:
+        """
+        Async `Driver.run_queries_to_html`; at most `jobs` queries are in
+        flight at once, all sharing the async driver's connection pool.
+        """
+        from datetime import datetime
+        from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+        ts_dir = Path(report_root) / datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        (ts_dir / "data").mkdir(parents=True, exist_ok=True)
+        env = Environment(
+            loader=FileSystemLoader("templates"),
+            autoescape=select_autoescape(["html", "xml"]),
+            enable_async=True,
+        )
+        limit = asyncio.Semaphore(max(1, jobs))
+
+        async def one(qid: str) -> dict | None:
+            async with limit:
+                try:
+                    return await self._awrite_details_page(env, ts_dir, qid)
+                except Exception as e:
+                    log_error(f"Query {qid} failed: {e}")
+                    return None
+
+        chosen = self._chosen(query_ids)
+        await self._agraph_fingerprint()    # so _page_inputs finds it fresh
+        marks = await self._agraph_marks([self.queries[qid]["query"] for qid in chosen])
+        inputs = self._pages_inputs(chosen, marks)
+        done = self._reuse_pages(previous, ts_dir, inputs) if previous else {}
+        pending = [qid for qid in chosen if qid not in done]
+        first_metric = len(self.metrics.entries)
+        rows = await asyncio.gather(*(one(qid) for qid in pending))
+        done.update((qid, row) for qid, row in zip(pending, rows) if row is not None)
+        master_rows = [done[qid] for qid in chosen if qid in done]
+
+        # write index page
+        with (ts_dir / "index.html").open("w", encoding="utf-8") as fh:
+            async for chunk in env.get_template("master.html.j2").generate_async(
+                    generated=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    rows=master_rows):
+                fh.write(chunk)
+        self._write_manifest(ts_dir, chosen, done, inputs)
+
+        print(f"{greenify('[+] HTML report written to:')} {ts_dir / 'index.html'}")
+        self.metrics.print_summary(self.metrics.entries[first_metric:])
+        failed = rows.count(None)
+        if failed:
+            log_error(f"{failed} of {len(chosen)} queries failed")
+        return failed
+
+    async def _awrite_details_page(self, env: Environment, ts_dir: Path, qid: str) -> dict:
+        from report_diff import SortedRows
+        q = self.queries[qid]
+        print(f"{greenify('[+] Running query ' + qid + ':')} {q['desc']}")
+        names = self._page_files(q)
+        data_name, details_name = names["data"], names["file"]
+        raw = SortedRows(ts_dir / data_name)
+        messages = _AsyncCountingIterator(self._aiter_report_msgs(q, raw.add))
+
+        with self.metrics.measure(qid, q["desc"], "report") as m:
+            # a page that fails half-way leaves neither it nor its data file behind
+            written = False
+            try:
+                with (ts_dir / details_name).open("w", encoding="utf-8") as fh:
+                    async for chunk in env.get_template("details.html.j2").generate_async(
+                            desc=q["desc"], rows=messages, qid=qid):
+                        fh.write(chunk)
+                written = True
+            finally:
+                raw.close(write=written)
+                if not written:
+                    (ts_dir / details_name).unlink(missing_ok=True)
+            m.rows = messages.count
+            m.bytes = (ts_dir / details_name).stat().st_size
+
+        return {"desc": q["desc"], "key": page_key(q["desc"]), "file": details_name,
+                "data": data_name, "count": messages.count}
+
+    async def _aiter_report_msgs(self, q: dict, record=None) -> AsyncIterator[str]:
+        """Async `_iter_standard_msgs` / `_iter_path_msgs`."""
+        tmpl = self._get_template(q, "report_msg")
+        if not self._is_path_query(q):
+            async for data in self._aiter_rows(q):
+                if record:
+                    record(data)
+                start = time.perf_counter()
+                msg = tmpl.render(**data) if tmpl else str(data)
+                metrics.add_render_time(time.perf_counter() - start)
+                yield msg
+            return
+
+        from jinja2 import UndefinedError
+        path_no = 1
+        async for ctx in self._aiter_rows(q):
+            if record:
+                record(ctx)
+            ctx["path_num"] = path_no
+            start = time.perf_counter()
+            if tmpl:
+                try:
+                    msg = tmpl.render(**ctx)
+                except UndefinedError as ue:
+                    log_error(f"Template error: {ue}")
+                    msg = None
+            else:
+                msg = _default_path_msg(path_no, ctx["start_name"], ctx["end_name"],
+                                        ctx["hops"], colour=False)
+            metrics.add_render_time(time.perf_counter() - start)
+            if msg is not None:
+                yield msg
+            path_no += 1
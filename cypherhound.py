@@ -1,9 +1,8 @@
 #!/usr/bin/python3
 # Author: Dylan Evans|fin3ss3g0d
 import os, sys, json, argparse
-import log
+import log, util, sinks
 from log import log_default
-from query_shell import QueryShell
 
 
 banner = """:::::::------::-----::::-------::---------::-----------------=+++*++=++***++===+**######*++++**#####*****+===+===-----=+
@@ -51,11 +50,237 @@ banner = """:::::::------::-----::::-------::---------::-----------------=+++*++
 """
 
 
-def main() -> None:
+# batch-mode exit statuses (argparse already exits with 2 on usage errors)
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_NO_RESULTS = 3
+EXIT_DIFFERENCES = 4    # report diff found changed queries
+
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Python terminal app that runs various Neo4j cyphers.")
-    parser.add_argument("-c", "--config", help="Config file", required=True)
+    parser.add_argument("-c", "--config", help="Config file (required except for `report diff`)")
     parser.add_argument("-y", "--yaml", help="Path to queries YAML file", default="queries.yaml")
-    args = parser.parse_args()
+    parser.add_argument("--color", choices=util.color_modes, default="auto",
+                        help="Colour query output: auto (only on a terminal), always or never")
+    parser.add_argument("--offline", metavar="PATH",
+                        help="Query SharpHound JSON (file, directory or zip), an APOC JSON export "
+                             "or a snapshot in memory instead of Neo4j")
+
+    # options shared by the batch subcommands
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="Set params.KEY before running (repeatable)")
+    common.add_argument("--no-cache", action="store_true",
+                        help="Always query Neo4j, bypassing the result cache")
+    common.add_argument("--native-paths", action="store_true",
+                        help="Answer shortestPath queries from an in-memory copy of the graph")
+
+    sub = parser.add_subparsers(dest="command", metavar="{run,report,advise,enrich,snapshot}",
+                                help="Run without the interactive shell; omit to start the shell")
+
+    run_p = sub.add_parser("run", parents=[common], help="Run queries and stream their results")
+    run_p.add_argument("index", nargs="+", type=util.id_list, metavar="ID[,ID|ID-ID]",
+                       help="Query number to run; several need --async and -o DIR")
+    run_p.add_argument("-f", "--format", choices=sinks.export_formats, default="text",
+                       help="text: rendered messages (default); jsonl/csv/parquet: raw result columns")
+    run_p.add_argument("-o", "--output", metavar="FILE",
+                       help="Write results to FILE instead of stdout (a directory for several queries)")
+    run_p.add_argument("--fetch-size", type=util.positive_int, metavar="N",
+                       help="Records to pull from Neo4j per batch")
+    run_p.add_argument("--limit", type=util.positive_int, metavar="K",
+                       help="Stop after K rows")
+    run_p.add_argument("--async", dest="use_async", action="store_true",
+                       help="Run on the asyncio neo4j driver; several queries run concurrently, "
+                            "each into its own file under -o DIR")
+    run_p.add_argument("-j", "--jobs", type=util.positive_int, default=8, metavar="N",
+                       help="With --async, queries in flight at once (default: %(default)s)")
+
+    report_p = sub.add_parser("report", parents=[common], help="Generate a HTML report")
+    report_p.add_argument("ids", nargs="*", type=util.id_list, metavar="ID[,ID|ID-ID] ...",
+                          help="IDs of queries to include; every stored query if omitted")
+    report_p.add_argument("-o", "--output", default="reports", metavar="DIR",
+                          help="Base directory for the report folder (default: %(default)s)")
+    report_p.add_argument("-j", "--jobs", type=util.positive_int, default=1, metavar="N",
+                          help="Number of queries to run concurrently (default: %(default)s)")
+    report_p.add_argument("--async", dest="use_async", action="store_true",
+                          help="Run queries on the asyncio neo4j driver; -j caps how many are in flight")
+    report_p.add_argument("--incremental", metavar="PREV_DIR",
+                          help="Reuse the pages of an earlier report whose query, params and graph are unchanged")
+
+    # `report diff A B` (routed here by main, as `report` already takes query IDs)
+    diff_p = sub.add_parser("report-diff", prog="cypherhound.py report diff",
+                            help="Compare the raw results of two reports")
+    diff_p.add_argument("old", metavar="DIR_A", help="Earlier report directory")
+    diff_p.add_argument("new", metavar="DIR_B", help="Later report directory")
+    diff_p.add_argument("-f", "--format", choices=("text", "jsonl"), default="text",
+                        help="text: per-query counts and sample rows (default); jsonl: every changed row")
+    diff_p.add_argument("-o", "--output", metavar="FILE", help="Write the diff to FILE instead of stdout")
+    diff_p.add_argument("--show", type=int, default=10, metavar="N",
+                        help="Changed rows to print per query in text format (default: %(default)s)")
+
+    advise_p = sub.add_parser("advise", help="Suggest (and create) Neo4j indexes for the queries")
+    advise_p.add_argument("--create", action="store_true",
+                          help="Create the missing indexes and wait for them to come online")
+    advise_p.add_argument("--label", default="Base",
+                          help="Label to index for label-less filters (default: %(default)s)")
+
+    enrich_p = sub.add_parser("enrich", help="Precompute derived facts in the graph after an ingest")
+    enrich_p.add_argument("--steps", type=lambda v: v.split(","), metavar="STEP[,STEP]",
+                          help="wellknown, tier0, owned, membership (default: wellknown,tier0,owned)")
+    enrich_p.add_argument("--batch-size", type=util.positive_int, default=10_000, metavar="N",
+                          help="Rows per transaction (default: %(default)s)")
+
+    snapshot_p = sub.add_parser("snapshot", help="Save the graph to a snapshot file, or open the shell on one")
+    snapshot_sub = snapshot_p.add_subparsers(dest="action", required=True)
+    save_p = snapshot_sub.add_parser("save", help="Write the graph (Neo4j or --offline) to PATH")
+    save_p.add_argument("path", metavar="PATH")
+    save_p.add_argument("--properties", type=lambda v: v.split(","), default=[], metavar="PROP[,PROP]",
+                        help="Node properties to keep besides the key ones and those the queries read")
+    load_p = snapshot_sub.add_parser("load", help="Start the interactive shell on the snapshot at PATH")
+    load_p.add_argument("path", metavar="PATH")
+    return parser
+
+
+def run_batch(args: argparse.Namespace, config: dict) -> int:
+    """Execute a batch subcommand without the REPL; returns the exit status."""
+    if getattr(args, "use_async", False):
+        from async_database import AsyncDriver as driver_cls
+    else:
+        from database import Driver as driver_cls
+
+    driver = driver_cls(
+        config.get("user"),
+        config.get("pwd"),
+        config.get("database", "neo4j"),
+        template_file=args.yaml,
+        options=config,
+    )
+    if getattr(args, "no_cache", False):
+        driver.cache_enabled = False
+    if getattr(args, "native_paths", False):
+        driver.native_paths = True
+    try:
+        if args.command == "advise":
+            import index_advisor
+            index_advisor.run(driver, create=args.create, default_label=args.label)
+            return EXIT_OK
+
+        if args.command == "enrich":
+            import enrich
+            unknown = set(args.steps or []) - set(enrich.STEPS)
+            if unknown:
+                log.log_error(f"Unknown step(s): {', '.join(sorted(unknown))}")
+                return EXIT_ERROR
+            return EXIT_OK if enrich.run(driver, args.steps, args.batch_size) else EXIT_ERROR
+
+        if args.command == "snapshot":
+            import snapshot
+            snapshot.run_save(driver, args.path, args.properties)
+            return EXIT_OK
+
+        for assignment in args.set:
+            key, sep, value = assignment.partition("=")
+            if not sep:
+                log.log_error(f"--set expects KEY=VALUE, got '{assignment}'")
+                return EXIT_ERROR
+            driver.set_param(key.strip(), value)
+
+        if args.command == "run":
+            return run_queries(driver, args)
+
+        flat_ids = sorted({i for sub in args.ids for i in sub}) if args.ids else None
+        if flat_ids and (min(flat_ids) < 1 or max(flat_ids) > len(driver.queries)):
+            log.log_error("One or more IDs are out of range")
+            return EXIT_ERROR
+        query_ids = [str(i) for i in flat_ids] if flat_ids else None
+        if args.use_async:
+            import asyncio
+
+            async def report():
+                async with driver:
+                    return await driver.run_queries_to_html(query_ids, args.output, jobs=args.jobs,
+                                                     previous=args.incremental)
+            failed = asyncio.run(report())
+        else:
+            failed = driver.run_queries_to_html(
+                query_ids=query_ids,
+                report_root=args.output,
+                jobs=args.jobs,
+                previous=args.incremental,
+            )
+        return EXIT_ERROR if failed else EXIT_OK
+    except Exception as e:
+        log.log_error(e)
+        return EXIT_ERROR
+    finally:
+        driver.close()
+
+
+def run_queries(driver, args: argparse.Namespace) -> int:
+    """`run`: one query to stdout or a file, or with --async several into a directory."""
+    ids = sorted({i for sub in args.index for i in sub})
+    if ids[0] < 1 or ids[-1] > len(driver.queries):
+        log.log_error("Index out of range")
+        return EXIT_ERROR
+    if not args.use_async:
+        if len(ids) > 1:
+            log.log_error("Running several queries needs --async and -o DIR")
+            return EXIT_ERROR
+        default = "" if args.format == "text" else sinks.STDOUT
+        count = driver.run_query(str(ids[0]), args.output or default, args.format,
+                                 args.fetch_size, args.limit, echo=not args.output)
+        if count is None:
+            return EXIT_ERROR
+        return EXIT_OK if count else EXIT_NO_RESULTS
+
+    if args.limit:
+        log.log_error("--limit is not supported with --async")
+        return EXIT_ERROR
+    if len(ids) > 1 and not args.output:
+        log.log_error("Running several queries needs -o DIR")
+        return EXIT_ERROR
+    import asyncio
+
+    async def batch() -> dict[str, int | None]:
+        async with driver:
+            if len(ids) > 1:
+                return await driver.run_queries([str(i) for i in ids], args.output,
+                                                args.format, args.jobs, args.fetch_size)
+            default = "" if args.format == "text" else sinks.STDOUT
+            return {str(ids[0]): await driver.run_query(str(ids[0]), args.output or default,
+                                                         args.format, args.fetch_size,
+                                                         echo=not args.output)}
+    counts = asyncio.run(batch())
+    if None in counts.values():
+        return EXIT_ERROR
+    return EXIT_OK if any(counts.values()) else EXIT_NO_RESULTS
+
+
+def run_report_diff(args: argparse.Namespace) -> int:
+    """`report diff`: reads two report directories only, no config or catalog."""
+    import report_diff
+    changed = report_diff.write_diff(args.old, args.new, args.output, args.format, args.show)
+    if changed is None:
+        return EXIT_ERROR
+    return EXIT_DIFFERENCES if changed else EXIT_OK
+
+
+def main() -> None:
+    argv = sys.argv[1:]
+    for i in range(len(argv) - 1):
+        if argv[i:i + 2] == ["report", "diff"]:
+            argv[i:i + 2] = ["report-diff"]
+            break
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == "report-diff":
+        log.set_stream(sys.stderr)
+        util.set_color_mode(args.color)
+        sys.exit(run_report_diff(args))
+    if not args.config:
+        parser.error("the following arguments are required: -c/--config")
 
     # Read the config file
     try:
@@ -70,9 +295,26 @@ def main() -> None:
         log.log_error(f"YAML file '{args.yaml}' does not exist.")
         sys.exit(1)
 
-    # Display the banner
+    if args.offline:
+        config["offline"] = args.offline
+    if args.command == "snapshot" and args.action == "load":
+        # nothing to run: the shell queries the snapshot
+        config["offline"] = args.path
+        args.command = None
+    if args.command:
+        # stdout carries results, status messages go to stderr
+        log.set_stream(sys.stderr)
+    util.set_color_mode(args.color)
+
+    if args.command:
+        sys.exit(run_batch(args, config))
+
+    # Display the banner before the shell's imports so it shows up at once
     log_default(banner)
 
+    # imported here so batch runs never pay for cmd2/readline
+    from query_shell import QueryShell
+
     # Run the shell loop
     try:
         # Initialize the query shell
@@ -81,6 +323,7 @@ def main() -> None:
             pwd=config.get("pwd"),
             db=config.get("database", "neo4j"),
             yaml_file=args.yaml,
+            options=config,
             persistent_history_file=".history"
         )
         shell.cmdloop()                      # drops into the REPL
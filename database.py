@@ -1,17 +1,30 @@
 #!/usr/bin/env python3
-import sys, yaml, re
-from tempfile import template
-
-from util import redify, deep_redify, greenify, yellowify, strip_ansi_escape_sequences, handle_export
+from __future__ import annotations
+import os, re, json, hashlib, pickle, shutil, threading, time
+
+from util import redify, deep_redify, greenify, yellowify, handle_export, color_enabled
+from sinks import TextSink, STRUCTURED_SINKS, STDOUT
+from result_cache import ResultCache
+from metrics import Metrics
+import metrics
 from log import log_default, log_error, log_no_results, log_green, log_red, log_yellow
 
-from neo4j import GraphDatabase
 from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
+from typing import Iterable, Iterator, TYPE_CHECKING
+
+# neo4j, jinja2, yaml and friends are imported where they are first needed so
+# that starting the shell (or a cached batch run) does not pay for them up front
+if TYPE_CHECKING:
+    from jinja2 import Environment, Template
 
-from jinja2 import Template, UndefinedError, Environment, FileSystemLoader, select_autoescape, StrictUndefined
-from datetime import datetime
-from pathlib import Path
+
+def _single_value(result):
+    """`value` of a one-row result, None if it returned no row."""
+    record = result.single()
+    return None if record is None else record["value"]
 
 
 def _looks_like_path(obj) -> bool:
@@ -22,6 +35,34 @@ def _looks_like_path(obj) -> bool:
         hasattr(obj, "__iter__")   # paths are iterable over relationships
     )
 
+def _path_hops(path) -> list[dict]:
+    """One dict per relationship of a Neo4j Path, as used by path templates."""
+    if hasattr(path, "hops"):
+        return path.hops()      # offline paths build them from their arrays
+    return [
+        {
+            "src": rel.start_node.get("name"),
+            "src_labels": list(rel.start_node.labels),
+            "type": rel.type,
+            "dst": rel.end_node.get("name"),
+            "dst_labels": list(rel.end_node.labels),
+        }
+        for rel in path
+    ]
+
+def _default_path_msg(path_num: int, start_name, end_name, hops: list[dict],
+                      colour: bool) -> str:
+    """Text used for a path when the query has no msg_template, 1 line per hop."""
+    red, green, yellow = (redify, greenify, yellowify) if colour else (str, str, str)
+    pieces = [f'{green(f"*Path {path_num}*")} {start_name} {green("→")} {end_name}']
+    for h in hops:
+        pieces.append(
+            f"{red(h['src'])} ({'/'.join(h['src_labels'])}) "
+            f"{yellow(f"--{h['type']}→")} "
+            f"{red(h['dst'])} ({'/'.join(h['dst_labels'])})"
+        )
+    return "\n".join(pieces)
+
 def _set_nested(d: dict, dotted_key: str, value: str) -> None:
     """
     Allow dotted keys ('a.b.c') to create/update nested dicts.
@@ -57,6 +98,102 @@ def _get_nested(d: dict, dotted_key: str, default=None):
     return cur
 
 _VALID_KEY = re.compile(r"^[A-Za-z_][A-Za-z0-9_\.]*$")
+# native Neo4j parameter references, e.g. $params.user or $params.a.b
+_PARAM_REF = re.compile(r"\$params((?:\.[A-Za-z_][A-Za-z0-9_]*)+)")
+# var.prop and {prop: …} in cypher, to find the node properties path queries read
+_PROPERTY_REF = re.compile(r"\b([A-Za-z_]\w*)\.([A-Za-z_]\w*)")
+_MAP_KEY_REF = re.compile(r"[{,]\s*([A-Za-z_]\w*)\s*:")
+
+# graph fingerprint for the result cache: node/relationship counts from the
+# count store and the newest ingest, one ordered lookup that a :Base(lastseen)
+# range index serves (`advise` suggests it). Marking nodes changes none of
+# these, so queries that read the marks also key on them (see _graph_marks)
+_FINGERPRINT_CYPHER = {
+    "nodes":    "MATCH (n) RETURN count(n) AS value",
+    "rels":     "MATCH ()-[r]->() RETURN count(r) AS value",
+    "lastseen": "MATCH (n:Base) WHERE n.lastseen IS NOT NULL "
+                "RETURN n.lastseen AS value ORDER BY n.lastseen DESC LIMIT 1",
+}
+_FINGERPRINT_TTL = 30  # seconds
+# owned / high-value sets, digested for queries that mention them (see _graph_marks)
+_MARKS = ("owned", "highvalue")
+_MARKS_CYPHER = "MATCH (n) WHERE n.{0} = true RETURN collect(n.objectid) AS value"
+
+
+def _marks_in(texts: Iterable[str]) -> list[str]:
+    """The _MARKS that one of `texts` mentions."""
+    texts = list(texts)
+    return [m for m in _MARKS if any(m in t for t in texts)]
+
+# per-report record of what every details page was produced from
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# manifest page keys naming files that belong to the page
+_PAGE_FILES = ("file", "data")
+
+
+def page_key(desc: str) -> str:
+    """
+    A query's identity across reports. Ids are positions in the sorted
+    catalog and shift as queries are added; descriptions are unique.
+    """
+    return hashlib.sha256(desc.encode("utf-8")).hexdigest()[:16]
+
+# rows rendered and written per batch when no fetch size is configured
+_DEFAULT_BATCH_ROWS = 1000
+
+# "driver" config keys handed straight to GraphDatabase.driver()
+_DRIVER_OPTIONS = (
+    "max_connection_pool_size",
+    "connection_acquisition_timeout",
+    "connection_timeout",
+    "max_connection_lifetime",
+    "keep_alive",
+    "liveness_check_timeout",
+)
+
+# bump whenever the shape of the cached catalog changes
+_CATALOG_CACHE_VERSION = 3
+
+
+def _record_to_row(rec, is_path: bool) -> dict | None:
+    """
+    Plain dict for one neo4j record. Path rows carry start_name, end_name
+    and hops plus the other returned columns; None if a path query's
+    record holds no path.
+    """
+    if not is_path:
+        return rec.data()
+    path_keys = [k for k, v in rec.items() if _looks_like_path(v)]
+    if not path_keys:
+        return None
+    path = rec[path_keys[0]]
+    others = [k for k in rec.keys() if k not in path_keys]
+    return {
+        "start_name": path.start_node.get("name"),
+        "end_name":   path.end_node.get("name"),
+        **(rec.data(*others) if others else {}),
+        "hops":       _path_hops(path),
+    }
+
+
+class _CountingIterator:
+    """
+    Wrap an iterator and count the items pulled through it, so a streamed
+    details page can report its row count once it has been written.
+    """
+    def __init__(self, iterable: Iterable):
+        self._it = iter(iterable)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = next(self._it)
+        self.count += 1
+        return item
+
 
 class Driver:
     # --------------------------------------------------------------------- #
@@ -66,49 +203,343 @@ class Driver:
                  user: str,
                  password: str,
                  db: str,
-                 template_file: str):
+                 template_file: str,
+                 options: dict | None = None):
+        """
+        :param options: the parsed config.json; optional keys configure
+                        extras such as the result cache.
+        """
+        options = options or {}
 
-        self.driver  = GraphDatabase.driver("neo4j://localhost:7687",
-                                            auth=(user, password))
+        # the neo4j driver is created on first use, see the `driver` property
+        self._auth           = (user, password)
+        self._driver         = None
+        self._driver_lock    = threading.Lock()
         self.database        = db
 
+        # connection settings from the optional "driver" block of config.json
+        driver_opts          = options.get("driver", {})
+        self.uri             = driver_opts.get("uri", "neo4j://localhost:7687")
+        self._driver_kwargs  = {k: driver_opts[k] for k in _DRIVER_OPTIONS if k in driver_opts}
+        self.fetch_size      = driver_opts.get("fetch_size")
+        self.reuse_session   = driver_opts.get("reuse_session", True)
+
+        # BloodHound JSON / Neo4j export to query in memory instead of a server
+        self.offline         = options.get("offline")
+
+        # answer shortestPath queries from an in-memory copy of the graph
+        # (see `path_driver`); offline graphs always do
+        self.native_paths    = options.get("path_engine", {}).get("enabled", False)
+        self._path_driver: tuple[tuple, object] | None = None
+        self._path_driver_lock = threading.Lock()
+
+        # thread ident → long-lived session (see `_session`)
+        self._sessions: dict[int, object] = {}
+        self._sessions_lock  = threading.Lock()
+
         # single, flexible namespace for all user-provided values
         self.params: dict[str, object] = {}
 
-        # Jinja env shared for cypher and messages (same filters, strict undefined)
-        self._jinja = Environment(
-            undefined=StrictUndefined,
-            autoescape=False,
-            trim_blocks=True,
-            lstrip_blocks=True,
+        # Jinja envs, built on first use (see `_jinja` / `_report_jinja`)
+        self._jinja_env = None
+        self._report_jinja_env = None
+
+        # (query id, kind) → compiled template; emptied on every catalog load
+        self._templates: dict[tuple[str, str], Template | None] = {}
+
+        self.template_file = template_file
+        self.queries, self.groups = self._load_queries(template_file)
+
+        # on-disk result cache keyed by query, params and graph fingerprint
+        cache_opts = options.get("result_cache", {})
+        self.cache_enabled = cache_opts.get("enabled", True)
+        self.result_cache  = ResultCache(
+            cache_opts.get("dir", ".cache/results"),
+            max_entries=cache_opts.get("max_entries", 500),
+            max_bytes=int(cache_opts.get("max_mb", 1024)) * 1024 * 1024,
+        )
+        self._fingerprint: tuple[float, str] | None = None
+        self._marks: tuple[float, dict[str, str]] | None = None
+        self._fingerprint_lock = threading.Lock()
+
+        # per-query timings → JSONL, plus the slow-query log
+        metrics_opts = options.get("metrics", {})
+        self.metrics = Metrics(
+            metrics_opts.get("file", ".cache/metrics.jsonl") if metrics_opts.get("enabled", False) else None,
+            slow_ms=metrics_opts.get("slow_query_ms", 10_000),
         )
 
-        self.queries = self._load_queries(template_file)
+    # --------------------------------------------------------------------- #
+    # lazily-built heavy members
+    # --------------------------------------------------------------------- #
+    @property
+    def driver(self):
+        """
+        The neo4j driver, connected on first use and shared by all threads.
+        With an offline source configured, a stand-in reading that graph
+        from memory is loaded instead.
+        """
+        if self._driver is None:
+            with self._driver_lock:
+                if self._driver is None and self.offline:
+                    from offline_driver import OfflineDriver
+                    start = time.perf_counter()
+                    self._driver = OfflineDriver.load(self.offline)
+                    graph = self._driver.graph
+                    log_green(f"[+] Loaded offline graph {self.offline}: {graph.node_count:,} nodes, "
+                              f"{graph.edge_count:,} edges in {time.perf_counter() - start:.1f}s")
+                elif self._driver is None:
+                    from neo4j import GraphDatabase
+                    self._driver = GraphDatabase.driver(self.uri, auth=self._auth,
+                                                        **self._driver_kwargs)
+        return self._driver
+
+
+    @property
+    def path_driver(self):
+        """
+        Stand-in driver over an in-memory copy of the database for path
+        queries: every node with the properties path queries read, and the
+        relationships of the types they can walk. It is pulled once and shared, together with its cached
+        shortest-path trees, by all path queries until the graph fingerprint
+        or, when it holds them, the owned / high-value marks change.
+        """
+        with self._path_driver_lock:
+            properties = self.query_properties(paths_only=True)
+            state = (self._graph_fingerprint(), self._graph_marks(properties))
+            if self._path_driver is None or self._path_driver[0] != state:
+                from offline_driver import OfflineDriver
+                start = time.perf_counter()
+                graph = self.in_memory_graph(properties, paths_only=True)
+                self._path_driver = (state, OfflineDriver(graph))
+                log_green(f"[+] Loaded {graph.node_count:,} nodes and {graph.edge_count:,} edges "
+                          f"for native path search in {time.perf_counter() - start:.1f}s")
+            return self._path_driver[1]
+
+
+    def in_memory_graph(self, properties: set[str], paths_only: bool = False):
+        """
+        The graph as an offline Graph: the loaded one when offline, otherwise
+        every node (with `properties`) and relationship pulled from Neo4j.
+        With `paths_only`, only relationships of the types the catalog's
+        path queries can walk are pulled (see _path_types).
+        """
+        if self.offline:
+            return self.driver.graph
+        import offline_graph
+        with self._session() as session:
+            types = None
+            if paths_only:
+                names = [rec["relationshipType"] for rec in session.run("CALL db.relationshipTypes()")]
+                types = self._path_types(names)
+            return offline_graph.from_neo4j(session, properties, types)
+
+
+    def _path_types(self, type_names: list[str]) -> set[str]:
+        """
+        Relationship types, out of `type_names`, that some catalog path query
+        can walk: every one unless its `NONE(x IN relationships(p) WHERE
+        type(x) = …)` filters exclude it. All of them if a query cannot be
+        analysed.
+        """
+        import offline_cypher
+        walked = set()
+        for q in self.queries.values():
+            if not self._is_path_query(q):
+                continue
+            try:
+                cypher = self._render_cypher_template(q)
+                walked |= offline_cypher.traversed_types(cypher, {"params": self.params}, type_names)
+            except (RuntimeError, ValueError, LookupError):
+                return set(type_names)
+        return walked
+
+
+    def query_properties(self, paths_only: bool = False) -> set[str]:
+        """
+        Node properties read by the catalog's queries (only its path queries
+        with `paths_only`), plus those rendered paths show.
+        """
+        props = {"name", "objectid"}
+        for q in self.queries.values():
+            if not paths_only or self._is_path_query(q):
+                props.update(p for var, p in _PROPERTY_REF.findall(q["query"]) if var != "params")
+                props.update(_MAP_KEY_REF.findall(q["query"]))
+        return props
+
+
+    @contextmanager
+    def _session(self, fetch_size: int | None = None):
+        """
+        Session for running one query.
+
+        With `reuse_session` on, every thread keeps a single long-lived
+        session so back-to-back commands skip session setup; a session that
+        raised is closed and replaced on next use. Otherwise, or when the
+        query asks for a fetch size other than the configured one, a fresh
+        session is opened and closed around the query.
+        """
+        config = self._session_config(fetch_size)
+        if not self.reuse_session or (fetch_size and fetch_size != self.fetch_size):
+            with self.driver.session(**config) as session:
+                yield session
+            return
+
+        ident = threading.get_ident()
+        session = self._sessions.get(ident)
+        if session is None:
+            session = self.driver.session(**config)
+            with self._sessions_lock:
+                self._sessions[ident] = session
+        try:
+            yield session
+        except Exception:
+            self._drop_session(ident)
+            raise
+
+
+    def _session_config(self, fetch_size: int | None = None) -> dict:
+        config = {"database": self.database}
+        if fetch_size or self.fetch_size:
+            config["fetch_size"] = fetch_size or self.fetch_size
+        return config
+
+
+    def _drop_session(self, ident: int) -> None:
+        with self._sessions_lock:
+            session = self._sessions.pop(ident, None)
+        if session is not None:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+
+    def _release_idle_sessions(self) -> None:
+        """Close sessions owned by threads that have exited (e.g. report workers)."""
+        alive = {t.ident for t in threading.enumerate()}
+        for ident in [i for i in self._sessions if i not in alive]:
+            self._drop_session(ident)
+
+
+    @property
+    def _jinja(self) -> Environment:
+        """Jinja env shared for cypher and messages (same filters, strict undefined)."""
+        if self._jinja_env is None:
+            from jinja2 import Environment, StrictUndefined
+            self._jinja_env = Environment(
+                undefined=StrictUndefined,
+                autoescape=False,
+                trim_blocks=True,
+                lstrip_blocks=True,
+            )
+        return self._jinja_env
+
+
+    @property
+    def _report_jinja(self) -> Environment:
+        """Report pages keep the lenient defaults of a bare jinja2.Template."""
+        if self._report_jinja_env is None:
+            from jinja2 import Environment
+            self._report_jinja_env = Environment()
+        return self._report_jinja_env
+
 
     # --------------------------------------------------------------------- #
     # YAML loader
     # --------------------------------------------------------------------- #
-    def _load_queries(self, path: str) -> OrderedDict[str, dict]:
-        """Read queries.yaml → OrderedDict keyed '1', '2', …"""
-        tpl = yaml.safe_load(Path(path).read_text(encoding="utf-8"))
+    def _load_queries(self, path: str) -> tuple[OrderedDict[str, dict], dict[str, list[str]]]:
+        """
+        Read queries.yaml → (OrderedDict keyed '1', '2', …, group → ids).
+
+        The parsed catalog is pickled next to the YAML file and reused while
+        the YAML is unchanged, which skips PyYAML on every later start.
+        """
+        src = Path(path)
+        cache_path = src.with_name(src.name + ".cache")
+        st = src.stat()
+
+        cache = self._read_catalog_cache(cache_path)
+        if cache and (cache["mtime_ns"], cache["size"]) == (st.st_mtime_ns, st.st_size):
+            return cache["queries"], cache["groups"]
+
+        raw = src.read_bytes()
+        digest = hashlib.sha256(raw).hexdigest()
+        if cache and cache["sha256"] == digest:
+            # touched but not modified – refresh the stat key only
+            queries, groups = cache["queries"], cache["groups"]
+        else:
+            queries, groups = self._parse_queries(raw)
+
+        self._write_catalog_cache(cache_path, {
+            "version":  _CATALOG_CACHE_VERSION,
+            "mtime_ns": st.st_mtime_ns,
+            "size":     st.st_size,
+            "sha256":   digest,
+            "queries":  queries,
+            "groups":   groups,
+        })
+        return queries, groups
+
+
+    def _parse_queries(self, raw: bytes) -> tuple[OrderedDict[str, dict], dict[str, list[str]]]:
+        import yaml
+        tpl = yaml.safe_load(raw.decode("utf-8"))
         qlist = tpl.get("queries", [])
 
         # sort alphabetically by description
         qlist.sort(key=lambda x: x["desc"].lower())
 
         queries = OrderedDict()
+        groups: dict[str, list[str]] = {}
         for idx, q in enumerate(qlist, 1):
             queries[str(idx)] = {
+                "id":           str(idx),
                 "query":        q["cypher"],
                 "desc":         q["desc"],
                 "group":        q["group"],
                 "msg_template": q.get("msg_template"),  # may be None
+                "fetch_size":   q.get("fetch_size"),    # may be None
             }
-        return queries
+            groups.setdefault(q["group"], []).append(str(idx))
+        return queries, groups
+
+
+    def _read_catalog_cache(self, cache_path: Path) -> dict | None:
+        try:
+            with cache_path.open("rb") as fh:
+                cache = pickle.load(fh)
+        except (OSError, pickle.PickleError, EOFError, AttributeError, ValueError):
+            return None
+        if not isinstance(cache, dict) or cache.get("version") != _CATALOG_CACHE_VERSION:
+            return None
+        return cache
+
+
+    def _write_catalog_cache(self, cache_path: Path, cache: dict) -> None:
+        # best effort – a read-only checkout simply runs without the cache
+        tmp = cache_path.with_name(cache_path.name + f".{os.getpid()}.tmp")
+        try:
+            with tmp.open("wb") as fh:
+                pickle.dump(cache, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cache_path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+
+
+    def reload_queries(self) -> None:
+        """Re-read the catalog and drop every compiled template."""
+        self.queries, self.groups = self._load_queries(self.template_file)
+        self._templates.clear()
+        self._path_driver = None    # holds what the old catalog's path queries read
 
 
     def close(self):        
-        self.driver.close()
+        for ident in list(self._sessions):
+            self._drop_session(ident)
+        if self._driver is not None:
+            self._driver.close()
+        self.metrics.close()
 
 
     def search_queries(self, search_string):
@@ -127,9 +558,8 @@ class Driver:
             self.print_all_queries()
             return
         log_green(f'{group.capitalize()} Cyphers:')
-        for num, data in self.queries.items():
-            if data['group'] == group:
-                print(f'{redify(num + ".")} {data["desc"]}')
+        for num in self.groups.get(group, []):
+            print(f'{redify(num + ".")} {self.queries[num]["desc"]}')
 
 
     def print_all_queries(self):
@@ -162,14 +592,38 @@ class Driver:
         return dict(self.params)
 
 
+    # ----- compiled template cache -----
+    def _get_template(self, query_data: dict, kind: str) -> Template | None:
+        """
+        Compiled template for a catalog entry, built on first use.
+
+        kind is "cypher", "msg" (terminal output) or "report_msg" (HTML
+        report, lenient undefined). Returns None when the entry has no
+        message template.
+        """
+        src = query_data["query"] if kind == "cypher" else query_data.get("msg_template")
+        key = (query_data.get("id") or src, kind)
+        try:
+            return self._templates[key]
+        except KeyError:
+            pass
+
+        tmpl = None
+        if src:
+            env = self._report_jinja if kind == "report_msg" else self._jinja
+            tmpl = env.from_string(src)
+        self._templates[key] = tmpl
+        return tmpl
+
+
     # ----- render cypher via Jinja using `params` -----
-    def _render_cypher_template(self, cypher_template: str) -> str:
+    def _render_cypher_template(self, query_data: dict) -> str:
         """
-        Render a Cypher template. Makes `params` available.
+        Render a query's Cypher template. Makes `params` available.
         Raises with helpful error if a variable is missing (StrictUndefined).
         """
         try:
-            tmpl = self._jinja.from_string(cypher_template)
+            tmpl = self._get_template(query_data, "cypher")
             ctx = {
                 "params": self.params
             }
@@ -179,138 +633,361 @@ class Driver:
             raise RuntimeError(f"Failed to render cypher template: {e}") from e
 
 
+    def _referenced_params(self, cypher: str) -> dict:
+        """The values of the $params.<key> references in `cypher`, by key."""
+        return {key: self.get_param(key) for key in
+                sorted({m.group(1).lstrip(".") for m in _PARAM_REF.finditer(cypher)})}
+
+
+    # ----- native Neo4j parameters -----
+    def _query_parameters(self, cypher: str) -> dict:
+        """
+        Parameters passed to session.run() alongside the rendered cypher.
+
+        Catalog entries reference user values as `$params.<key>`, which keeps
+        the query text constant so Neo4j can reuse its cached plan. A missing
+        key fails here with the same kind of error a Jinja reference gives.
+        """
+        for m in _PARAM_REF.finditer(cypher):
+            key = m.group(1).lstrip(".")
+            if self.get_param(key) is None:
+                raise RuntimeError(f"params.{key} is not set (use `set {key} <value>`)")
+        return {"params": self.params}
+
+
     # --------------------------------------------------------------------- #
-    # STANDARD query executor – Jinja2 templating (updated)
+    # row source – neo4j (or the result cache) → plain dicts
     # --------------------------------------------------------------------- #
-    def _handle_standard_query(self, query_data: dict, outfile: str):
+    def _iter_rows(self, query_data: dict) -> Iterator[dict]:
+        """
+        Yield one plain dict per result row. Path rows carry start_name,
+        end_name and hops plus any other returned columns; records without
+        a path are skipped. Served from the result cache when possible.
+        Records are pulled from Neo4j `fetch_size` at a time, and no more
+        than `limit` rows are read when the entry carries one.
+        """
+        cypher     = self._render_cypher_template(query_data)
+        parameters = self._query_parameters(cypher)
+        is_path    = self._is_path_query(query_data)
+        metrics.update(cypher=cypher)
+
+        key = None
+        if self.cache_enabled:
+            key = ResultCache.make_key(self.database, query_data.get("id"), cypher,
+                                       self._referenced_params(cypher), self._graph_fingerprint(),
+                                       self._graph_marks([cypher]))
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                metrics.update(cached=True)
+                yield from self._limited(iter(cached), query_data.get("limit"))
+                return
+
+        rows = self._iter_neo4j_rows(cypher, parameters, is_path,
+                                     query_data.get("fetch_size"))
+        if key:
+            # a limited read leaves the result unfinished, so nothing is cached
+            rows = self.result_cache.record(key, rows)
+        yield from self._limited(rows, query_data.get("limit"))
+
+
+    @staticmethod
+    def _limited(rows: Iterator[dict], limit: int | None) -> Iterator[dict]:
+        """The first `limit` rows; reads one more to note in the metrics whether any were left out."""
+        if limit is None:
+            yield from rows
+            return
+        yield from islice(rows, limit)
+        if next(rows, None) is not None:
+            metrics.update(truncated=True)
+
+
+    def _iter_neo4j_rows(self, cypher: str, parameters: dict, is_path: bool,
+                         fetch_size: int | None = None) -> Iterator[dict]:
+        if is_path and self.native_paths and not self.offline:
+            opened = self.path_driver.session()
+        else:
+            opened = self._session(fetch_size)
+        with opened as session:
+            result = session.run(cypher, parameters)
+            try:
+                for rec in result:
+                    row = _record_to_row(rec, is_path)
+                    if row is not None:
+                        yield row
+            except GeneratorExit:
+                # reader stopped early (--limit, paging): have the server drop
+                # the rest rather than the session buffering it on its next run
+                metrics.note_summary(result.consume())
+                raise
+            metrics.note_summary(result.consume())
+
+
+    def _graph_fingerprint(self) -> str:
+        """
+        Cheap summary of the graph's state, part of every result-cache key:
+        counts and the newest `lastseen` (see _FINGERPRINT_CYPHER). Reused
+        for _FINGERPRINT_TTL seconds so back-to-back commands share one
+        lookup.
+        """
+        with self._fingerprint_lock:
+            now = time.monotonic()
+            if self._fingerprint and now - self._fingerprint[0] < _FINGERPRINT_TTL:
+                return self._fingerprint[1]
+            with self._session() as session:
+                state = {name: _single_value(session.run(cypher))
+                         for name, cypher in _FINGERPRINT_CYPHER.items()}
+            fingerprint = ResultCache.make_key(state)
+            self._fingerprint = (now, fingerprint)
+            return fingerprint
+
+
+    def _graph_marks(self, texts: Iterable[str]) -> dict[str, str]:
+        """
+        Digest of the owned / high-value set for each of the two that one of
+        `texts` (cypher) mentions. Part of the result-cache key and the
+        report manifest of queries that read a set, so marking nodes, here
+        or in the BloodHound UI, reruns them. Reused for _FINGERPRINT_TTL
+        seconds like the fingerprint.
+        """
+        wanted = _marks_in(texts)
+        if not wanted:
+            return {}
+        with self._fingerprint_lock:
+            digests = self._fresh_marks()
+            missing = [m for m in wanted if m not in digests]
+            if missing:
+                with self._session() as session:
+                    for mark in missing:
+                        ids = _single_value(session.run(_MARKS_CYPHER.format(mark))) or []
+                        digests[mark] = ResultCache.make_key(sorted(map(str, ids)))
+            return {m: digests[m] for m in wanted}
+
+
+    def _fresh_marks(self) -> dict[str, str]:
+        """The mark digests read in the last _FINGERPRINT_TTL seconds (filled in by the caller)."""
+        now = time.monotonic()
+        if self._marks is None or now - self._marks[0] >= _FINGERPRINT_TTL:
+            self._marks = (now, {})
+        return self._marks[1]
+
+
+    def _pages_inputs(self, chosen: list[str], marks: dict[str, str]) -> dict[str, dict | None]:
+        """`_page_inputs` of every chosen query; template and graph are read once."""
+        page_template = hashlib.sha256(Path("templates/details.html.j2").read_bytes()).hexdigest()
+        fingerprint = self._graph_fingerprint()
+        return {qid: self._page_inputs(self.queries[qid], marks, page_template, fingerprint)
+                for qid in chosen}
+
+
+    def _page_inputs(self, q: dict, marks: dict[str, str], page_template: str,
+                     fingerprint: str) -> dict | None:
+        """
+        What a report page depends on, as recorded in the report manifest: a
+        hash of the query text, its description and message template and
+        the page template (digest `page_template`); the values of the
+        $params it reads; and the graph `fingerprint`, plus the `marks` (see
+        _graph_marks) the query mentions. None when the query cannot be
+        rendered (a missing parameter), so the page always runs.
+        """
         try:
-            with self.driver.session(database=self.database) as session:
-                # 1) Render the cypher
-                cypher = self._render_cypher_template(query_data["query"])
-
-                results = session.run(cypher)
-
-                if results.peek() is None:
-                    log_no_results()
-                    return
-
-                # 2) Pre-compile the message template using same env for filters if needed
-                template = None
-                if query_data.get("msg_template"):
-                    template = self._jinja.from_string(query_data["msg_template"])
-
-                count = 0
-                for rec in results:
-                    raw = rec.data()
-                    # colorize simple types
-                    ctx = {
-                        k: redify(v) if isinstance(v, (str, int, float, bool)) else v
-                        for k, v in raw.items()
-                    }
-                    # Render the human message (falls back to dict string)
-                    try:
-                        msg = template.render(**ctx) if template else str(raw)
-                    except Exception as e:
-                        # If a msg_template references a field that doesn't exist, fail gracefully
-                        msg = f"[TEMPLATE ERROR] {e} | raw={raw}"
+            cypher = self._render_cypher_template(q)
+            self._query_parameters(cypher)
+        except RuntimeError:
+            return None
+        seen = {mark: digest for mark, digest in marks.items() if mark in cypher}
+        inputs = {
+            "query": ResultCache.make_key(self.database, cypher, q["desc"], q.get("msg_template"),
+                                          page_template),
+            "params": self._referenced_params(cypher),
+            "graph": ResultCache.make_key(fingerprint, seen),
+        }
+        # as it reads back from the manifest, so the two compare equal
+        return json.loads(json.dumps(inputs, sort_keys=True, default=str))
+
+
+    def clear_result_cache(self) -> int:
+        """Drop cached results, e.g. after marking nodes, along with the in-memory path copy."""
+        self._fingerprint = self._marks = None
+        self._path_driver = None
+        return self.result_cache.clear()
 
-                    if not msg:
-                        continue
 
-                    self._handle_output(outfile, msg)
-                    count += 1
+    # --------------------------------------------------------------------- #
+    # schema
+    # --------------------------------------------------------------------- #
+    def show_indexes(self) -> list[tuple[str, str, str]]:
+        """(type, label, first property) of every online node index."""
+        with self._session() as session:
+            rows = session.run(
+                "SHOW INDEXES YIELD type, entityType, labelsOrTypes, properties, state "
+                "WHERE entityType = 'NODE' AND state = 'ONLINE' AND properties IS NOT NULL "
+                "RETURN type, labelsOrTypes, properties"
+            ).data()
+        return [(row["type"], label, row["properties"][0])
+                for row in rows for label in row["labelsOrTypes"]]
 
-                if count == 0:
-                    log_no_results()
-                if outfile:
-                    handle_export(count, outfile)
 
+    def run_write(self, cypher: str, parameters: dict | None = None):
+        """Run an auto-commit write or schema statement and return its summary."""
+        with self._session() as session:
+            return session.run(cypher, parameters).consume()
+
+
+    # --------------------------------------------------------------------- #
+    # query plans
+    # --------------------------------------------------------------------- #
+    def profile_query(self, option: str, explain: bool = False) -> dict | None:
+        """
+        Run catalog entry `option` under PROFILE (or only plan it with
+        EXPLAIN) and return its rendered cypher, params, timings and
+        operator tree. Rows are discarded; the result cache is bypassed.
+        """
+        q = self.queries.get(option)
+        if not q:
+            log_error("Cypher does not exist!")
+            return None
+        try:
+            cypher     = self._render_cypher_template(q)
+            parameters = self._query_parameters(cypher)
+            mode       = "EXPLAIN" if explain else "PROFILE"
+            with self._session() as session:
+                summary = session.run(f"{mode} {cypher}", parameters).consume()
         except Exception as e:
             log_error(e)
+            return None
+
+        return {
+            "id":                 q["id"],
+            "desc":               q["desc"],
+            "mode":               mode,
+            "cypher":             cypher,
+            "params":             self.params,
+            "available_after_ms": summary.result_available_after,
+            "consumed_after_ms":  summary.result_consumed_after,
+            "plan":               summary.plan if explain else summary.profile,
+        }
+
+
+    # --------------------------------------------------------------------- #
+    # STANDARD query executor – Jinja2 templating (updated)
+    # --------------------------------------------------------------------- #
+    def _handle_standard_query(self, query_data: dict, outfile: str, echo: bool = True) -> int | None:
+        try:
+            # Fetch the compiled message template (same env for filters)
+            template = self._get_template(query_data, "msg")
+
+            # colour only ever goes to a terminal, never into an export
+            colour = color_enabled() and not outfile
+
+            count = 0
+            with TextSink(outfile, echo=echo, page_size=query_data.get("page_size")) as sink:
+                for batch in self._row_batches(query_data):
+                    start = time.perf_counter()
+                    msgs = [msg for raw in batch
+                            if (msg := self._render_standard_msg(template, raw, colour))]
+                    metrics.add_render_time(time.perf_counter() - start)
+                    count += sink.write_batch(msgs)
+                    if sink.stopped:
+                        break
+            metrics.update(bytes=sink.bytes_written)
+
+            if outfile:
+                handle_export(count, outfile)
+            elif count == 0:
+                log_no_results()
+            return count
+
+        except Exception as e:
+            log_error(e)
+
+
+    @staticmethod
+    def _render_standard_msg(template: Template | None, raw: dict, colour: bool) -> str:
+        # colorize simple types
+        ctx = {
+            k: redify(v) if isinstance(v, (str, int, float, bool)) else v
+            for k, v in raw.items()
+        } if colour else raw
+        # Render the human message (falls back to dict string)
+        try:
+            return template.render(**ctx) if template else str(raw)
+        except Exception as e:
+            # If a msg_template references a field that doesn't exist, fail gracefully
+            return f"[TEMPLATE ERROR] {e} | raw={raw}"
 
 
     # --------------------------------------------------------------------- #
     # PATH query executor
     # --------------------------------------------------------------------- #
-    def _handle_path_query(self, query_data: dict, outfile: str):
+    def _handle_path_query(self, query_data: dict, outfile: str, echo: bool = True) -> int | None:
         try:
-            with self.driver.session(database=self.database) as session:
-                cypher   = self._render_cypher_template(query_data["query"])
-                results  = session.run(cypher)
-
-                if results.peek() is None:
-                    log_no_results()
-                    return
-
-                template = None
-                if query_data.get("msg_template"):
-                    template = self._jinja.from_string(query_data["msg_template"])
-
-                count = 0
-                path_idx = 1
-                for rec in results:
-                    raw_path = next((v for v in rec.values() if _looks_like_path(v)), None)
-                    if raw_path is None:
-                        continue
-
-                    ctx = rec.data()            # ← after we have extracted the path
-                    ctx.update({
-                        k: redify(v) if isinstance(v, (str, int, float, bool)) else v
-                        for k, v in ctx.items()
-                    })
-
-                    # start/end names now come from raw_path
-                    start_name = raw_path.start_node.get("name")
-                    end_name   = raw_path.end_node.get("name")
-
-                    # hops list
-                    hops = [
-                        {
-                            "src": rel.start_node.get("name"),
-                            "src_labels": list(rel.start_node.labels),
-                            "type": rel.type,
-                            "dst": rel.end_node.get("name"),
-                            "dst_labels": list(rel.end_node.labels),
-                        }
-                        for rel in raw_path
-                    ]
-
-                    # 4. enrich the context
-                    ctx.update({
-                        "start_name": start_name,
-                        "end_name":   end_name,
-                        "hops":       hops,
-                        "path_num":   path_idx,
-                    })
-                    ctx = deep_redify(ctx)
-
-                    # 5. render or fallback
-                    if template:
-                        try:
-                            msg = template.render(**ctx)
-                        except UndefinedError as ue:
-                            log_error(f"Template error: {ue}")
-                            msg = None
-                    else:
-                        # default text – 1 line per hop
-                        pieces = [f'{greenify("*Path " + f"{path_idx}*")} {start_name} {greenify("→")} {end_name}']
-                        for h in hops:
-                            pieces.append(
-                                f"{redify(h['src'])} ({'/'.join(h['src_labels'])}) "
-                                f"{yellowify(f"--{h['type']}→")} "
-                                f"{redify(h['dst'])} ({'/'.join(h['dst_labels'])})"
-                            )
-                        msg = "\n".join(pieces)
-
-                    if msg:
-                        self._handle_output(outfile, msg)
-                        count += 1
-                        path_idx += 1
-
-                if count == 0:
-                    log_no_results()
-                if outfile:
-                    handle_export(count, outfile)
+            template = self._get_template(query_data, "msg")
+            colour = color_enabled() and not outfile
+
+            count = 0
+            path_idx = 1
+            with TextSink(outfile, echo=echo, page_size=query_data.get("page_size")) as sink:
+                for batch in self._row_batches(query_data):
+                    start = time.perf_counter()
+                    msgs = []
+                    for ctx in batch:
+                        if msg := self._render_path_msg(template, ctx, path_idx, colour):
+                            msgs.append(msg)
+                            path_idx += 1
+                    metrics.add_render_time(time.perf_counter() - start)
+
+                    count += sink.write_batch(msgs)
+                    if sink.stopped:
+                        break
+            metrics.update(bytes=sink.bytes_written)
+
+            if outfile:
+                handle_export(count, outfile)
+            elif count == 0:
+                log_no_results()
+            return count
+
+        except Exception as e:
+            log_error(e)
+
+
+    @staticmethod
+    def _render_path_msg(template: Template | None, ctx: dict, path_idx: int,
+                         colour: bool) -> str | None:
+        from jinja2 import UndefinedError
+        ctx["path_num"] = path_idx
+        start_name, end_name, hops = ctx["start_name"], ctx["end_name"], ctx["hops"]
+        if colour:
+            ctx = deep_redify(ctx)
+
+        # render or fallback
+        if template:
+            try:
+                return template.render(**ctx)
+            except UndefinedError as ue:
+                log_error(f"Template error: {ue}")
+                return None
+        return _default_path_msg(path_idx, start_name, end_name, hops, colour)
+
+
+    # --------------------------------------------------------------------- #
+    # STRUCTURED export – raw columns into a jsonl/csv/parquet sink
+    # --------------------------------------------------------------------- #
+    def _export_structured(self, query_data: dict, outfile: str, fmt: str) -> int | None:
+        try:
+            is_path = self._is_path_query(query_data)
+            count = 0
+            with STRUCTURED_SINKS[fmt](outfile) as sink:
+                for row in self._iter_rows(query_data):
+                    count += 1
+                    sink.write_row({"path_num": count, **row} if is_path else row)
+
+            if outfile != STDOUT:
+                metrics.update(bytes=os.path.getsize(outfile))
+                handle_export(count, outfile)
+            elif count == 0:
+                log_no_results()
+            return count
 
         except Exception as e:
             log_error(e)
@@ -322,58 +999,76 @@ class Driver:
     def run_queries_to_html(
             self,
             query_ids: list[str] | None,
-            report_root: str | Path
-        ) -> None:
+            report_root: str | Path,
+            jobs: int = 1,
+            previous: str | Path | None = None,
+        ) -> int:
         """
         Execute multiple queries and write a Bootstrap-styled HTML report.
+        A manifest.json next to index.html records each page's inputs (see
+        `_page_inputs`).
 
         :param query_ids:  list of string IDs from self.queries.
                            If None → run them all.
         :param report_root: folder under which the timestamped report
                             directory will be created.
+        :param jobs:       number of queries to run concurrently. Workers
+                           share the driver's connection pool; every
+                           worker opens its own session.
+        :param previous:   an earlier report directory; pages whose inputs
+                           match its manifest are linked from it instead of
+                           being rerun.
+        :return:           the number of queries that failed; the report
+                           is written without them.
         """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        from datetime import datetime
+        from jinja2 import Environment, FileSystemLoader, select_autoescape
+
         ts_dir = Path(report_root) / datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        ts_dir.mkdir(parents=True, exist_ok=True)
+        (ts_dir / "data").mkdir(parents=True, exist_ok=True)
         env = Environment(
             loader=FileSystemLoader("templates"),
             autoescape=select_autoescape(["html", "xml"])
         )
 
-        master_rows: list[dict] = []
-
         # choose which queries to run
-        chosen = (query_ids or list(self.queries.keys()))
-
-        for qid in chosen:
-            q = self.queries.get(str(qid))
-            if not q:
+        chosen = []
+        for qid in (query_ids or list(self.queries.keys())):
+            if str(qid) not in self.queries:
                 log_yellow(f"[!] Unknown query id {qid}; skipping")
                 continue
+            chosen.append(str(qid))
+
+        # qid → master row; index.html is written in catalog order below
+        marks = self._graph_marks(self.queries[qid]["query"] for qid in chosen)
+        inputs = self._pages_inputs(chosen, marks)
+        done: dict[str, dict] = self._reuse_pages(previous, ts_dir, inputs) if previous else {}
+        pending = [qid for qid in chosen if qid not in done]
+        first_metric = len(self.metrics.entries)
+
+        # a failed query is logged and left out of the report either way
+        if jobs <= 1:
+            for qid in pending:
+                try:
+                    done[qid] = self._write_details_page(env, ts_dir, qid)
+                except Exception as e:
+                    log_error(f"Query {qid} failed: {e}")
+        else:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                futures = {
+                    pool.submit(self._write_details_page, env, ts_dir, qid): qid
+                    for qid in pending
+                }
+                for fut in as_completed(futures):
+                    qid = futures[fut]
+                    try:
+                        done[qid] = fut.result()
+                    except Exception as e:
+                        log_error(f"Query {qid} failed: {e}")
+            self._release_idle_sessions()
 
-            # -- run it -------------------------------------------------- #
-            print(f"{greenify('[+] Running query ' + qid + ':')} {q['desc']}")
-            if self._is_path_query(q):
-                messages = self._render_path_msgs(q)
-            else:
-                messages = self._render_standard_msgs(q)
-
-            # write details page
-            slug = self._slugify(q["desc"])[:60]
-            details_name = f"q-{qid.zfill(2)}_{slug}.html"
-            details_path = ts_dir / details_name
-
-            with (details_path.open("w", encoding="utf-8") as fh):
-                env.get_template("details.html.j2").stream(
-                    desc=q["desc"],
-                    rows=messages,
-                    qid=qid,
-                ).dump(fh)
-
-            master_rows.append({
-                "desc": q["desc"],
-                "file": details_name,
-                "count": len(messages)
-            })
+        master_rows = [done[qid] for qid in chosen if qid in done]
 
         # write index page
         with (ts_dir / "index.html").open("w", encoding="utf-8") as fh:
@@ -381,111 +1076,236 @@ class Driver:
                 generated=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 rows=master_rows,
             ).dump(fh)
+        self._write_manifest(ts_dir, chosen, done, inputs)
 
         print(f"{greenify('[+] HTML report written to:')} {ts_dir / 'index.html'}")
+        self.metrics.print_summary(self.metrics.entries[first_metric:])
+        failed = len(pending) - sum(qid in done for qid in pending)
+        if failed:
+            log_error(f"{failed} of {len(chosen)} queries failed")
+        return failed
 
-    # -------------------------------------------------- #
-    # “Standard” (table-like) rows → list[str]
-    # -------------------------------------------------- #
-    def _render_standard_msgs(self, q: dict) -> list[str]:
-        msgs: list[str] = []
-        with self.driver.session(database=self.database) as ses:
-            res = ses.run(self._replace_fillers_in_string(q["query"]))
-            if res.peek() is None:
-                return msgs
 
-            tmpl = Template(q["msg_template"]) if q["msg_template"] else None
-            for rec in res:
-                data = rec.data()
-                msg = tmpl.render(**data) if tmpl else str(data)
-                msgs.append(msg)
-        return msgs
+    def _reuse_pages(self, previous: str | Path, ts_dir: Path,
+                     inputs: dict[str, dict | None]) -> dict[str, dict]:
+        """
+        Hard-link (or copy, across filesystems) into `ts_dir` every page of
+        the report in `previous` whose recorded inputs equal `inputs`, under
+        the current id of its query, and return their index rows by query id.
+        """
+        previous = Path(previous)
+        try:
+            manifest = json.loads((previous / MANIFEST_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            log_yellow(f"[!] No usable manifest in {previous} ({e}); running every query")
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION:
+            log_yellow(f"[!] {previous} was written by another version; running every query")
+            return {}
+
+        # ids are positions in the sorted catalog and shift when a query is
+        # added, so earlier pages are matched on their inputs instead
+        by_inputs = {json.dumps(page["inputs"], sort_keys=True): (old_qid, page)
+                     for old_qid, page in manifest["pages"].items() if page.get("inputs")}
+        reused = {}
+        for qid, current in inputs.items():
+            match = current and by_inputs.get(json.dumps(current, sort_keys=True))
+            if not match:
+                continue
+            old_qid, page = match
+            names = self._page_files(self.queries[qid])
+            files = [(page[key], names[key]) for key in _PAGE_FILES if page.get(key)]
+            if not all((previous / old).is_file() for old, _ in files):
+                continue
+            for old, new in files:
+                if old_qid != qid and new.endswith(".html"):
+                    # the page names its query id in the title
+                    html = (previous / old).read_text(encoding="utf-8")
+                    (ts_dir / new).write_text(
+                        html.replace(f"<title>Query {old_qid} ", f"<title>Query {qid} ", 1),
+                        encoding="utf-8")
+                    continue
+                try:
+                    os.link(previous / old, ts_dir / new)
+                except OSError:
+                    shutil.copy2(previous / old, ts_dir / new)
+            reused[qid] = {**{key: value for key, value in page.items() if key != "inputs"},
+                           **{key: names[key] for key in _PAGE_FILES if page.get(key)},
+                           "key": page_key(self.queries[qid]["desc"])}
+        log_green(f"[+] Reusing {len(reused)} of {len(inputs)} pages from {previous}")
+        return reused
+
+
+    def _write_manifest(self, ts_dir: Path, chosen: list[str], done: dict[str, dict],
+                        inputs: dict[str, dict | None]) -> None:
+        from datetime import datetime
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "generated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "database": self.database,
+            "pages": {qid: {**done[qid], "inputs": inputs[qid]} for qid in chosen if qid in done},
+        }
+        with (ts_dir / MANIFEST_NAME).open("w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, indent=1, default=str)
+
+
+    def _write_details_page(self, env: Environment, ts_dir: Path, qid: str) -> dict:
+        """Run one query, write its details page and return its index row."""
+        q = self.queries[qid]
+        with self.metrics.measure(qid, q["desc"], "report") as m:
+            row = self._render_details_page(env, ts_dir, q)
+            m.rows = row["count"]
+            m.bytes = (ts_dir / row["file"]).stat().st_size
+        return row
+
+
+    def _page_files(self, q: dict) -> dict[str, str]:
+        """Report-relative names of a query's details page and raw data file (see _PAGE_FILES)."""
+        qid = q["id"].zfill(2)
+        return {"file": f"q-{qid}_{self._slugify(q['desc'])[:60]}.html",
+                "data": f"data/{page_key(q['desc'])}.jsonl"}
+
+
+    def _render_details_page(self, env: Environment, ts_dir: Path, q: dict) -> dict:
+        from report_diff import SortedRows
+        qid = q["id"]
+
+        # -- run it -------------------------------------------------- #
+        # raw rows also go, sorted, to a data file for `report diff`
+        print(f"{greenify('[+] Running query ' + qid + ':')} {q['desc']}")
+        names = self._page_files(q)
+        data_name, details_name = names["data"], names["file"]
+        raw = SortedRows(ts_dir / data_name)
+        if self._is_path_query(q):
+            messages = _CountingIterator(self._iter_path_msgs(q, raw.add))
+        else:
+            messages = _CountingIterator(self._iter_standard_msgs(q, raw.add))
 
+        # write details page
+        details_path = ts_dir / details_name
+
+        # a page that fails half-way leaves neither it nor its data file behind
+        written = False
+        try:
+            with (details_path.open("w", encoding="utf-8") as fh):
+                env.get_template("details.html.j2").stream(
+                    desc=q["desc"],
+                    rows=messages,
+                    qid=qid,
+                ).dump(fh)
+            written = True
+        finally:
+            raw.close(write=written)
+            if not written:
+                details_path.unlink(missing_ok=True)
+
+        return {
+            "desc": q["desc"],
+            "key": page_key(q["desc"]),
+            "file": details_name,
+            "data": data_name,
+            "count": messages.count
+        }
 
     # -------------------------------------------------- #
-    # Shortest-path rows → list[str]  (one msg per path)
+    # “Standard” (table-like) rows → stream of str
     # -------------------------------------------------- #
-    def _render_path_msgs(self, q: dict) -> list[str]:
-        msgs: list[str] = []
-        with self.driver.session(database=self.database) as ses:
-            res = ses.run(self._replace_fillers_in_string(q["query"]))
-            if res.peek() is None:
-                return msgs
-
-            tmpl = Template(q["msg_template"]) if q["msg_template"] else None
-            path_no = 1
-            for rec in res:
-                path = next((v for v in rec.values() if _looks_like_path(v)), None)
-                if path is None:
-                    continue
+    def _iter_standard_msgs(self, q: dict, record=None) -> Iterator[str]:
+        tmpl = self._get_template(q, "report_msg")
+        for data in self._iter_rows(q):
+            if record:
+                record(data)
+            start = time.perf_counter()
+            msg = tmpl.render(**data) if tmpl else str(data)
+            metrics.add_render_time(time.perf_counter() - start)
+            yield msg
 
-                ctx = {
-                    "start_name": path.start_node.get("name"),
-                    "end_name":   path.end_node.get("name"),
-                    "hops": [
-                        {
-                            "src": rel.start_node.get("name"),
-                            "src_labels": list(rel.start_node.labels),
-                            "type": rel.type,
-                            "dst": rel.end_node.get("name"),
-                            "dst_labels": list(rel.end_node.labels),
-                        } for rel in path
-                    ],
-                    "path_num": path_no,
-                    **rec.data(),      # include any extra RETURN cols
-                }
 
-                if tmpl:
-                    try:
-                        msgs.append(tmpl.render(**ctx))
-                    except UndefinedError as ue:
-                        log_error(f"Template error: {ue}")
-                else:
-                    # default textual rendering
-                    pieces = [f"*Path {path_no}* {ctx['start_name']} → {ctx['end_name']}"]
-                    for h in ctx["hops"]:
-                        pieces.append(
-                            f"{h['src']} ({'/'.join(h['src_labels'])}) "
-                            f"--{h['type']}→ "
-                            f"{h['dst']} ({'/'.join(h['dst_labels'])})"
-                        )
-                    msgs.append("\n".join(pieces))
-
-                path_no += 1
-        return msgs
+    # -------------------------------------------------- #
+    # Shortest-path rows → stream of str  (one msg per path)
+    # -------------------------------------------------- #
+    def _iter_path_msgs(self, q: dict, record=None) -> Iterator[str]:
+        tmpl = self._get_template(q, "report_msg")
+        from jinja2 import UndefinedError
+        path_no = 1
+        for ctx in self._iter_rows(q):
+            if record:
+                record(ctx)     # before numbering: path order is not part of the result
+            ctx["path_num"] = path_no
+            start = time.perf_counter()
+
+            if tmpl:
+                try:
+                    msg = tmpl.render(**ctx)
+                except UndefinedError as ue:
+                    log_error(f"Template error: {ue}")
+                    msg = None
+            else:
+                # default textual rendering
+                msg = _default_path_msg(path_no, ctx["start_name"], ctx["end_name"],
+                                        ctx["hops"], colour=False)
+
+            metrics.add_render_time(time.perf_counter() - start)
+            if msg is not None:
+                yield msg
+            path_no += 1
 
 
     def _slugify(self, text: str) -> str:
         return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
 
 
-    def _handle_output(self, f, message):
-        if f == "":
-            print(message)
-        else:
-            with open(f, 'a+', encoding=sys.getfilesystemencoding(), errors='replace') as file:
-                print(message)
-                file.write(strip_ansi_escape_sequences(message) + '\n')
+    def _row_batches(self, query_data: dict) -> Iterator[list[dict]]:
+        """
+        `_iter_rows` in lists of up to one fetch's worth of rows, so each
+        batch is rendered and written in one go while memory stays bounded.
+        """
+        size = query_data.get("fetch_size") or self.fetch_size or _DEFAULT_BATCH_ROWS
+        rows = self._iter_rows(query_data)
+        while batch := list(islice(rows, size)):
+            yield batch
 
 
-    def _handle_query(self, query_data: dict, outfile: str):
-        """Run a query and handle its output."""
+    def _handle_query(self, query_data: dict, outfile: str, echo: bool = True) -> int | None:
+        """Run a query and handle its output. Returns the row count, None on error."""
         if self._is_path_query(query_data):
-            self._handle_path_query(query_data, outfile)
-        else:
-            self._handle_standard_query(query_data, outfile)
+            return self._handle_path_query(query_data, outfile, echo)
+        return self._handle_standard_query(query_data, outfile, echo)
 
 
     def _is_path_query(self, query_data: dict) -> bool:
         """Check if the query is a path query."""
         return "shortestpath" in query_data['query'].lower()
 
-    def run_query(self, option: str, outfile: str):
+    def run_query(self, option: str, outfile: str, fmt: str = "text",
+                  fetch_size: int | None = None, limit: int | None = None,
+                  page_size: int | None = None, echo: bool = True) -> int | None:
+            """
+            Run catalog entry `option`; outfile "" prints to the terminal.
+            With `echo` off, text written to `outfile` is not also printed.
+            `fetch_size` overrides the entry's own fetch size for this run.
+            `limit` stops reading after that many rows and `page_size` pauses
+            terminal output every that many rows; either one also sizes the
+            fetches, so Neo4j only sends roughly the rows that are shown.
+            Returns the number of rows written, or None if the query failed.
+            """
             try:
                 q = self.queries.get(option)
-                if q:
-                    self._handle_query(q, outfile)
-                else:
+                if q and (fetch_size or limit or page_size):
+                    # limit + 1: the extra row tells whether the limit cut anything off
+                    fetch_size = fetch_size or page_size or min(
+                        limit + 1, q.get("fetch_size") or self.fetch_size or _DEFAULT_BATCH_ROWS)
+                    q = {**q, "fetch_size": fetch_size, "limit": limit, "page_size": page_size}
+                if not q:
                     log_error("Cypher does not exist!")
+                    return None
+                with self.metrics.measure(q["id"], q["desc"], "export" if outfile else "run") as m:
+                    if fmt in STRUCTURED_SINKS:
+                        count = self._export_structured(q, outfile, fmt)
+                    else:
+                        count = self._handle_query(q, outfile, echo)
+                    m.ok, m.rows = count is not None, count or 0
+                return count
             except Exception as e:
                 log_error(e)
+            return None
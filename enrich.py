@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+from log import log_default, log_green, log_error, log_yellow
+
+# Write passes run once after an ingest so queries can read derived facts
+# instead of recomputing them. The bundled catalog does not read them yet:
+# its queries must also run on graphs that were never enriched, so only
+# custom queries benefit. Each statement is an auto-commit query
+# batched with CALL { … } IN TRANSACTIONS; BATCH is replaced by the batch size.
+
+# well-known SIDs → `wellknown` property; the first four are the "broad"
+# groups nearly every principal belongs to
+_WELLKNOWN = [
+    ("DomainUsers",           'g.objectid STARTS WITH "S-1-5-21-" AND g.objectid ENDS WITH "-513"', True),
+    ("AuthenticatedUsers",    'g.objectid ENDS WITH "-S-1-5-11"', True),
+    ("Everyone",              'g.objectid ENDS WITH "-S-1-1-0"', True),
+    ("Users",                 'g.objectid ENDS WITH "-S-1-5-32-545"', True),
+    ("DomainAdmins",          'g.objectid STARTS WITH "S-1-5-21-" AND g.objectid ENDS WITH "-512"', False),
+    ("DomainControllers",     'g.objectid STARTS WITH "S-1-5-21-" AND g.objectid ENDS WITH "-516"', False),
+    ("SchemaAdmins",          'g.objectid STARTS WITH "S-1-5-21-" AND g.objectid ENDS WITH "-518"', False),
+    ("EnterpriseAdmins",      'g.objectid STARTS WITH "S-1-5-21-" AND g.objectid ENDS WITH "-519"', False),
+    ("Administrators",        'g.objectid ENDS WITH "-S-1-5-32-544"', False),
+]
+
+_WELLKNOWN_CASE = "CASE\n" + "\n".join(
+    f"  WHEN {cond} THEN '{name}'" for name, cond, _ in _WELLKNOWN) + "\nEND"
+_BROAD = ", ".join(f"'{name}'" for name, _, broad in _WELLKNOWN if broad)
+_TIER0 = ", ".join(f"'{name}'" for name, _, broad in _WELLKNOWN if not broad)
+
+STEPS: dict[str, tuple[str, list[str]]] = {
+    "wellknown": (
+        "Flag well-known groups (wellknown property, :BroadGroup label)",
+        [
+            """
+            MATCH (g:Group) WHERE g.wellknown IS NOT NULL OR g:BroadGroup
+            CALL { WITH g REMOVE g.wellknown, g:BroadGroup } IN TRANSACTIONS OF BATCH ROWS
+            """,
+            f"""
+            MATCH (g:Group)
+            WITH g, {_WELLKNOWN_CASE} AS wellknown
+            WHERE wellknown IS NOT NULL
+            CALL {{
+              WITH g, wellknown
+              SET g.wellknown = wellknown
+              FOREACH (_ IN CASE WHEN wellknown IN [{_BROAD}] THEN [1] ELSE [] END | SET g:BroadGroup)
+            }} IN TRANSACTIONS OF BATCH ROWS
+            """,
+        ],
+    ),
+    "tier0": (
+        "Label high-value nodes and effective members of privileged groups :Tier0",
+        [
+            """
+            MATCH (n:Tier0)
+            CALL { WITH n REMOVE n:Tier0 } IN TRANSACTIONS OF BATCH ROWS
+            """,
+            f"""
+            MATCH (g:Group) WHERE g.wellknown IN [{_TIER0}]
+            MATCH (m)-[:MemberOf*0..]->(g)
+            WITH DISTINCT m
+            CALL {{ WITH m SET m:Tier0 }} IN TRANSACTIONS OF BATCH ROWS
+            """,
+            """
+            MATCH (n {highvalue: true}) WHERE NOT n:Tier0
+            CALL { WITH n SET n:Tier0 } IN TRANSACTIONS OF BATCH ROWS
+            """,
+        ],
+    ),
+    "owned": (
+        "Flag groups that owned principals are effective members of (ownedmember)",
+        [
+            """
+            MATCH (g:Group {ownedmember: true})
+            CALL { WITH g REMOVE g.ownedmember } IN TRANSACTIONS OF BATCH ROWS
+            """,
+            """
+            MATCH ({owned: true})-[:MemberOf*1..]->(g:Group)
+            WITH DISTINCT g
+            CALL { WITH g SET g.ownedmember = true } IN TRANSACTIONS OF BATCH ROWS
+            """,
+        ],
+    ),
+    "membership": (
+        "Materialise transitive MemberOf as EffectiveMemberOf edges",
+        [
+            """
+            MATCH ()-[r:EffectiveMemberOf]->()
+            CALL { WITH r DELETE r } IN TRANSACTIONS OF BATCH ROWS
+            """,
+            """
+            MATCH (n) WHERE (n)-[:MemberOf]->()
+            CALL {
+              WITH n
+              MATCH (n)-[:MemberOf*1..]->(g:Group)
+              WITH DISTINCT n, g
+              CREATE (n)-[:EffectiveMemberOf]->(g)
+            } IN TRANSACTIONS OF BATCH ROWS
+            """,
+        ],
+    ),
+}
+
+# EffectiveMemberOf edges would be walked by the catalog's [r*1..] shortest
+# path queries as shortcuts, so that step only runs when asked for
+DEFAULT_STEPS = ["wellknown", "tier0", "owned"]
+
+
+def _counters(summary) -> str:
+    c = summary.counters
+    parts = [
+        f"{c.relationships_created} edges created" if c.relationships_created else "",
+        f"{c.relationships_deleted} edges deleted" if c.relationships_deleted else "",
+        f"{c.labels_added} labels added" if c.labels_added else "",
+        f"{c.labels_removed} labels removed" if c.labels_removed else "",
+        f"{c.properties_set} properties set" if c.properties_set else "",
+    ]
+    return ", ".join(p for p in parts if p) or "no changes"
+
+
+def run(driver, steps: list[str] | None = None, batch_size: int = 10_000) -> bool:
+    """
+    Run the enrichment `steps` (default: DEFAULT_STEPS) against `driver`'s
+    database, always in STEPS order since tier0 reads the wellknown flags.
+    Afterwards the result cache is dropped, as its graph fingerprint does
+    not see these properties. Returns False if a statement failed.
+    """
+    steps = steps or DEFAULT_STEPS
+    for name in [s for s in STEPS if s in steps]:
+        desc, statements = STEPS[name]
+        log_default(f"[+] {name}: {desc}")
+        for statement in statements:
+            try:
+                summary = driver.run_write(statement.replace("BATCH", str(batch_size)))
+            except Exception as e:
+                log_error(f"{name}: {e}")
+                return False
+            print(f"    {_counters(summary)}")
+
+    removed = driver.clear_result_cache()
+    if removed:
+        log_yellow(f"[!] Cleared {removed} cached results")
+    log_green("[+] Enrichment complete")
+    return True
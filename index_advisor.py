@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+import re
+from collections import defaultdict
+from typing import Iterable
+
+from log import log_default, log_green, log_yellow, log_error
+
+# (var:Label:Other {prop: value, …}) – label and map are optional
+_NODE = re.compile(r"\(\s*([A-Za-z_]\w*)?\s*((?::\s*`?\w+`?\s*)*)(\{[^}]*\})?\s*\)")
+_MAP_KEY = re.compile(r"([A-Za-z_]\w*)\s*:")
+# var.prop <operator> …
+_PREDICATE = re.compile(
+    r"\b([A-Za-z_]\w*)\.([A-Za-z_]\w*)\s*(=~|<>|<=|>=|=|<|>|STARTS\s+WITH|ENDS\s+WITH|CONTAINS|IN)\s",
+    re.IGNORECASE,
+)
+
+# what each operator needs from an index; None → no index can serve it
+_OPERATOR_INDEX = {
+    "=": "RANGE", "IN": "RANGE", "<": "RANGE", ">": "RANGE", "<=": "RANGE", ">=": "RANGE",
+    "STARTS WITH": "RANGE", "ENDS WITH": "TEXT", "CONTAINS": "TEXT",
+    "=~": None, "<>": None,
+}
+
+# the result-cache fingerprint looks up the newest lastseen on every cache miss
+_FINGERPRINT_INDEX = ("RANGE", "Base", "lastseen")
+
+# index types that can stand in for the one suggested
+_SATISFIED_BY = {"RANGE": {"RANGE", "BTREE"}, "TEXT": {"TEXT"}}
+
+
+def predicates(cypher: str) -> set[tuple[str | None, str, str]]:
+    """
+    (label, property, operator) for every property filter in `cypher`,
+    from pattern maps like `{owned: true}` and WHERE clauses like
+    `n.objectid ENDS WITH …`. label is None for label-less variables.
+    """
+    labels: dict[str, str | None] = {}
+    found: set[tuple[str | None, str, str]] = set()
+    for m in _NODE.finditer(cypher):
+        var, label_part, prop_map = m.groups()
+        label = label_part.replace("`", "").split(":")[1].strip() if label_part else None
+        if var and (label or var not in labels):
+            labels[var] = label
+        for key in _MAP_KEY.findall(prop_map or ""):
+            found.add((label, key, "="))
+    for var, prop, op in _PREDICATE.findall(cypher):
+        if var in labels:
+            found.add((labels[var], prop, " ".join(op.upper().split())))
+    return found
+
+
+def advise(queries: dict[str, dict], existing: Iterable[tuple[str, str, str]],
+           default_label: str = "Base") -> tuple[list[dict], dict[str, set[str]]]:
+    """
+    Index suggestions for the catalog.
+
+    :param existing:      (type, label, property) of the indexes already online.
+    :param default_label: label suggested for label-less filters; the query
+                          only benefits once its pattern carries that label.
+    :return: (suggestions, {"regex": ids, "unlabelled": ids}). Each suggestion
+             is {type, label, property, queries (ids), exists}.
+    """
+    have = set(existing)
+    wanted: dict[tuple[str, str, str], set[str]] = defaultdict(set)
+    notes: dict[str, set[str]] = {"regex": set(), "unlabelled": set()}
+
+    for qid, q in queries.items():
+        for label, prop, op in predicates(q["query"]):
+            index_type = _OPERATOR_INDEX.get(op)
+            if index_type is None:
+                if op == "=~":
+                    notes["regex"].add(qid)
+                continue
+            if label is None:
+                notes["unlabelled"].add(qid)
+                label = default_label
+            wanted[(index_type, label, prop)].add(qid)
+    wanted.setdefault(_FINGERPRINT_INDEX, set())   # even if no query filters on it
+
+    suggestions = []
+    for (index_type, label, prop), ids in wanted.items():
+        exists = any((t, label, prop) in have for t in _SATISFIED_BY[index_type])
+        suggestions.append({
+            "type": index_type, "label": label, "property": prop,
+            "queries": sorted(ids, key=int), "exists": exists,
+        })
+    suggestions.sort(key=lambda s: (s["exists"], -len(s["queries"]), s["label"], s["property"]))
+    return suggestions, notes
+
+
+def create_statement(suggestion: dict) -> str:
+    name = f"cypherhound_{suggestion['type']}_{suggestion['label']}_{suggestion['property']}".lower()
+    return (f"CREATE {suggestion['type']} INDEX {name} IF NOT EXISTS "
+            f"FOR (n:`{suggestion['label']}`) ON (n.`{suggestion['property']}`)")
+
+
+def _ids(ids: list[str], limit: int = 8) -> str:
+    shown = ", ".join(ids[:limit])
+    return shown + (f" … (+{len(ids) - limit})" if len(ids) > limit else "")
+
+
+def run(driver, create: bool = False, default_label: str = "Base") -> int:
+    """
+    Print index advice for `driver`'s catalog and, with `create`, build the
+    missing indexes. Returns the number of missing indexes (after creation).
+    """
+    suggestions, notes = advise(driver.queries, driver.show_indexes(), default_label)
+    missing = [s for s in suggestions if not s["exists"]]
+
+    log_default(f"[+] {len(suggestions)} useful indexes for {len(driver.queries)} queries, "
+                f"{len(missing)} missing")
+    for s in suggestions:
+        state = "exists " if s["exists"] else "MISSING"
+        used_by = f"{len(s['queries'])} queries: {_ids(s['queries'])}" if s["queries"] \
+            else "result-cache fingerprint"
+        print(f"  {state}  {s['type']:<5}  :{s['label']}({s['property']})  {used_by}")
+    if notes["unlabelled"]:
+        log_yellow(f"[!] {len(notes['unlabelled'])} queries filter label-less nodes; "
+                   f"they only use the :{default_label} indexes if their pattern adds :{default_label}")
+    if notes["regex"]:
+        log_yellow(f"[!] {len(notes['regex'])} queries filter with =~, which no index can serve; "
+                   "rewrite as STARTS WITH / ENDS WITH where possible")
+
+    if create and missing:
+        for s in missing:
+            statement = create_statement(s)
+            try:
+                driver.run_write(statement)
+                log_green(f"[+] {statement}")
+                s["exists"] = True
+            except Exception as e:
+                log_error(f"{statement}: {e}")
+        driver.run_write("CALL db.awaitIndexes(300)")
+        missing = [s for s in missing if not s["exists"]]
+    return len(missing)
@@ -1,3 +1,4 @@
+import sys
 from colorama import Fore, Style
 
 red = Fore.RED + Style.BRIGHT
@@ -6,45 +7,69 @@ reset = Style.RESET_ALL
 green = Style.BRIGHT + Fore.GREEN
 yellow = Style.BRIGHT + Fore.YELLOW
 
+# where status messages go; None means sys.stdout at call time
+stream = None
+
+
+# whether status messages carry ANSI codes; util.set_color_mode sets it
+# from --color and the stream they go to
+color = sys.stdout.isatty()
+
+
+def set_stream(f):
+    """Send status messages elsewhere, e.g. stderr when stdout carries data."""
+    global stream
+    stream = f
+
+
+def set_color(enabled):
+    global color
+    color = enabled
+
+
+def _paint(code, message):
+    return f'{code}{message}{reset}' if color else str(message)
+
+
 def log_command_invalid(e):
-    print(f'{red}[-] Invalid command: {e}{reset}')
+    print(_paint(red, f'[-] Invalid command: {e}'), file=stream)
 
 
 def log_error(e):
-    print(f'{red}[-] Error: {e}{reset}')
+    print(_paint(red, f'[-] Error: {e}'), file=stream)
 
 
 def log_no_results():
-    print(f'{red}[-] No results from cypher{reset}')
+    print(_paint(red, '[-] No results from cypher'), file=stream)
 
 
 def log_invalid_option(option):
-    print(f'{red}[-] Invalid option: {option}{reset}')
+    print(_paint(red, f'[-] Invalid option: {option}'), file=stream)
 
 
 def log_successful_export(path):
-    print(f'{green}[+] Successful export to: {path}{reset}')
+    print(_paint(green, f'[+] Successful export to: {path}'), file=stream)
 
 
 def log_config_not_set(c):
-    print(f'{red}[-] {c} is not set!{reset}')
+    print(_paint(red, f'[-] {c} is not set!'), file=stream)
 
 
 def log_successful_set(i, r):
-    print(f'{green}[+] {i} set to {r} successfully!{reset}')
+    print(_paint(green, f'[+] {i} set to {r} successfully!'), file=stream)
 
 
 def log_red(message):
-    print(f'{red}{message}{reset}')
+    print(_paint(red, message), file=stream)
 
 
 def log_green(message):
-    print(f'{green}{message}{reset}')
+    print(_paint(green, message), file=stream)
 
 
 def log_yellow(message):
-    print(f'{yellow}{message}{reset}')
+    print(_paint(yellow, message), file=stream)
 
 
 def log_default(message):
-    print(f'{default}{message}{reset}')
+    print(_paint(default, message), file=stream)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+import json, threading, time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator
+
+import log
+from log import log_yellow, log_default
+
+# the measurement the running query reports into; a ContextVar so that report
+# worker threads and asyncio tasks each see their own
+_current: ContextVar["QueryMetrics | None"] = ContextVar("query_metrics", default=None)
+
+
+class QueryMetrics:
+    """Timings and volumes for one execution of a catalog query."""
+
+    __slots__ = ("qid", "desc", "command", "cypher", "cached", "ok", "rows", "bytes", "truncated",
+                 "available_after_ms", "consumed_after_ms", "render_s", "wall_s", "started")
+
+    def __init__(self, qid: str, desc: str, command: str):
+        self.qid = qid
+        self.desc = desc
+        self.command = command
+        self.cypher = None
+        self.cached = False
+        self.ok = True
+        self.rows = 0
+        self.bytes = 0
+        self.truncated = False            # a row limit cut the result short
+        self.available_after_ms = None    # Neo4j: time until the first record was ready
+        self.consumed_after_ms = None     # Neo4j: time until the last record was streamed
+        self.render_s = 0.0
+        self.wall_s = 0.0
+        self.started = time.time()
+
+    @property
+    def neo4j_ms(self) -> int | None:
+        if self.available_after_ms is None:
+            return None
+        return self.available_after_ms + (self.consumed_after_ms or 0)
+
+    def as_dict(self) -> dict:
+        return {
+            "ts":                 round(self.started, 3),
+            "qid":                self.qid,
+            "desc":               self.desc,
+            "command":            self.command,
+            "ok":                 self.ok,
+            "cached":             self.cached,
+            "rows":               self.rows,
+            "bytes":              self.bytes,
+            "truncated":          self.truncated,
+            "available_after_ms": self.available_after_ms,
+            "consumed_after_ms":  self.consumed_after_ms,
+            "render_ms":          round(self.render_s * 1000, 1),
+            "wall_ms":            round(self.wall_s * 1000, 1),
+        }
+
+
+def update(**fields) -> None:
+    """Set fields on the measurement in progress, if any."""
+    m = _current.get()
+    if m is not None:
+        for name, value in fields.items():
+            setattr(m, name, value)
+
+
+def add_render_time(seconds: float) -> None:
+    m = _current.get()
+    if m is not None:
+        m.render_s += seconds
+
+
+def note_summary(summary) -> None:
+    """Record the server timings from a neo4j ResultSummary."""
+    m = _current.get()
+    if m is not None:
+        m.available_after_ms = summary.result_available_after
+        m.consumed_after_ms = summary.result_consumed_after
+
+
+class Metrics:
+    """
+    Collects a QueryMetrics per executed query. Finished measurements are
+    appended to a JSONL file (when `path` is set; opened once and kept open
+    until `close`) and kept in `entries` for summaries; queries slower than
+    `slow_ms` have their cypher logged.
+    """
+
+    def __init__(self, path: str | Path | None = None, slow_ms: int | None = None):
+        self.path = Path(path) if path else None
+        self.slow_ms = slow_ms
+        self.entries: list[QueryMetrics] = []
+        self._lock = threading.Lock()
+        self._fh = None
+
+    @contextmanager
+    def measure(self, qid: str, desc: str, command: str) -> Iterator[QueryMetrics]:
+        m = QueryMetrics(qid, desc, command)
+        token = _current.set(m)
+        start = time.perf_counter()
+        try:
+            yield m
+        except BaseException:
+            m.ok = False
+            raise
+        finally:
+            m.wall_s = time.perf_counter() - start
+            _current.reset(token)
+            self._finish(m)
+
+    def _finish(self, m: QueryMetrics) -> None:
+        with self._lock:
+            self.entries.append(m)
+            if self.path:
+                try:
+                    if self._fh is None:
+                        self.path.parent.mkdir(parents=True, exist_ok=True)
+                        self._fh = self.path.open("a", encoding="utf-8", buffering=1)
+                    self._fh.write(json.dumps(m.as_dict()) + "\n")
+                except OSError:
+                    self.path = None  # metrics are best effort: stop trying
+
+        if self.slow_ms and m.wall_s * 1000 >= self.slow_ms:
+            log_yellow(f"[!] Slow query {m.qid} ({m.wall_s * 1000:.0f} ms): {m.desc}")
+            if m.cypher:
+                log_default(m.cypher.strip())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def print_summary(self, entries: list[QueryMetrics], top: int = 15) -> None:
+        """Slowest `top` of `entries` plus totals, as a fixed-width table."""
+        if not entries:
+            return
+        slowest = sorted(entries, key=lambda m: m.wall_s, reverse=True)[:top]
+
+        def ms(value) -> str:
+            return "-" if value is None else f"{value:,.0f}"
+
+        log_default(f"[+] Query timings ({len(slowest)} slowest of {len(entries)})")
+        print(f"{'ID':>5}  {'Rows':>9}  {'Neo4j ms':>9}  {'Render ms':>9}  {'Total ms':>9}  Description",
+              file=log.stream)
+        for m in slowest:
+            neo4j = "cache" if m.cached else ms(m.neo4j_ms)
+            print(f"{m.qid:>5}  {m.rows:>9,}  {neo4j:>9}  {ms(m.render_s * 1000):>9}  "
+                  f"{ms(m.wall_s * 1000):>9}  {m.desc[:60]}", file=log.stream)
+        print(f"{'all':>5}  {sum(m.rows for m in entries):>9,}  "
+              f"{ms(sum(m.neo4j_ms or 0 for m in entries)):>9}  "
+              f"{ms(sum(m.render_s for m in entries) * 1000):>9}  "
+              f"{ms(sum(m.wall_s for m in entries) * 1000):>9}", file=log.stream)
@@ -0,0 +1,1695 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+import math, re, time
+from collections import deque
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+
+import path_engine
+from offline_graph import Graph, Node, Relationship, Path
+
+# Read-only Cypher for an offline Graph. The subset covers what the query
+# catalog uses: MATCH / OPTIONAL MATCH with labels, property maps, typed and
+# variable-length relationships and shortestPath, WHERE, WITH, UNWIND and
+# RETURN with DISTINCT, aggregation, ORDER BY, SKIP and LIMIT. Expressions
+# are compiled into closures over a row dict (variable → value).
+
+
+class CypherError(RuntimeError):
+    """Cypher the offline engine cannot parse or does not support."""
+
+
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+|//[^\n]*|/\*.*?\*/)
+  | (?P<str>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<num>\d+\.\d+(?:[eE][-+]?\d+)?|\d+(?:[eE][-+]?\d+)?)
+  | (?P<param>\$(?:\w+|`[^`]+`))
+  | (?P<id>[A-Za-z_]\w*)
+  | (?P<qid>`[^`]+`)
+  | (?P<op><-|->|\.\.|<>|<=|>=|=~|!=|[-+*/%^=<>()\[\]{},:.|;])
+""", re.X | re.S)
+
+_ESCAPES = {"\\": "\\", "'": "'", '"': '"', "n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+_UNSUPPORTED = {"CREATE", "MERGE", "SET", "DELETE", "DETACH", "REMOVE", "FOREACH", "CALL",
+                "LOAD", "SHOW", "PROFILE", "EXPLAIN", "UNION", "USE", "DROP"}
+
+
+def _tokenize(text: str) -> list[tuple[str, object, int, int]]:
+    tokens, pos = [], 0
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if not m:
+            raise CypherError(f"unexpected character {text[pos]!r} at offset {pos}")
+        kind, raw = m.lastgroup, m.group()
+        if kind == "str":
+            tokens.append(("str", _unescape(raw[1:-1]), m.start(), m.end()))
+        elif kind == "num":
+            tokens.append(("num", float(raw) if "." in raw or "e" in raw.lower() else int(raw),
+                           m.start(), m.end()))
+        elif kind == "param":
+            tokens.append(("param", raw[1:].strip("`"), m.start(), m.end()))
+        elif kind == "qid":
+            tokens.append(("qid", raw[1:-1], m.start(), m.end()))
+        elif kind != "ws":
+            tokens.append((kind, raw, m.start(), m.end()))
+        pos = m.end()
+    tokens.append(("eof", None, len(text), len(text)))
+    return tokens
+
+
+def _unescape(s: str) -> str:
+    out, i = [], 0
+    while i < len(s):
+        c = s[i]
+        if c == "\\" and i + 1 < len(s):
+            nxt = s[i + 1]
+            if nxt in _ESCAPES:
+                out.append(_ESCAPES[nxt])
+                i += 2
+                continue
+            if nxt in "uU" and re.fullmatch(r"[0-9a-fA-F]{4}", s[i + 2:i + 6]):
+                out.append(chr(int(s[i + 2:i + 6], 16)))
+                i += 6
+                continue
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+
+# --------------------------------------------------------------------- #
+# value semantics
+# --------------------------------------------------------------------- #
+def _eq(a, b):
+    """Cypher `=`: null if either side is null, no bool/number coercion."""
+    if a is None or b is None:
+        return None
+    if isinstance(a, bool) != isinstance(b, bool):
+        return False
+    if isinstance(a, list) and isinstance(b, list):
+        if len(a) != len(b):
+            return False
+        results = [_eq(x, y) for x, y in zip(a, b)]
+        return False if False in results else (None if None in results else True)
+    return a == b
+
+
+def _compare(a, b, op):
+    if a is None or b is None or isinstance(a, bool) != isinstance(b, bool):
+        return None
+    try:
+        return op(a, b)
+    except TypeError:
+        return None
+
+
+def _and(a, b):
+    if a is False or b is False:
+        return False
+    return None if a is None or b is None else True
+
+
+def _or(a, b):
+    if a is True or b is True:
+        return True
+    return None if a is None or b is None else False
+
+
+def _in(value, items):
+    if items is None:
+        return None
+    seen_null = value is None
+    for item in items:
+        r = _eq(value, item)
+        if r:
+            return True
+        seen_null |= r is None
+    return None if seen_null else False
+
+
+_regex_cache: dict[str, re.Pattern] = {}
+
+
+def _regex(pattern: str) -> re.Pattern:
+    """Java regex → Python; inline (?i) may sit anywhere in Java, so it becomes a global flag."""
+    rx = _regex_cache.get(pattern)
+    if rx is None:
+        flags = 0
+        body = pattern
+        for flag, value in (("i", re.I), ("s", re.S), ("m", re.M)):
+            if f"(?{flag})" in body:
+                body = body.replace(f"(?{flag})", "")
+                flags |= value
+        try:
+            rx = re.compile(body, flags)
+        except re.error as e:
+            raise CypherError(f"invalid regular expression {pattern!r}: {e}") from e
+        _regex_cache[pattern] = rx
+    return rx
+
+
+def _regex_match(s, pattern):
+    if not isinstance(s, str) or not isinstance(pattern, str):
+        return None
+    return _regex(pattern).fullmatch(s) is not None
+
+
+def _string_op(test):
+    def op(a, b):
+        if not isinstance(a, str) or not isinstance(b, str):
+            return None
+        return test(a, b)
+    return op
+
+
+def _add(a, b):
+    if a is None or b is None:
+        return None
+    if isinstance(a, list):
+        return a + (b if isinstance(b, list) else [b])
+    if isinstance(b, list):
+        return [a] + b
+    if isinstance(a, str) or isinstance(b, str):
+        return _to_string(a) + _to_string(b)
+    return a + b
+
+
+def _arith(op):
+    def f(a, b):
+        if a is None or b is None:
+            return None
+        try:
+            return op(a, b)
+        except (TypeError, ZeroDivisionError) as e:
+            raise CypherError(str(e)) from e
+    return f
+
+
+def _div(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        return int(a / b)   # Cypher truncates integer division toward zero
+    return a / b
+
+
+def _to_string(v):
+    if v is None:
+        return None
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    return str(v)
+
+
+def _to_int(v):
+    if v is None or isinstance(v, bool):
+        return None if v is None else int(v)
+    try:
+        return int(float(v)) if isinstance(v, str) else int(v)
+    except ValueError:
+        return None
+
+
+def _to_float(v):
+    try:
+        return None if v is None else float(v)
+    except ValueError:
+        return None
+
+
+def _property(value, key):
+    if value is None:
+        return None
+    if isinstance(value, Node):
+        return value.graph.prop(value.id, key)
+    if isinstance(value, dict):
+        return value.get(key, value.get(key.lower()))
+    if isinstance(value, Relationship):
+        return None
+    raise CypherError(f"cannot read property {key!r} of {type(value).__name__}")
+
+
+def _datetime(*args):
+    if args:
+        raise CypherError("datetime() only supports the current time offline")
+    now = time.time()
+    return {"epochseconds": int(now), "epochSeconds": int(now),
+            "epochmillis": int(now * 1000), "epochMillis": int(now * 1000)}
+
+
+def _nodes(p):
+    return p.nodes if isinstance(p, Path) else None
+
+
+def _relationships(p):
+    return p.relationships if isinstance(p, Path) else None
+
+
+def _length(v):
+    return len(v) if isinstance(v, (Path, list, str)) else None
+
+
+def _substring(s, start, length=None):
+    return s[start:] if length is None else s[start:start + length]
+
+
+def _range(start, end, step=1):
+    return list(range(start, end + (1 if step > 0 else -1), step))
+
+
+# name → (callable, null-in gives null-out)
+_FUNCTIONS: dict[str, tuple[Callable, bool]] = {
+    "labels":        (lambda n: n.graph.labels(n.id), True),
+    "type":          (lambda r: r.type, True),
+    "id":            (lambda x: x.id, True),
+    "elementid":     (lambda x: x.element_id, True),
+    "startnode":     (lambda r: r.start_node, True),
+    "endnode":       (lambda r: r.end_node, True),
+    "nodes":         (_nodes, True),
+    "relationships": (_relationships, True),
+    "rels":          (_relationships, True),
+    "length":        (_length, True),
+    "size":          (lambda v: len(v), True),
+    "keys":          (lambda x: list(x.graph.node_props(x.id)) if isinstance(x, Node) else list(x), True),
+    "properties":    (lambda x: x.graph.node_props(x.id) if isinstance(x, Node) else dict(x), True),
+    "head":          (lambda v: v[0] if v else None, True),
+    "last":          (lambda v: v[-1] if v else None, True),
+    "tail":          (lambda v: v[1:], True),
+    "reverse":       (lambda v: v[::-1], True),
+    "tolower":       (lambda s: s.lower(), True),
+    "toupper":       (lambda s: s.upper(), True),
+    "trim":          (lambda s: s.strip(), True),
+    "ltrim":         (lambda s: s.lstrip(), True),
+    "rtrim":         (lambda s: s.rstrip(), True),
+    "split":         (lambda s, d: s.split(d), True),
+    "replace":       (lambda s, a, b: s.replace(a, b), True),
+    "substring":     (_substring, True),
+    "left":          (lambda s, n: s[:n], True),
+    "right":         (lambda s, n: s[-n:] if n else "", True),
+    "tostring":      (_to_string, True),
+    "tointeger":     (_to_int, True),
+    "tofloat":       (_to_float, True),
+    "toboolean":     (lambda v: v if isinstance(v, bool) else {"true": True, "false": False}.get(str(v).lower()), True),
+    "abs":           (abs, True),
+    "round":         (lambda v: float(math.floor(v + 0.5)), True),
+    "floor":         (lambda v: float(math.floor(v)), True),
+    "ceil":          (lambda v: float(math.ceil(v)), True),
+    "range":         (_range, True),
+    "coalesce":      (lambda *vs: next((v for v in vs if v is not None), None), False),
+    "exists":        (lambda v: v is not None, False),
+    "datetime":      (_datetime, False),
+    "timestamp":     (lambda: int(time.time() * 1000), False),
+}
+
+_AGGREGATES = {"count", "collect", "max", "min", "sum", "avg"}
+
+
+def _sort_key(v):
+    """Cypher orderability: maps, nodes, rels, lists, paths, strings, booleans, numbers, null last."""
+    if v is None:
+        return (9, 0)
+    if isinstance(v, bool):
+        return (6, v)
+    if isinstance(v, (int, float)):
+        return (7, v)
+    if isinstance(v, str):
+        return (5, v)
+    if isinstance(v, dict):
+        return (0, sorted((k, _sort_key(x)) for k, x in v.items()))
+    if isinstance(v, Node):
+        return (1, v.id)
+    if isinstance(v, Relationship):
+        return (2, v.id)
+    if isinstance(v, list):
+        return (3, [_sort_key(x) for x in v])
+    if isinstance(v, Path):
+        return (4, v.edge_ids)
+    return (8, str(v))
+
+
+def _hashable(v):
+    if isinstance(v, list):
+        return ("l",) + tuple(_hashable(x) for x in v)
+    if isinstance(v, dict):
+        return ("m",) + tuple(sorted((k, _hashable(x)) for k, x in v.items()))
+    if isinstance(v, bool):
+        return ("b", v)   # keep true apart from 1
+    return v
+
+
+# --------------------------------------------------------------------- #
+# AST
+# --------------------------------------------------------------------- #
+class _Expr:
+    """
+    Compiled expression. `fn(row)` evaluates it; `vars` are the variables it
+    reads. Aggregates carry agg=(name, distinct, argument) instead of a fn.
+    `rel_filter` marks NONE/ALL(x IN relationships(p) WHERE …) so
+    shortestPath can test it per edge while searching.
+    """
+    __slots__ = ("fn", "vars", "agg", "rel_filter", "conjuncts", "text", "name", "rels_of")
+
+    def __init__(self, fn, vars=frozenset(), agg=None, rel_filter=None, conjuncts=None):
+        self.fn, self.vars, self.agg = fn, frozenset(vars), agg
+        self.rel_filter, self.conjuncts, self.text = rel_filter, conjuncts, ""
+        self.name = self.rels_of = None   # bare variable / relationships(<variable>)
+
+
+def _const(value) -> _Expr:
+    return _Expr(lambda row: value)
+
+
+def _vars_of(*exprs: _Expr) -> frozenset:
+    for e in exprs:
+        if e.agg is not None:
+            raise CypherError("aggregations are only supported as whole RETURN/WITH items offline")
+    return frozenset().union(*(e.vars for e in exprs))
+
+
+def _split_and(expr: _Expr | None) -> list[_Expr]:
+    if expr is None:
+        return []
+    if expr.conjuncts:
+        return [c for part in expr.conjuncts for c in _split_and(part)]
+    return [expr]
+
+
+class _NodePat:
+    __slots__ = ("var", "labels", "props")
+
+    def __init__(self, var, labels, props):
+        self.var, self.labels, self.props = var, labels, props
+
+
+class _RelPat:
+    __slots__ = ("var", "types", "direction", "varlen", "lo", "hi", "props")
+
+    def __init__(self, var, types, direction, varlen, lo, hi, props):
+        self.var, self.types, self.direction = var, types, direction
+        self.varlen, self.lo, self.hi, self.props = varlen, lo, hi, props
+
+    def flipped(self) -> _RelPat:
+        flip = {">": "<", "<": ">", "-": "-"}[self.direction]
+        return _RelPat(self.var, self.types, flip, self.varlen, self.lo, self.hi, self.props)
+
+
+class _Part:
+    __slots__ = ("path_var", "shortest", "nodes", "rels")
+
+    def __init__(self, path_var, shortest, nodes, rels):
+        self.path_var, self.shortest, self.nodes, self.rels = path_var, shortest, nodes, rels
+
+    def vars(self) -> set[str]:
+        names = {n.var for n in self.nodes} | {r.var for r in self.rels if r.var}
+        return names | ({self.path_var} if self.path_var else set())
+
+
+class _Projection:
+    def __init__(self, star, items, distinct, order, skip, limit, where):
+        self.star, self.items, self.distinct = star, items, distinct
+        self.order, self.skip, self.limit, self.where = order, skip, limit, where
+
+
+# --------------------------------------------------------------------- #
+# parser
+# --------------------------------------------------------------------- #
+class _Parser:
+    def __init__(self, text: str, params: dict, matcher: _Matcher):
+        self.src, self.toks, self.i = text, _tokenize(text), 0
+        self.params, self.matcher = params, matcher
+        self._anon = 0
+        self._rel_vars: set[str] = set()
+        self.pattern_parts: list[_Part] = []    # `(a)-[:T]->(b)` used as predicates
+
+    # -- token helpers ---------------------------------------------------- #
+    def peek(self, k: int = 0):
+        return self.toks[min(self.i + k, len(self.toks) - 1)]
+
+    def next(self):
+        tok = self.toks[self.i]
+        self.i += 1
+        return tok
+
+    def is_kw(self, *words, k: int = 0) -> bool:
+        kind, value, *_ = self.peek(k)
+        return kind == "id" and value.upper() in words
+
+    def accept_kw(self, *words) -> bool:
+        if self.is_kw(*words):
+            self.i += 1
+            return True
+        return False
+
+    def expect_kw(self, word: str):
+        if not self.accept_kw(word):
+            self.fail(f"expected {word}")
+
+    def is_op(self, op: str, k: int = 0) -> bool:
+        kind, value, *_ = self.peek(k)
+        return kind == "op" and value == op
+
+    def accept(self, op: str) -> bool:
+        if self.is_op(op):
+            self.i += 1
+            return True
+        return False
+
+    def expect(self, op: str):
+        if not self.accept(op):
+            self.fail(f"expected {op!r}")
+
+    def fail(self, msg: str):
+        kind, value, start, _ = self.peek()
+        found = "end of query" if kind == "eof" else repr(value)
+        raise CypherError(f"{msg} at offset {start}, found {found}")
+
+    def name(self) -> str:
+        kind, value, *_ = self.peek()
+        if kind not in ("id", "qid"):
+            self.fail("expected a name")
+        self.i += 1
+        return value
+
+    def anon(self) -> str:
+        self._anon += 1
+        return f"  anon{self._anon}"
+
+    # -- clauses ---------------------------------------------------------- #
+    def query(self) -> list[tuple]:
+        clauses = []
+        while self.peek()[0] != "eof":
+            if self.accept(";"):
+                continue
+            if self.is_kw(*_UNSUPPORTED):
+                self.fail(f"{self.peek()[1].upper()} is not supported by the offline graph")
+            if self.accept_kw("MATCH"):
+                clauses.append(("match", self.match_body(), False))
+            elif self.accept_kw("OPTIONAL"):
+                self.expect_kw("MATCH")
+                clauses.append(("match", self.match_body(), True))
+            elif self.accept_kw("UNWIND"):
+                expr = self.expression()
+                self.expect_kw("AS")
+                clauses.append(("unwind", expr, self.name()))
+            elif self.accept_kw("WITH"):
+                clauses.append(("with", self.projection(allow_where=True)))
+            elif self.accept_kw("RETURN"):
+                clauses.append(("return", self.projection(allow_where=False)))
+                while self.accept(";"):
+                    pass
+                if self.peek()[0] != "eof":
+                    self.fail("expected end of query after RETURN")
+            else:
+                self.fail("expected a clause")
+        if not clauses or clauses[-1][0] != "return":
+            raise CypherError("the offline graph only runs queries that end in RETURN")
+        return clauses
+
+    def match_body(self):
+        parts = [self.pattern_part()]
+        while self.accept(","):
+            parts.append(self.pattern_part())
+        where = self.expression() if self.accept_kw("WHERE") else None
+        return parts, where
+
+    def projection(self, allow_where: bool) -> _Projection:
+        distinct = self.accept_kw("DISTINCT")
+        star, items = False, []
+        if self.accept("*"):
+            star = True
+            self.matcher.referenced = _Everything()
+        while not star or self.accept(","):
+            start = self.peek()[2]
+            expr = self.expression()
+            expr.text = self.src[start:self.toks[self.i - 1][3]]
+            alias = self.name() if self.accept_kw("AS") else expr.text
+            items.append((expr, alias))
+            if not self.accept(","):
+                break
+        order = []
+        if self.is_kw("ORDER"):
+            self.next()
+            self.expect_kw("BY")
+            while True:
+                expr = self.expression()
+                desc = False
+                if self.accept_kw("DESC", "DESCENDING"):
+                    desc = True
+                else:
+                    self.accept_kw("ASC", "ASCENDING")
+                order.append((expr, desc))
+                if not self.accept(","):
+                    break
+        skip = self.expression() if self.accept_kw("SKIP") else None
+        limit = self.expression() if self.accept_kw("LIMIT") else None
+        where = self.expression() if allow_where and self.accept_kw("WHERE") else None
+        return _Projection(star, items, distinct, order, skip, limit, where)
+
+    # -- patterns --------------------------------------------------------- #
+    def pattern_part(self) -> _Part:
+        path_var = None
+        if self.peek()[0] in ("id", "qid") and self.is_op("=", 1):
+            path_var = self.name()
+            self.next()
+        shortest = None
+        if self.is_kw("SHORTESTPATH", "ALLSHORTESTPATHS") and self.is_op("(", 1):
+            shortest = "all" if self.next()[1].upper() == "ALLSHORTESTPATHS" else "one"
+            self.expect("(")
+        nodes, rels = self.chain()
+        if shortest:
+            self.expect(")")
+            if len(rels) != 1:
+                raise CypherError("shortestPath needs a single relationship pattern")
+            if not rels[0].varlen:
+                rels[0] = _RelPat(rels[0].var, rels[0].types, rels[0].direction, True, 1, 1, rels[0].props)
+        return _Part(path_var, shortest, nodes, rels)
+
+    def chain(self):
+        nodes, rels = [self.node_pattern()], []
+        while self.is_op("-") or self.is_op("<-"):
+            rels.append(self.rel_pattern())
+            nodes.append(self.node_pattern())
+        return nodes, rels
+
+    def node_pattern(self) -> _NodePat:
+        self.expect("(")
+        var = self.name() if self.peek()[0] in ("id", "qid") else self.anon()
+        labels = []
+        while self.accept(":"):
+            labels.append(self.name())
+        props = self.map_items() if self.is_op("{") else []
+        self.expect(")")
+        return _NodePat(var, labels, props)
+
+    def rel_pattern(self) -> _RelPat:
+        left = self.accept("<-")
+        if not left:
+            self.expect("-")
+        var, types, varlen, lo, hi, props = None, [], False, 1, 1, []
+        if self.accept("["):
+            if self.peek()[0] in ("id", "qid"):
+                var = self.name()
+                if var in self._rel_vars:           # reused to join two patterns
+                    self.matcher.referenced.add(var)
+                self._rel_vars.add(var)
+            if self.accept(":"):
+                types.append(self.name())
+                while self.accept("|"):
+                    self.accept(":")
+                    types.append(self.name())
+            if self.accept("*"):
+                varlen, lo, hi = True, 1, None
+                if self.peek()[0] == "num":
+                    lo = hi = self.next()[1]
+                if self.accept(".."):
+                    hi = self.next()[1] if self.peek()[0] == "num" else None
+            if self.is_op("{"):
+                props = self.map_items()
+            self.expect("]")
+        right = self.accept("->")
+        if not right:
+            self.expect("-")
+        direction = ">" if right and not left else "<" if left and not right else "-"
+        return _RelPat(var, types, direction, varlen, lo, hi, props)
+
+    def map_items(self) -> list[tuple[str, _Expr]]:
+        self.expect("{")
+        items = []
+        while not self.accept("}"):
+            key = self.next()[1] if self.peek()[0] == "str" else self.name()
+            self.expect(":")
+            items.append((key, self.expression()))
+            if not self.accept(","):
+                self.expect("}")
+                break
+        return items
+
+    # -- expressions ------------------------------------------------------ #
+    def expression(self) -> _Expr:
+        return self.or_expr()
+
+    def or_expr(self) -> _Expr:
+        left = self.xor_expr()
+        while self.accept_kw("OR"):
+            right = self.xor_expr()
+            left = self._binary(left, right, _or)
+        return left
+
+    def xor_expr(self) -> _Expr:
+        left = self.and_expr()
+        while self.accept_kw("XOR"):
+            right = self.and_expr()
+            left = self._binary(left, right, lambda a, b: None if a is None or b is None else a != b)
+        return left
+
+    def and_expr(self) -> _Expr:
+        parts = [self.not_expr()]
+        while self.accept_kw("AND"):
+            parts.append(self.not_expr())
+        if len(parts) == 1:
+            return parts[0]
+        fns = [p.fn for p in parts]
+
+        def fn(row):
+            result = True
+            for f in fns:
+                result = _and(result, f(row))
+                if result is False:
+                    return False
+            return result
+        return _Expr(fn, _vars_of(*parts), conjuncts=parts)
+
+    def not_expr(self) -> _Expr:
+        if self.accept_kw("NOT"):
+            inner = self.not_expr()
+            f = inner.fn
+            return _Expr(lambda row: None if (v := f(row)) is None else not v, _vars_of(inner))
+        return self.comparison()
+
+    def comparison(self) -> _Expr:
+        left = self.additive()
+        while True:
+            kind, value, *_ = self.peek()
+            if kind == "op" and value in ("=", "<>", "!=", "<", ">", "<=", ">=", "=~"):
+                self.next()
+                right = self.additive()
+                op = {
+                    "=":  _eq,
+                    "<>": lambda a, b: None if (r := _eq(a, b)) is None else not r,
+                    "!=": lambda a, b: None if (r := _eq(a, b)) is None else not r,
+                    "<":  lambda a, b: _compare(a, b, lambda x, y: x < y),
+                    ">":  lambda a, b: _compare(a, b, lambda x, y: x > y),
+                    "<=": lambda a, b: _compare(a, b, lambda x, y: x <= y),
+                    ">=": lambda a, b: _compare(a, b, lambda x, y: x >= y),
+                    "=~": _regex_match,
+                }[value]
+                left = self._binary(left, right, op)
+            elif self.is_kw("STARTS") and self.is_kw("WITH", k=1):
+                self.i += 2
+                left = self._binary(left, self.additive(), _string_op(str.startswith))
+            elif self.is_kw("ENDS") and self.is_kw("WITH", k=1):
+                self.i += 2
+                left = self._binary(left, self.additive(), _string_op(str.endswith))
+            elif self.accept_kw("CONTAINS"):
+                left = self._binary(left, self.additive(), _string_op(lambda a, b: b in a))
+            elif self.accept_kw("IN"):
+                left = self._binary(left, self.additive(), _in)
+            elif self.accept_kw("IS"):
+                negate = self.accept_kw("NOT")
+                self.expect_kw("NULL")
+                f = left.fn
+                left = _Expr((lambda row: f(row) is not None) if negate else (lambda row: f(row) is None),
+                             _vars_of(left))
+            else:
+                return left
+
+    def additive(self) -> _Expr:
+        left = self.multiplicative()
+        while self.is_op("+") or self.is_op("-"):
+            op = _add if self.next()[1] == "+" else _arith(lambda a, b: a - b)
+            left = self._binary(left, self.multiplicative(), op)
+        return left
+
+    def multiplicative(self) -> _Expr:
+        left = self.unary()
+        while self.is_op("*") or self.is_op("/") or self.is_op("%") or self.is_op("^"):
+            symbol = self.next()[1]
+            op = {"*": lambda a, b: a * b, "/": _div, "%": lambda a, b: a % b,
+                  "^": lambda a, b: float(a) ** b}[symbol]
+            left = self._binary(left, self.unary(), _arith(op))
+        return left
+
+    def unary(self) -> _Expr:
+        if self.accept("-"):
+            inner = self.unary()
+            f = inner.fn
+            return _Expr(lambda row: None if (v := f(row)) is None else -v, _vars_of(inner))
+        self.accept("+")
+        return self.postfix()
+
+    def postfix(self) -> _Expr:
+        expr = self.atom()
+        while True:
+            if self.accept("."):
+                key = self.name()
+                f = expr.fn
+                expr = _Expr(lambda row, f=f, key=key: _property(f(row), key), _vars_of(expr))
+            elif self.is_op("["):
+                self.next()
+                expr = self._subscript(expr)
+            elif self.is_op("{") and expr.name:
+                expr = self._map_projection(expr)
+            elif self.is_op(":") and expr.vars and self.peek(1)[0] in ("id", "qid"):
+                labels = []
+                while self.accept(":"):
+                    labels.append(self.name())
+                f = expr.fn
+
+                def has_labels(row, f=f, labels=labels):
+                    node = f(row)
+                    if node is None:
+                        return None
+                    return all(label in node.graph.labels(node.id) for label in labels)
+                expr = _Expr(has_labels, _vars_of(expr))
+            else:
+                return expr
+
+    def _map_projection(self, expr: _Expr) -> _Expr:
+        """n {.name, .objectid, key: expr, .*}"""
+        self.expect("{")
+        entries: list[tuple[str | None, _Expr | None]] = []   # (None, None) is .*
+        while not self.accept("}"):
+            if self.accept("."):
+                if self.accept("*"):
+                    entries.append((None, None))
+                else:
+                    entries.append((self.name(), None))
+            else:
+                key = self.name()
+                self.expect(":")
+                entries.append((key, self.expression()))
+            if not self.accept(","):
+                self.expect("}")
+                break
+        f = expr.fn
+
+        def project(row):
+            subject = f(row)
+            if subject is None:
+                return None
+            out = {}
+            for key, value in entries:
+                if key is None:
+                    out.update(_FUNCTIONS["properties"][0](subject))
+                elif value is None:
+                    out[key] = _property(subject, key)
+                else:
+                    out[key] = value.fn(row)
+            return out
+        return _Expr(project, _vars_of(expr, *(v for _, v in entries if v is not None)))
+
+    def _subscript(self, expr: _Expr) -> _Expr:
+        f = expr.fn
+        start = None if self.is_op("..") else self.expression()
+        if self.accept(".."):
+            end = None if self.is_op("]") else self.expression()
+            self.expect("]")
+            sf = start.fn if start else (lambda row: None)
+            ef = end.fn if end else (lambda row: None)
+
+            def slice_(row):
+                v = f(row)
+                return None if v is None else v[sf(row):ef(row)]
+            return _Expr(slice_, _vars_of(expr, *(e for e in (start, end) if e)))
+        self.expect("]")
+        kf = start.fn
+
+        def index(row):
+            v, k = f(row), kf(row)
+            if v is None or k is None:
+                return None
+            if isinstance(k, str):
+                return _property(v, k)
+            try:
+                return v[k]
+            except IndexError:
+                return None
+        return _Expr(index, _vars_of(expr, start))
+
+    def atom(self) -> _Expr:
+        kind, value, *_ = self.peek()
+        if kind in ("num", "str"):
+            self.next()
+            return _const(value)
+        if kind == "param":
+            self.next()
+            if value not in self.params:
+                raise CypherError(f"expected parameter ${value}")
+            params = self.params
+            return _Expr(lambda row: params.get(value))
+        if self.accept_kw("TRUE"):
+            return _const(True)
+        if self.accept_kw("FALSE"):
+            return _const(False)
+        if self.accept_kw("NULL"):
+            return _const(None)
+        if self.is_op("["):
+            return self.list_literal()
+        if self.is_op("{"):
+            items = self.map_items()
+            return self._map_expr(items)
+        if self.is_op("("):
+            pattern = self.try_pattern_predicate()
+            if pattern is not None:
+                return pattern
+            self.next()
+            expr = self.expression()
+            self.expect(")")
+            return expr
+        if self.is_kw("CASE"):
+            self.next()
+            return self.case_expr()
+        if kind == "id" and self.is_op("(", 1):
+            return self.call()
+        if kind in ("id", "qid"):
+            self.next()
+            expr = _Expr(lambda row: row.get(value), {value})
+            expr.name = value
+            self.matcher.referenced.add(value)
+            return expr
+        self.fail("expected an expression")
+
+    def _binary(self, left: _Expr, right: _Expr, op) -> _Expr:
+        lf, rf = left.fn, right.fn
+        return _Expr(lambda row: op(lf(row), rf(row)), _vars_of(left, right))
+
+    def _map_expr(self, items) -> _Expr:
+        pairs = [(k, e.fn) for k, e in items]
+        return _Expr(lambda row: {k: f(row) for k, f in pairs}, _vars_of(*(e for _, e in items)))
+
+    def list_literal(self) -> _Expr:
+        self.expect("[")
+        # [x IN list WHERE pred | expr]
+        if self.peek()[0] in ("id", "qid") and self.is_kw("IN", k=1):
+            var = self.name()
+            self.next()
+            source = self.expression()
+            pred = self.expression() if self.accept_kw("WHERE") else None
+            proj = self.expression() if self.accept("|") else None
+            self.expect("]")
+            sf, pf, mf = source.fn, pred.fn if pred else None, proj.fn if proj else None
+
+            def comprehension(row):
+                items = sf(row)
+                if items is None:
+                    return None
+                out = []
+                for item in items:
+                    inner = {**row, var: item}
+                    if pf is None or pf(inner) is True:
+                        out.append(mf(inner) if mf else item)
+                return out
+            inner_vars = _vars_of(*(e for e in (pred, proj) if e)) - {var}
+            return _Expr(comprehension, _vars_of(source) | inner_vars)
+        items = []
+        while not self.accept("]"):
+            items.append(self.expression())
+            if not self.accept(","):
+                self.expect("]")
+                break
+        fns = [e.fn for e in items]
+        return _Expr(lambda row: [f(row) for f in fns], _vars_of(*items))
+
+    def case_expr(self) -> _Expr:
+        subject = None if self.is_kw("WHEN") else self.expression()
+        branches = []
+        while self.accept_kw("WHEN"):
+            cond = self.expression()
+            self.expect_kw("THEN")
+            branches.append((cond, self.expression()))
+        default = self.expression() if self.accept_kw("ELSE") else _const(None)
+        self.expect_kw("END")
+        parts = [e for pair in branches for e in pair] + [default] + ([subject] if subject else [])
+        sf = subject.fn if subject else None
+        compiled = [(c.fn, v.fn) for c, v in branches]
+        df = default.fn
+
+        def case(row):
+            if sf is None:
+                for cf, vf in compiled:
+                    if cf(row) is True:
+                        return vf(row)
+            else:
+                s = sf(row)
+                for cf, vf in compiled:
+                    if _eq(s, cf(row)):
+                        return vf(row)
+            return df(row)
+        return _Expr(case, _vars_of(*parts))
+
+    def call(self) -> _Expr:
+        name = self.name()
+        lname = name.lower()
+        self.expect("(")
+
+        if lname in ("none", "any", "all", "single") and self.peek()[0] in ("id", "qid") \
+                and self.is_kw("IN", k=1):
+            return self.quantifier(lname)
+
+        if lname in _AGGREGATES:
+            distinct = self.accept_kw("DISTINCT")
+            if lname == "count" and self.accept("*"):
+                self.expect(")")
+                return _Expr(None, agg=("count", False, None))
+            arg = self.expression()
+            self.expect(")")
+            return _Expr(None, _vars_of(arg), agg=(lname, distinct, arg))
+
+        args = []
+        while not self.accept(")"):
+            args.append(self.expression())
+            if not self.accept(","):
+                self.expect(")")
+                break
+        if lname not in _FUNCTIONS:
+            raise CypherError(f"function {name}() is not supported by the offline graph")
+        func, null_safe = _FUNCTIONS[lname]
+        fns = [a.fn for a in args]
+        rels_of = args[0].name if lname in ("relationships", "rels") and len(args) == 1 else None
+
+        def apply(row):
+            values = [f(row) for f in fns]
+            if null_safe and any(v is None for v in values):
+                return None
+            try:
+                return func(*values)
+            except (TypeError, AttributeError, ValueError) as e:
+                raise CypherError(f"{name}(): {e}") from e
+        expr = _Expr(apply, _vars_of(*args))
+        expr.rels_of = rels_of
+        return expr
+
+    def quantifier(self, kind: str) -> _Expr:
+        var = self.name()
+        self.expect_kw("IN")
+        source = self.expression()
+        self.expect_kw("WHERE")
+        first = self.i
+        pred = self.expression()
+        # does the predicate read x only through type(x)?
+        type_only = all(
+            self.toks[j - 2][0] == "id" and self.toks[j - 2][1].lower() == "type"
+            and self.toks[j - 1][1] == "(" and self.toks[j + 1][1] == ")"
+            for j in range(first, self.i)
+            if self.toks[j][0] in ("id", "qid") and self.toks[j][1] == var and not self.toks[j - 1][1] == "."
+        )
+        self.expect(")")
+        sf, pf = source.fn, pred.fn
+
+        def test(row):
+            items = sf(row)
+            if items is None:
+                return None
+            results = [pf({**row, var: item}) for item in items]
+            trues, nulls = results.count(True), results.count(None)
+            if kind == "any":
+                return True if trues else (None if nulls else False)
+            if kind == "all":
+                return False if False in results else (None if nulls else True)
+            if kind == "none":
+                return False if trues else (None if nulls else True)
+            return None if nulls else trues == 1
+
+        rel_filter = None
+        # NONE/ALL(x IN relationships(p) WHERE <only x>) can be checked per edge
+        if kind in ("none", "all") and source.rels_of and pred.vars <= {var}:
+            rel_filter = (source.rels_of, kind, var, pf, type_only)
+        return _Expr(test, _vars_of(source) | (_vars_of(pred) - {var}), rel_filter=rel_filter)
+
+    def try_pattern_predicate(self) -> _Expr | None:
+        """`(a)-[:T]->(b)` used as a boolean: true if at least one match exists."""
+        saved = self.i
+        try:
+            nodes, rels = self.chain()
+        except CypherError:
+            self.i = saved
+            return None
+        if not rels:
+            self.i = saved
+            return None
+        part = _Part(None, None, nodes, rels)
+        self.pattern_parts.append(part)
+        named = {n.var for n in nodes if not n.var.startswith("  ")} | \
+                {r.var for r in rels if r.var}
+        matcher = self.matcher
+
+        def exists(row):
+            return next(matcher.match_parts([part], dict(row), set(), []), None) is not None
+        return _Expr(exists, named)
+
+
+# --------------------------------------------------------------------- #
+# execution
+# --------------------------------------------------------------------- #
+class _TypeOnly:
+    """Stand-in relationship for predicates that only read type(x)."""
+    __slots__ = ("type",)
+
+    def __init__(self, rel_type: str):
+        self.type = rel_type
+
+
+def _passes(rel, tests) -> bool:
+    """Whether `rel` passes every NONE/ALL relationship filter in `tests`."""
+    for _, kind, var, pf, _type_only in tests:
+        r = pf({var: rel})
+        if (kind == "none" and r is True) or (kind == "all" and r is not True):
+            return False
+    return True
+
+
+class _Everything:
+    """`referenced` once RETURN * / WITH * needs every variable."""
+    def __contains__(self, name):
+        return name is not None
+
+    def add(self, name):
+        pass
+
+
+class _Aggregate:
+    __slots__ = ("name", "distinct", "fn", "seen", "values", "count")
+
+    def __init__(self, agg):
+        self.name, self.distinct, arg = agg
+        self.fn = arg.fn if arg is not None else None
+        self.seen, self.values, self.count = set(), [], 0
+
+    def add(self, row):
+        if self.fn is None:             # count(*)
+            self.count += 1
+            return
+        v = self.fn(row)
+        if v is None:
+            return
+        if self.distinct:
+            key = _hashable(v)
+            if key in self.seen:
+                return
+            self.seen.add(key)
+        self.count += 1
+        if self.name != "count":
+            self.values.append(v)
+
+    def result(self):
+        if self.name == "count":
+            return self.count
+        if self.name == "collect":
+            return self.values
+        if not self.values:
+            return None
+        if self.name == "max":
+            return max(self.values, key=_sort_key)
+        if self.name == "min":
+            return min(self.values, key=_sort_key)
+        total = sum(self.values)
+        return total if self.name == "sum" else total / len(self.values)
+
+
+class _Matcher:
+    """Pattern matching and projection over one Graph."""
+
+    def __init__(self, graph: Graph):
+        self.g = graph
+        self._type_sets: dict[int, set[int] | None] = {}
+        # variables the query reads; relationship lists nobody reads are not built
+        self.referenced: set[str] = set()
+
+    # -- clause pipeline -------------------------------------------------- #
+    def apply(self, clause: tuple, rows: Iterator[dict]) -> Iterator[dict]:
+        kind = clause[0]
+        if kind == "match":
+            (parts, where), optional = clause[1], clause[2]
+            return self._match_clause(_merge_endpoints(parts), _split_and(where), optional, rows)
+        if kind == "unwind":
+            return self._unwind(clause[1], clause[2], rows)
+        return self.project(clause[1], rows, final=False)
+
+    def _match_clause(self, parts, conjuncts, optional, rows):
+        new_vars = set().union(*(p.vars() for p in parts))
+        for row in rows:
+            matched = False
+            for out in self.match_parts(parts, row, set(), conjuncts):
+                matched = True
+                yield out
+            if optional and not matched:
+                yield {**row, **{v: None for v in new_vars if v not in row}}
+
+    def _unwind(self, expr, var, rows):
+        for row in rows:
+            items = expr.fn(row)
+            for item in (items if isinstance(items, list) else [] if items is None else [items]):
+                yield {**row, var: item}
+
+    # -- conjunct bookkeeping -------------------------------------------- #
+    @staticmethod
+    def _check(row: dict, pending: list[_Expr]) -> list[_Expr] | None:
+        """Evaluate the conjuncts whose variables are bound: None if one fails, else the rest."""
+        if not pending:
+            return pending
+        rest = []
+        keys = row.keys()
+        for c in pending:
+            if keys >= c.vars:
+                if c.fn(row) is not True:
+                    return None
+            else:
+                rest.append(c)
+        return rest
+
+    # -- patterns --------------------------------------------------------- #
+    def match_parts(self, parts, row, used: set, pending):
+        pending = self._check(row, pending)
+        if pending is None:
+            return
+        if not parts:
+            if all(c.fn(row) is True for c in pending):
+                yield row
+            return
+        part, rest = parts[0], parts[1:]
+        step = self._shortest(part, row, pending) if part.shortest else \
+            self._chain(part, row, used, pending)
+        for out, still_pending in step:
+            yield from self.match_parts(rest, out, used, still_pending)
+
+    def _type_ids(self, rp: _RelPat) -> set[int] | None:
+        key = id(rp)
+        if key not in self._type_sets:
+            self._type_sets[key] = None if not rp.types else \
+                {t for t in map(self.g.type_id, rp.types) if t is not None}
+        return self._type_sets[key]
+
+    def _required_mask(self, pat: _NodePat) -> int | None:
+        mask = 0
+        for label in pat.labels:
+            bit = self.g.label_bit(label)
+            if not bit:
+                return None
+            mask |= bit
+        return mask
+
+    def _node_ok(self, pat: _NodePat, node: int, row: dict, required: int | None) -> bool:
+        if required is None or self.g.label_mask[node] & required != required:
+            return False
+        for key, expr in pat.props:
+            if _eq(self.g.prop(node, key), expr.fn(row)) is not True:
+                return False
+        return True
+
+    def _candidates(self, pat: _NodePat, row: dict) -> Iterator[int]:
+        required = self._required_mask(pat)
+        if required is None:
+            return iter(())
+        if pat.labels:
+            base = min((self.g.nodes_with_label(label) for label in pat.labels), key=len)
+        elif pat.props:
+            # scan the property column rather than every node
+            key, expr = pat.props[0]
+            column = self.g.props.get(key)
+            if column is None:
+                return iter(())
+            value = expr.fn(row)
+            base = sorted(n for n, v in column.items() if _eq(v, value))
+        else:
+            base = range(self.g.node_count)
+        return (n for n in base if self._node_ok(pat, n, row, required))
+
+    def _bind_node(self, pat: _NodePat, node: int, row: dict) -> dict | None:
+        bound = row.get(pat.var)
+        if pat.var in row:
+            return row if isinstance(bound, Node) and bound.id == node else None
+        return {**row, pat.var: Node(self.g, node)}
+
+    def _steps(self, node: int, direction: str, type_ids: set[int] | None) -> Iterator[tuple[int, int]]:
+        """(edge, neighbour) pairs leaving `node` along `direction`."""
+        g = self.g
+        if direction != "<":
+            for e in g.out_edges(node):
+                if type_ids is None or g.edge_type[e] in type_ids:
+                    yield e, g.edge_dst[e]
+        if direction != ">":
+            for e in g.in_edges_of(node):
+                if type_ids is None or g.edge_type[e] in type_ids:
+                    yield e, g.edge_src[e]
+
+    def _score(self, pat: _NodePat, row: dict, pending) -> int:
+        """How selective a node pattern is as a starting point."""
+        if pat.var in row:
+            return 4
+        if pat.props:
+            return 3
+        if any(c.vars == {pat.var} for c in pending):
+            return 2
+        return 1 if pat.labels else 0
+
+    def _chain(self, part: _Part, row, used, pending):
+        nodes, rels = part.nodes, part.rels
+        first_score, last_score = self._score(nodes[0], row, pending), self._score(nodes[-1], row, pending)
+        typed_hop = len(rels) == 1 and not rels[0].varlen and rels[0].types
+        reverse = not (typed_hop and max(first_score, last_score) < 3) and last_score > first_score
+        if reverse:
+            nodes, rels = nodes[::-1], [r.flipped() for r in reversed(rels)]
+
+        if typed_hop and nodes[0].var not in row and max(first_score, last_score) < 3:
+            yield from self._typed_hop(part, nodes, rels[0], row, used, pending, reverse)
+            return
+
+        if nodes[0].var in row:
+            bound = row[nodes[0].var]
+            starts = [bound.id] if isinstance(bound, Node) and \
+                self._node_ok(nodes[0], bound.id, row, self._required_mask(nodes[0])) else []
+        else:
+            starts = self._candidates(nodes[0], row)
+        for start in starts:
+            r1 = self._bind_node(nodes[0], start, row)
+            p1 = self._check(r1, pending) if r1 is not None else None
+            if p1 is None:
+                continue
+            yield from self._extend(part, nodes, rels, 0, start, r1, used, p1, [start], [], reverse)
+
+    def _typed_hop(self, part, nodes, rp, row, used, pending, reverse):
+        """(a)-[:T]->(b) with loose endpoints: walk the edges of type T directly."""
+        g = self.g
+        req_a, req_b = self._required_mask(nodes[0]), self._required_mask(nodes[1])
+        for t in sorted(self._type_ids(rp)):
+            for e in g.edges_of_type(t):
+                src, dst = g.edge_src[e], g.edge_dst[e]
+                ends = [(src, dst)] if rp.direction == ">" else [(dst, src)] if rp.direction == "<" \
+                    else [(src, dst), (dst, src)]
+                for a, b in ends:
+                    if e in used or not self._node_ok(nodes[0], a, row, req_a) or \
+                            not self._node_ok(nodes[1], b, row, req_b):
+                        continue
+                    r1 = self._bind_node(nodes[0], a, row)
+                    r1 = r1 and self._bind_node(nodes[1], b, r1)
+                    if r1 is None:
+                        continue
+                    if rp.var in self.referenced:
+                        r1[rp.var] = Relationship(g, e)
+                    p1 = self._check(r1, pending)
+                    if p1 is None:
+                        continue
+                    used.add(e)
+                    yield from self._extend(part, nodes, [rp], 1, b, r1, used, p1, [a, b], [e], reverse)
+                    used.discard(e)
+
+    def _extend(self, part, nodes, rels, k, cur, row, used, pending, trail_n, trail_e, reverse):
+        g = self.g
+        if k == len(rels):
+            if part.path_var:
+                ns, es = (trail_n[::-1], trail_e[::-1]) if reverse else (trail_n, trail_e)
+                row = {**row, part.path_var: Path(g, ns, es)}
+                pending = self._check(row, pending)
+                if pending is None:
+                    return
+            yield row, pending
+            return
+
+        rp, np = rels[k], nodes[k + 1]
+        required, type_ids = self._required_mask(np), self._type_ids(rp)
+        if rp.varlen:
+            walks = self._var_paths(cur, rp, type_ids, used)
+        else:
+            walks = (([e], [other]) for e, other in self._steps(cur, rp.direction, type_ids)
+                     if e not in used)
+        for es, ns in walks:
+            end = ns[-1] if ns else cur
+            if not self._node_ok(np, end, row, required):
+                continue
+            r1 = self._bind_node(np, end, row)
+            if r1 is None:
+                continue
+            if rp.var in self.referenced:
+                rel_values = [Relationship(g, e) for e in (es[::-1] if reverse else es)]
+                r1 = {**r1, rp.var: rel_values if rp.varlen else rel_values[0]}
+            p1 = self._check(r1, pending)
+            if p1 is None:
+                continue
+            used.update(es)
+            yield from self._extend(part, nodes, rels, k + 1, end, r1, used, p1,
+                                    trail_n + ns, trail_e + es, reverse)
+            used.difference_update(es)
+
+    def _var_paths(self, start, rp, type_ids, used):
+        """Every walk of rp.lo..rp.hi hops from `start` that repeats no edge: (edges, nodes)."""
+        lo, hi = rp.lo, rp.hi
+        if lo == 0:
+            yield [], []
+        if hi == 0:
+            return
+        es, ns, on_path = [], [], set()
+        stack = [self._steps(start, rp.direction, type_ids)]
+        while stack:
+            step = next(stack[-1], None)
+            if step is None:
+                stack.pop()
+                if es:
+                    on_path.discard(es.pop())
+                    ns.pop()
+                continue
+            e, other = step
+            if e in on_path or e in used:
+                continue
+            es.append(e)
+            ns.append(other)
+            on_path.add(e)
+            if len(es) >= lo:
+                yield list(es), list(ns)
+            if hi is None or len(es) < hi:
+                stack.append(self._steps(other, rp.direction, type_ids))
+            else:
+                on_path.discard(es.pop())
+                ns.pop()
+
+    # -- shortest paths --------------------------------------------------- #
+    def _endpoint(self, pat: _NodePat, row: dict, pending) -> list[int]:
+        if pat.var in row:
+            bound = row[pat.var]
+            ok = isinstance(bound, Node) and self._node_ok(pat, bound.id, row, self._required_mask(pat))
+            return [bound.id] if ok else []
+        own = [c for c in pending if c.vars == {pat.var}]
+        out = []
+        for n in self._candidates(pat, row):
+            if own:
+                r = {**row, pat.var: Node(self.g, n)}
+                if not all(c.fn(r) is True for c in own):
+                    continue
+            out.append(n)
+        return out
+
+    def _edge_filter(self, part: _Part, rp: _RelPat, pending):
+        """
+        Split off NONE/ALL(x IN relationships(p) …) conjuncts: returns the
+        allowed type ids (None = any), a per-edge test for filters that read
+        more than type(x) (or None), and the remaining conjuncts.
+        """
+        g = self.g
+        allowed = self._type_ids(rp)
+        type_tests, edge_tests, rest = [], [], []
+        for c in pending:
+            f = c.rel_filter
+            if f and part.path_var and f[0] == part.path_var:
+                (type_tests if f[4] else edge_tests).append(f)
+            else:
+                rest.append(c)
+
+        if type_tests:
+            candidates = range(len(g.type_names)) if allowed is None else allowed
+            allowed = {t for t in candidates if _passes(_TypeOnly(g.type_names[t]), type_tests)}
+        edge_ok = (lambda e: _passes(Relationship(g, e), edge_tests)) if edge_tests else None
+        return allowed, edge_ok, rest
+
+    def _shortest(self, part: _Part, row, pending):
+        g = self.g
+        a, b = part.nodes
+        rp = part.rels[0]
+        allowed, edge_ok, rest = self._edge_filter(part, rp, pending)
+        sources, targets = self._endpoint(a, row, rest), self._endpoint(b, row, rest)
+        if not sources or not targets:
+            return
+        forward = len(sources) <= len(targets)
+        direction = rp.direction if forward else {">": "<", "<": ">", "-": "-"}[rp.direction]
+        if not forward:
+            sources, targets = targets, sources
+        target_set = set(targets)
+        every = part.shortest == "all"
+        # conjuncts that read the path itself: a shortest path failing them
+        # does not end the search, the next shortest one is tried instead
+        on_path = {part.path_var, rp.var} - {None}
+        path_rest = any(c.vars & on_path for c in rest)
+
+        def bind(s, es, ns):
+            if len(es) < rp.lo:
+                return None
+            t = ns[0]                   # walks run from the reached node back to s
+            if forward:
+                es, ns = es[::-1], ns[::-1]
+            start, end = (s, t) if forward else (t, s)
+            r1 = self._bind_node(a, start, row)
+            r1 = r1 and self._bind_node(b, end, r1)
+            if r1 is None:
+                return None
+            r1 = dict(r1)
+            if part.path_var:
+                r1[part.path_var] = Path(g, ns, es)
+            if rp.var in self.referenced:
+                r1[rp.var] = [Relationship(g, e) for e in es]
+            p1 = self._check(r1, rest)
+            return None if p1 is None else (r1, p1)
+
+        for s in sources:
+            if path_rest:
+                yield from self._shortest_matching(s, direction, allowed, edge_ok, rp.hi,
+                                                   target_set, every, bind)
+                continue
+            if edge_ok is None and not every:
+                # plain type filters: one cached tree per root serves every query
+                tree = path_engine.shortest_tree(g, s, direction, allowed, rp.hi)
+                walks = (path_engine.walk_back(g, tree, direction, t) for t in targets
+                         if t != s and tree[t] != path_engine.UNREACHED)
+            else:
+                parents, found = self.bfs(s, direction, allowed, edge_ok, rp.hi, target_set, every)
+                walks = (w for t in found for w in self._unwind_parents(parents, s, t))
+            for es, ns in walks:
+                hit = bind(s, es, ns)
+                if hit is not None:
+                    yield hit
+
+    def _shortest_matching(self, source: int, direction: str, allowed, edge_ok,
+                           max_hops: int | None, targets: set[int], every: bool, bind):
+        """
+        Shortest paths from `source` that `bind` accepts, per target: the
+        first (or with `every` all) of the shortest length at which one is
+        accepted. Every shortest path is tried first; targets none of them
+        satisfies fall back to an exhaustive search of longer paths, as
+        Neo4j does for predicates it cannot check while expanding.
+        """
+        parents, found = self.bfs(source, direction, allowed, edge_ok, max_hops, targets, True)
+        dist = {}
+        for t in found:
+            hits = 0
+            for es, ns in self._unwind_parents(parents, source, t):
+                dist[t] = len(es)
+                hit = bind(source, es, ns)
+                if hit is not None:
+                    hits += 1
+                    yield hit
+                    if not every:
+                        break
+            if hits:
+                del dist[t]
+        if not dist:
+            return
+
+        # iterative deepening over paths with no repeated relationship
+        depth = min(dist.values())
+        while dist and (max_hops is None or depth < max_hops):
+            depth += 1
+            longer, satisfied = False, set()
+            es, ns, used = [], [source], set()
+            stack = [self._steps(source, direction, allowed)]
+            while stack:
+                for e, w in stack[-1]:
+                    if e in used or (edge_ok is not None and not edge_ok(e)):
+                        continue
+                    if len(es) + 1 < depth:
+                        es.append(e)
+                        ns.append(w)
+                        used.add(e)
+                        stack.append(self._steps(w, direction, allowed))
+                        break
+                    longer = True
+                    if w in dist and depth > dist[w] and (every or w not in satisfied):
+                        hit = bind(source, [e, *es[::-1]], [w, *ns[::-1]])
+                        if hit is not None:
+                            satisfied.add(w)
+                            yield hit
+                else:
+                    stack.pop()
+                    if es:
+                        used.discard(es.pop())
+                        ns.pop()
+            for t in satisfied:
+                del dist[t]
+            if not longer:
+                return
+
+    def bfs(self, source: int, direction: str, allowed: set[int] | None, edge_ok,
+            max_hops: int | None, targets: set[int], every: bool = False):
+        """
+        Breadth-first search from `source` until every target is reached.
+        Returns (parents, reached targets); parents maps a node to the
+        (edge, previous node) pairs on its shortest paths – only the first
+        one unless `every`.
+        """
+        parents: dict[int, list[tuple[int, int]]] = {source: []}
+        depth_of = {source: 0}
+        found, remaining = [], len(targets - {source})
+        frontier, depth = [source], 0
+        while frontier and remaining and (max_hops is None or depth < max_hops):
+            depth += 1
+            nxt = []
+            for v in frontier:
+                for e, w in self._steps(v, direction, allowed):
+                    seen = depth_of.get(w)
+                    if seen is not None and not (every and seen == depth):
+                        continue
+                    if edge_ok is not None and not edge_ok(e):
+                        continue
+                    if seen is None:
+                        depth_of[w] = depth
+                        parents[w] = [(e, v)]
+                        nxt.append(w)
+                        if w in targets and w != source:
+                            found.append(w)
+                            remaining -= 1
+                    else:
+                        parents[w].append((e, v))
+            frontier = nxt
+        return parents, found
+
+    @staticmethod
+    def _unwind_parents(parents, source: int, target: int):
+        """(edges, nodes) walked back from target to source, one per recorded parent chain."""
+        stack = [(target, [], [target])]
+        while stack:
+            node, es, ns = stack.pop()
+            if node == source:
+                yield es, ns
+                continue
+            for e, prev in parents[node]:
+                stack.append((prev, es + [e], ns + [prev]))
+
+    # -- projection ------------------------------------------------------- #
+    def project(self, proj: _Projection, rows: Iterable[dict], final: bool) -> Iterator[dict]:
+        items = proj.items
+        has_agg = any(e.agg for e, _ in items)
+
+        def shape(row):
+            out = {k: row[k] for k in sorted(row) if not k.startswith("  ")} if proj.star else {}
+            for expr, name in items:
+                out[name] = expr.fn(row)
+            return out
+
+        if has_agg:
+            pairs = self._aggregate(items, rows)
+        else:
+            pairs = ((shape(row), row) for row in rows)
+
+        if proj.distinct:
+            pairs = self._distinct(pairs)
+        if proj.order:
+            pairs = iter(self._sorted(list(pairs), proj.order))
+        out = (o for o, _ in pairs)
+
+        skip = proj.skip.fn({}) if proj.skip else 0
+        limit = proj.limit.fn({}) if proj.limit else None
+        if skip or limit is not None:
+            out = islice(out, skip, None if limit is None else skip + limit)
+        if proj.where is not None:
+            f = proj.where.fn
+            out = (o for o in out if f(o) is True)
+        return out
+
+    @staticmethod
+    def _aggregate(items, rows):
+        groups: dict[tuple, tuple[dict, list, dict]] = {}
+        keyed = [(e, name) for e, name in items if not e.agg]
+        for row in rows:
+            values = [e.fn(row) for e, _ in keyed]
+            key = tuple(_hashable(v) for v in values)
+            group = groups.get(key)
+            if group is None:
+                states = [_Aggregate(e.agg) for e, _ in items if e.agg]
+                group = groups[key] = (dict(zip((n for _, n in keyed), values)), states, row)
+            for state in group[1]:
+                state.add(row)
+        if not groups and not keyed:
+            groups[()] = ({}, [_Aggregate(e.agg) for e, _ in items if e.agg], {})
+        for keys, states, first in groups.values():
+            results = iter(states)
+            out = {name: keys[name] if not e.agg else next(results).result() for e, name in items}
+            yield out, {**first, **out}
+
+    @staticmethod
+    def _distinct(pairs):
+        seen = set()
+        for out, env in pairs:
+            key = tuple(_hashable(v) for v in out.values())
+            if key not in seen:
+                seen.add(key)
+                yield out, env
+
+    @staticmethod
+    def _sorted(pairs: list, order) -> list:
+        envs = [{**env, **out} for out, env in pairs]
+        index = list(range(len(pairs)))
+        for expr, desc in reversed(order):   # stable multi-key sort, last key first
+            keys = [_sort_key(expr.fn(env)) for env in envs]
+            if desc:
+                # nulls come first when descending, as in Neo4j
+                index.sort(key=lambda i: keys[i], reverse=True)
+            else:
+                index.sort(key=lambda i: keys[i])
+        return [pairs[i] for i in index]
+
+
+def _merge_endpoints(parts: list[_Part]) -> list[_Part]:
+    """
+    `MATCH (m), (n {owned: true}), p=shortestPath((m)-[*1..]->(n))`: fold the
+    lone node patterns into the shortestPath endpoints so they are searched
+    together instead of as a cross product.
+    """
+    ends = {n.var: n for p in parts if p.shortest for n in p.nodes}
+    merged = []
+    for p in parts:
+        lone = p.nodes[0] if not p.rels and not p.path_var else None
+        if lone is not None and lone.var in ends:
+            target = ends[lone.var]
+            target.labels = target.labels + [l for l in lone.labels if l not in target.labels]
+            target.props = target.props + lone.props
+            continue
+        merged.append(p)
+    return merged
+
+
+def run(graph: Graph, cypher: str, params: dict | None = None) -> tuple[list[str], Iterator[list]]:
+    """
+    Evaluate `cypher` against `graph`. Returns the column names and a lazy
+    iterator of rows (lists in column order).
+    """
+    matcher = _Matcher(graph)
+    clauses = _Parser(cypher, params or {}, matcher).query()
+    rows: Iterator[dict] = iter([{}])
+    for clause in clauses[:-1]:
+        rows = matcher.apply(clause, rows)
+    proj = clauses[-1][1]
+    out = matcher.project(proj, rows, final=True)
+    if proj.star:
+        first = next(out, None)
+        if first is None:
+            return [], iter(())
+        keys = list(first)
+        out = _prepend(first, out)
+    else:
+        keys = [name for _, name in proj.items]
+    return keys, ([o.get(k) for k in keys] for o in out)
+
+
+def traversed_types(cypher: str, params: dict | None, type_names: Iterable[str]) -> set[str]:
+    """
+    The relationship types, out of `type_names`, that `cypher` can walk:
+    what the type filters of a shortestPath leave, and the declared types
+    (or all of them) of every other pattern. Raises CypherError for what
+    `run` would reject.
+    """
+    parser = _Parser(cypher, params or {}, _Matcher(None))
+    clauses = parser.query()
+    type_names = set(type_names)
+    parts = [(part, []) for part in parser.pattern_parts]
+    for clause in clauses:
+        if clause[0] == "match":
+            matched, where = clause[1]
+            parts += [(part, _split_and(where)) for part in matched]
+
+    walked = set()
+    for part, conjuncts in parts:
+        tests = [c.rel_filter for c in conjuncts if part.shortest and part.path_var and
+                 c.rel_filter and c.rel_filter[0] == part.path_var and c.rel_filter[4]]
+        for rp in part.rels:
+            allowed = type_names & set(rp.types) if rp.types else type_names
+            walked |= {t for t in allowed if _passes(_TypeOnly(t), tests)}
+    return walked
+
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+import time
+from typing import Iterator
+
+import offline_cypher
+import offline_graph
+from offline_graph import Graph, Node, Relationship, Path
+
+# Just enough of the neo4j driver API (driver → session → result → record)
+# for Driver to run catalog queries against an offline Graph unchanged.
+
+
+def _plain(value):
+    """What neo4j's Record.data() turns graph values into."""
+    if isinstance(value, Node):
+        return value.graph.node_props(value.id)
+    if isinstance(value, Relationship):
+        return (_plain(value.start_node), value.type, _plain(value.end_node))
+    if isinstance(value, Path):
+        out = [_plain(value.start_node)]
+        for rel in value:
+            out += [rel.type, _plain(rel.end_node)]
+        return out
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    return value
+
+
+class Record:
+    __slots__ = ("_keys", "_values")
+
+    def __init__(self, keys: list[str], values: list):
+        self._keys, self._values = keys, values
+
+    def keys(self) -> list[str]:
+        return list(self._keys)
+
+    def values(self) -> list:
+        return list(self._values)
+
+    def items(self) -> list[tuple[str, object]]:
+        return list(zip(self._keys, self._values))
+
+    def data(self, *keys: str) -> dict:
+        return {k: _plain(v) for k, v in zip(self._keys, self._values) if not keys or k in keys}
+
+    def get(self, key: str, default=None):
+        return self._values[self._keys.index(key)] if key in self._keys else default
+
+    def __getitem__(self, key):
+        return self._values[key] if isinstance(key, int) else self._values[self._keys.index(key)]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+
+class _Counters:
+    """A read-only engine never changes anything."""
+    def __getattr__(self, name):
+        return False if name.startswith("contains") else 0
+
+
+class Summary:
+    def __init__(self, available_after: int, consumed_after: int):
+        self.result_available_after = available_after
+        self.result_consumed_after  = consumed_after
+        self.counters = _Counters()
+        self.plan = self.profile = None
+        self.notifications = []
+
+
+class Result:
+    def __init__(self, graph: Graph, cypher: str, parameters: dict | None):
+        start = time.perf_counter()
+        self._keys, self._rows = offline_cypher.run(graph, cypher, parameters)
+        self._start = start
+        self._available = int((time.perf_counter() - start) * 1000)
+
+    def keys(self) -> list[str]:
+        return list(self._keys)
+
+    def __iter__(self) -> Iterator[Record]:
+        for values in self._rows:
+            yield Record(self._keys, values)
+
+    def single(self) -> Record | None:
+        records = list(self)
+        return records[0] if records else None
+
+    def data(self) -> list[dict]:
+        return [rec.data() for rec in self]
+
+    def consume(self) -> Summary:
+        self._rows = iter(())     # like the server, drop whatever was not read
+        # as on the server, consumed_after counts from when the first row was available
+        return Summary(self._available,
+                       int((time.perf_counter() - self._start) * 1000) - self._available)
+
+
+class Session:
+    def __init__(self, graph: Graph):
+        self._graph = graph
+
+    def run(self, cypher: str, parameters: dict | None = None, **kwargs) -> Result:
+        return Result(self._graph, cypher, {**(parameters or {}), **kwargs})
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class OfflineDriver:
+    """Stands in for neo4j.Driver; every session reads the same in-memory Graph."""
+
+    def __init__(self, graph: Graph):
+        self.graph = graph
+
+    @classmethod
+    def load(cls, path: str) -> OfflineDriver:
+        return cls(offline_graph.load(path))
+
+    def session(self, **config) -> Session:
+        return Session(self.graph)
+
+    def verify_connectivity(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+import json, zipfile
+from array import array
+from pathlib import Path as FilePath
+from typing import Iterable, Iterator
+
+import path_engine
+
+
+class Graph:
+    """
+    Read-only property graph held in flat arrays.
+
+    Nodes are numbered 0..n-1. Labels are interned and kept as one bitmask
+    per node; relationship types are interned too. Edges are numbered in
+    source order, so the out-edges of node v are the contiguous ids
+    out_offsets[v]..out_offsets[v+1]; in_offsets/in_edges index the same
+    edge ids by target. Node properties are per-property columns mapping
+    node id → value (anything with .get(i)), unset properties are absent.
+    """
+
+    def __init__(self, label_names: list[str], label_mask, props: dict[str, object],
+                 type_names: list[str], out_offsets, edge_src, edge_dst, edge_type,
+                 in_offsets, in_edges):
+        self.label_names = label_names
+        self.label_mask  = label_mask
+        self.props       = props
+        self.type_names  = type_names
+        self.out_offsets = out_offsets
+        self.edge_src    = edge_src
+        self.edge_dst    = edge_dst
+        self.edge_type   = edge_type
+        self.in_offsets  = in_offsets
+        self.in_edges    = in_edges
+        self._label_bits = {name: 1 << i for i, name in enumerate(label_names)}
+        self._type_ids   = {name: i for i, name in enumerate(type_names)}
+        self._by_label: dict[str, array] = {}
+        self._by_type: dict[int, array] = {}
+        self._mask_labels: dict[int, list[str]] = {}
+        self.path_trees = path_engine.TreeCache()
+
+    # -- sizes / ids ------------------------------------------------------ #
+    @property
+    def node_count(self) -> int:
+        return len(self.label_mask)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edge_dst)
+
+    def label_bit(self, label: str) -> int:
+        """Bitmask of `label`, 0 if no node carries it."""
+        return self._label_bits.get(label, 0)
+
+    def type_id(self, rel_type: str) -> int | None:
+        return self._type_ids.get(rel_type)
+
+    # -- nodes ------------------------------------------------------------ #
+    def labels(self, node: int) -> list[str]:
+        mask = self.label_mask[node]
+        names = self._mask_labels.get(mask)
+        if names is None:
+            names = self._mask_labels[mask] = [n for i, n in enumerate(self.label_names) if mask >> i & 1]
+        return list(names)
+
+    def prop(self, node: int, key: str):
+        column = self.props.get(key)
+        return None if column is None else column.get(node)
+
+    def node_props(self, node: int) -> dict:
+        out = {}
+        for key, column in self.props.items():
+            value = column.get(node)
+            if value is not None:
+                out[key] = value
+        return out
+
+    def nodes_with_label(self, label: str) -> array:
+        """Node ids carrying `label`, built on first use."""
+        nodes = self._by_label.get(label)
+        if nodes is None:
+            bit = self.label_bit(label)
+            nodes = array("I", (i for i, mask in enumerate(self.label_mask) if mask & bit)) if bit \
+                else array("I")
+            self._by_label[label] = nodes
+        return nodes
+
+    # -- edges ------------------------------------------------------------ #
+    def out_edges(self, node: int) -> range:
+        return range(self.out_offsets[node], self.out_offsets[node + 1])
+
+    def in_edges_of(self, node: int):
+        return self.in_edges[self.in_offsets[node]:self.in_offsets[node + 1]]
+
+    def edges_of_type(self, type_id: int) -> array:
+        """Edge ids of one relationship type, built on first use."""
+        edges = self._by_type.get(type_id)
+        if edges is None:
+            edges = array("I", (e for e, t in enumerate(self.edge_type) if t == type_id))
+            self._by_type[type_id] = edges
+        return edges
+
+
+class GraphBuilder:
+    """
+    Accumulates nodes (merged by key) and edges, then packs them into a
+    Graph. Nodes referenced only by an edge are created as placeholders and
+    filled in if their own record turns up later.
+    """
+
+    def __init__(self):
+        self._ids: dict[str, int] = {}
+        self._label_ids: dict[str, int] = {"Base": 0}   # BloodHound's shared label first
+        self._masks = array("Q")
+        self._props: dict[str, dict[int, object]] = {}
+        self._type_ids: dict[str, int] = {}
+        self._src, self._dst, self._typ = array("I"), array("I"), array("H")
+
+    def _label_mask(self, labels: Iterable[str]) -> int:
+        mask = 0
+        for label in labels:
+            if not label:
+                continue
+            bit = self._label_ids.get(label)
+            if bit is None:
+                bit = self._label_ids[label] = len(self._label_ids)
+                if bit >= 64:
+                    raise RuntimeError("offline graphs support at most 64 distinct labels")
+            mask |= 1 << bit
+        return mask
+
+    def node(self, key: str, labels: Iterable[str] = (), props: dict | None = None) -> int:
+        node = self._ids.get(key)
+        if node is None:
+            node = self._ids[key] = len(self._masks)
+            self._masks.append(0)
+        self._masks[node] |= self._label_mask(labels)
+        for name, value in (props or {}).items():
+            if value is not None:
+                self._props.setdefault(name, {})[node] = value
+        return node
+
+    def edge(self, src: int, rel_type: str, dst: int) -> None:
+        type_id = self._type_ids.get(rel_type)
+        if type_id is None:
+            type_id = self._type_ids[rel_type] = len(self._type_ids)
+        self._src.append(src)
+        self._dst.append(dst)
+        self._typ.append(type_id)
+
+    def build(self) -> Graph:
+        n, m = len(self._masks), len(self._src)
+
+        # counting sort by source: edge ids become contiguous per node
+        out_offsets = array("Q", bytes(8 * (n + 1)))
+        for s in self._src:
+            out_offsets[s + 1] += 1
+        for i in range(n):
+            out_offsets[i + 1] += out_offsets[i]
+        fill = array("Q", out_offsets[:n])
+        edge_src, edge_dst, edge_type = array("I", bytes(4 * m)), array("I", bytes(4 * m)), \
+            array("H", bytes(2 * m))
+        for s, d, t in zip(self._src, self._dst, self._typ):
+            e = fill[s]
+            fill[s] += 1
+            edge_src[e], edge_dst[e], edge_type[e] = s, d, t
+
+        # the same edge ids grouped by target
+        in_offsets = array("Q", bytes(8 * (n + 1)))
+        for d in edge_dst:
+            in_offsets[d + 1] += 1
+        for i in range(n):
+            in_offsets[i + 1] += in_offsets[i]
+        fill = array("Q", in_offsets[:n])
+        in_edges = array("I", bytes(4 * m))
+        for e, d in enumerate(edge_dst):
+            in_edges[fill[d]] = e
+            fill[d] += 1
+
+        label_names = sorted(self._label_ids, key=self._label_ids.get)
+        type_names  = sorted(self._type_ids, key=self._type_ids.get)
+        return Graph(label_names, self._masks, self._props, type_names,
+                     out_offsets, edge_src, edge_dst, edge_type, in_offsets, in_edges)
+
+
+# --------------------------------------------------------------------- #
+# result values – the attributes database.py reads from neo4j objects
+# --------------------------------------------------------------------- #
+class Node:
+    __slots__ = ("graph", "id")
+
+    def __init__(self, graph: Graph, node_id: int):
+        self.graph, self.id = graph, node_id
+
+    @property
+    def element_id(self) -> str:
+        return str(self.id)
+
+    @property
+    def labels(self) -> frozenset[str]:
+        return frozenset(self.graph.labels(self.id))
+
+    def get(self, key: str, default=None):
+        value = self.graph.prop(self.id, key)
+        return default if value is None else value
+
+    def __getitem__(self, key: str):
+        return self.graph.prop(self.id, key)
+
+    def items(self):
+        return self.graph.node_props(self.id).items()
+
+    def __eq__(self, other):
+        return isinstance(other, Node) and other.id == self.id
+
+    def __hash__(self):
+        return hash(("node", self.id))
+
+    def __repr__(self):
+        return f"<Node {self.id} {self.graph.labels(self.id)} {self.get('name')!r}>"
+
+
+class Relationship:
+    __slots__ = ("graph", "id")
+
+    def __init__(self, graph: Graph, edge_id: int):
+        self.graph, self.id = graph, edge_id
+
+    @property
+    def element_id(self) -> str:
+        return str(self.id)
+
+    @property
+    def type(self) -> str:
+        return self.graph.type_names[self.graph.edge_type[self.id]]
+
+    @property
+    def start_node(self) -> Node:
+        return Node(self.graph, self.graph.edge_src[self.id])
+
+    @property
+    def end_node(self) -> Node:
+        return Node(self.graph, self.graph.edge_dst[self.id])
+
+    def get(self, key: str, default=None):
+        return default
+
+    def items(self):
+        return {}.items()
+
+    def __eq__(self, other):
+        return isinstance(other, Relationship) and other.id == self.id
+
+    def __hash__(self):
+        return hash(("rel", self.id))
+
+    def __repr__(self):
+        return f"<Relationship {self.id} {self.type}>"
+
+
+class Path:
+    """Alternating nodes and relationships; iterating yields the relationships."""
+    __slots__ = ("graph", "node_ids", "edge_ids")
+
+    def __init__(self, graph: Graph, node_ids: list[int], edge_ids: list[int]):
+        self.graph, self.node_ids, self.edge_ids = graph, node_ids, edge_ids
+
+    @property
+    def start_node(self) -> Node:
+        return Node(self.graph, self.node_ids[0])
+
+    @property
+    def end_node(self) -> Node:
+        return Node(self.graph, self.node_ids[-1])
+
+    @property
+    def nodes(self) -> list[Node]:
+        return [Node(self.graph, n) for n in self.node_ids]
+
+    @property
+    def relationships(self) -> list[Relationship]:
+        return [Relationship(self.graph, e) for e in self.edge_ids]
+
+    def __iter__(self) -> Iterator[Relationship]:
+        return iter(self.relationships)
+
+    def hops(self) -> list[dict]:
+        """The path as database._path_hops renders it, read straight from the arrays."""
+        g = self.graph
+        names = g.props.get("name", {})
+        out = []
+        for e in self.edge_ids:
+            src, dst = g.edge_src[e], g.edge_dst[e]
+            out.append({
+                "src": names.get(src), "src_labels": g.labels(src),
+                "type": g.type_names[g.edge_type[e]],
+                "dst": names.get(dst), "dst_labels": g.labels(dst),
+            })
+        return out
+
+    def __len__(self):
+        return len(self.edge_ids)
+
+    def __eq__(self, other):
+        return isinstance(other, Path) and (other.node_ids, other.edge_ids) == (self.node_ids, self.edge_ids)
+
+    def __hash__(self):
+        return hash(("path", tuple(self.edge_ids), self.node_ids[0]))
+
+
+# --------------------------------------------------------------------- #
+# loaders
+# --------------------------------------------------------------------- #
+# SharpHound meta.type → node label
+_SHARPHOUND_LABELS = {
+    "users": "User", "groups": "Group", "computers": "Computer", "domains": "Domain",
+    "gpos": "GPO", "ous": "OU", "containers": "Container", "certtemplates": "CertTemplate",
+    "enterprisecas": "EnterpriseCA", "rootcas": "RootCA", "aiacas": "AIACA",
+    "ntauthstores": "NTAuthStore", "issuancepolicies": "IssuancePolicy",
+}
+
+# local group RID → edge from its members to the computer
+_LOCAL_GROUP_EDGES = {"544": "AdminTo", "555": "CanRDP", "562": "ExecuteDCOM", "580": "CanPSRemote"}
+# SharpHound v4 names for the same lists
+_LEGACY_LOCAL_GROUPS = {"LocalAdmins": "AdminTo", "RemoteDesktopUsers": "CanRDP",
+                        "DcomUsers": "ExecuteDCOM", "PSRemoteUsers": "CanPSRemote"}
+_SAME_FOREST_TRUSTS = {"ParentChild", "TreeRoot", "CrossLink", 0, 1, 2}
+
+
+def load(path: str | FilePath) -> Graph:
+    """
+    Build a Graph from BloodHound collector output (SharpHound JSON files, a
+    directory of them or the zip SharpHound writes) or from a Neo4j export
+    made with `apoc.export.json.all` (JSON lines). Snapshot files (see
+    snapshot.py) are mapped instead of parsed.
+    """
+    import snapshot
+    if snapshot.is_snapshot(path):
+        return snapshot.load(path)
+    builder = GraphBuilder()
+    for name, raw in _json_documents(FilePath(path)):
+        text = raw.decode("utf-8-sig")
+        stripped = text.lstrip()
+        if not stripped:
+            continue
+        first_line = stripped.split("\n", 1)[0]
+        try:
+            head = json.loads(first_line)
+        except ValueError:
+            head = None
+        if isinstance(head, dict) and head.get("type") in ("node", "relationship"):
+            _ingest_apoc(builder, stripped.splitlines())
+            continue
+        doc = json.loads(text)
+        if isinstance(doc, dict) and "data" in doc and "meta" in doc:
+            _ingest_sharphound(builder, doc)
+        else:
+            raise RuntimeError(f"{name}: neither SharpHound JSON nor an APOC JSON export")
+    return builder.build()
+
+
+def from_neo4j(session, properties: Iterable[str], types: Iterable[str] | None = None) -> Graph:
+    """
+    Copy a live database into a Graph: every node with its labels and the
+    given properties, and the relationships (type only) of `types`, or of
+    every type when None. Nodes are keyed on elementId() (Neo4j 5).
+    """
+    builder = GraphBuilder()
+    projection = ", ".join(f".`{p}`" for p in sorted(set(properties)))
+    for rec in session.run(f"MATCH (n) RETURN elementId(n) AS id, labels(n) AS labels, "
+                           f"n {{{projection}}} AS props"):
+        builder.node(f"neo4j:{rec['id']}", rec["labels"], rec["props"])
+    if types is None:
+        patterns = ["[r]"]
+    else:
+        # one relationship-type scan per type rather than a filtered scan of all of them
+        patterns = ["[r:`" + t.replace("`", "``") + "`]" for t in sorted(types)]
+    for pattern in patterns:
+        for rec in session.run(f"MATCH (a)-{pattern}->(b) "
+                               f"RETURN elementId(a) AS a, type(r) AS type, elementId(b) AS b"):
+            builder.edge(builder.node(f"neo4j:{rec['a']}"), rec["type"], builder.node(f"neo4j:{rec['b']}"))
+    return builder.build()
+
+
+def _json_documents(path: FilePath) -> Iterator[tuple[str, bytes]]:
+    if path.is_dir():
+        for child in sorted(path.iterdir()):
+            if child.suffix.lower() in (".json", ".jsonl", ".zip"):
+                yield from _json_documents(child)
+    elif path.suffix.lower() == ".zip":
+        with zipfile.ZipFile(path) as zf:
+            for member in sorted(zf.namelist()):
+                if member.lower().endswith((".json", ".jsonl")):
+                    yield f"{path}:{member}", zf.read(member)
+    else:
+        yield str(path), path.read_bytes()
+
+
+def _ingest_apoc(b: GraphBuilder, lines: Iterable[str]) -> None:
+    for line in lines:
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if item["type"] == "node":
+            b.node(f"apoc:{item['id']}", item.get("labels", ()), item.get("properties"))
+        else:
+            src = b.node(f"apoc:{item['start']['id']}", item["start"].get("labels", ()))
+            dst = b.node(f"apoc:{item['end']['id']}", item["end"].get("labels", ()))
+            b.edge(src, item["label"], dst)
+
+
+def _ingest_sharphound(b: GraphBuilder, doc: dict) -> None:
+    label = _SHARPHOUND_LABELS.get(str(doc["meta"].get("type", "")).lower())
+
+    def ref(oid: str, object_type: str | None = None) -> int:
+        # nodes only named by an edge (well-known SIDs, other domains …)
+        oid = oid.upper()
+        return b.node(oid, ("Base", object_type), {"objectid": oid})
+
+    for obj in doc["data"]:
+        props = {k.lower(): v for k, v in (obj.get("Properties") or {}).items()}
+        oid = (obj.get("ObjectIdentifier") or props.get("objectid") or "").upper()
+        if not oid:
+            continue
+        props["objectid"] = oid
+        me = b.node(oid, ("Base", label), props)
+
+        for ace in obj.get("Aces") or []:
+            b.edge(ref(ace["PrincipalSID"], ace.get("PrincipalType")), ace["RightName"], me)
+        for m in obj.get("Members") or []:
+            b.edge(ref(m["ObjectIdentifier"], m.get("ObjectType")), "MemberOf", me)
+        if obj.get("PrimaryGroupSID"):
+            b.edge(me, "MemberOf", ref(obj["PrimaryGroupSID"], "Group"))
+        for d in obj.get("AllowedToDelegate") or []:
+            b.edge(me, "AllowedToDelegate", ref(d["ObjectIdentifier"], d.get("ObjectType")))
+        for a in obj.get("AllowedToAct") or []:
+            b.edge(ref(a["ObjectIdentifier"], a.get("ObjectType")), "AllowedToAct", me)
+        for h in obj.get("HasSIDHistory") or []:
+            b.edge(me, "HasSIDHistory", ref(h["ObjectIdentifier"], h.get("ObjectType")))
+        for c in obj.get("ChildObjects") or []:
+            b.edge(me, "Contains", ref(c["ObjectIdentifier"], c.get("ObjectType")))
+        for link in obj.get("Links") or []:
+            b.edge(ref(link["GUID"], "GPO"), "GPLink", me)
+        for d in obj.get("DumpSMSAPassword") or []:
+            b.edge(me, "DumpSMSAPassword", ref(d["ObjectIdentifier"], d.get("ObjectType")))
+        for s in obj.get("SPNTargets") or []:
+            if s.get("Service") == "SQLAdmin":
+                b.edge(me, "SQLAdmin", ref(s["ComputerSID"], "Computer"))
+
+        for key in ("Sessions", "PrivilegedSessions", "RegistrySessions"):
+            for s in _results(obj.get(key)):
+                if s.get("UserSID"):
+                    computer = ref(s["ComputerSID"], "Computer") if s.get("ComputerSID") else me
+                    b.edge(computer, "HasSession", ref(s["UserSID"], "User"))
+        for group in obj.get("LocalGroups") or []:
+            rel = _LOCAL_GROUP_EDGES.get(str(group.get("ObjectIdentifier", "")).rsplit("-", 1)[-1])
+            if rel:
+                for m in group.get("Results") or []:
+                    b.edge(ref(m["ObjectIdentifier"], m.get("ObjectType")), rel, me)
+        for key, rel in _LEGACY_LOCAL_GROUPS.items():
+            for m in _results(obj.get(key)):
+                b.edge(ref(m["ObjectIdentifier"], m.get("ObjectType")), rel, me)
+
+        for t in obj.get("Trusts") or []:
+            other = ref(t["TargetDomainSid"], "Domain")
+            if t.get("TargetDomainName"):
+                b.node(t["TargetDomainSid"].upper(), props={"name": t["TargetDomainName"].upper()})
+            rel = "SameForestTrust" if t.get("TrustType") in _SAME_FOREST_TRUSTS else "CrossForestTrust"
+            direction = t.get("TrustDirection")
+            # the trusting domain points at the domain it trusts
+            if direction in (2, 3, "Outbound", "Bidirectional"):
+                b.edge(me, rel, other)
+            if direction in (1, 3, "Inbound", "Bidirectional"):
+                b.edge(other, rel, me)
+
+
+def _results(value) -> list:
+    """SharpHound wraps collected lists as {"Results": [...], "Collected": …}; v3 used bare lists."""
+    if isinstance(value, dict):
+        return value.get("Results") or []
+    return value or []
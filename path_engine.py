@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+import threading
+from array import array
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from offline_graph import Graph
+
+# Shortest-path trees over an offline Graph. A tree is one breadth-first
+# search from a root along the allowed edge types: an array holding, for
+# every node reached, the edge it was first reached by. Every shortest path
+# between the root and another node is read back from the tree without
+# searching again, and trees are cached on the graph, so all shortestPath
+# queries of a report that search from the same node over the same edge
+# types share a single traversal.
+
+UNREACHED, ROOT = -1, -2
+
+# trees kept per graph; each costs 4 bytes per node
+TREE_CACHE_SIZE = 64
+
+
+class TreeCache:
+    """Thread-safe LRU of shortest-path trees keyed by (root, direction, types, max hops)."""
+
+    def __init__(self, size: int = TREE_CACHE_SIZE):
+        self.size = size
+        self._trees: OrderedDict[tuple, array] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key: tuple) -> array | None:
+        with self._lock:
+            tree = self._trees.get(key)
+            if tree is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._trees.move_to_end(key)
+            return tree
+
+    def put(self, key: tuple, tree: array) -> None:
+        with self._lock:
+            self._trees[key] = tree
+            while len(self._trees) > self.size:
+                self._trees.popitem(last=False)
+
+
+def shortest_tree(graph: Graph, root: int, direction: str, allowed: set[int] | None,
+                  max_hops: int | None = None) -> array:
+    """
+    BFS tree from `root` following edges out of (">"), into ("<") or either
+    way ("-") each node, restricted to the `allowed` type ids (None = all)
+    and `max_hops`. Served from the graph's tree cache when possible.
+    """
+    key = (root, direction, None if allowed is None else frozenset(allowed), max_hops)
+    tree = graph.path_trees.get(key)
+    if tree is None:
+        tree = _bfs_tree(graph, root, direction, allowed, max_hops)
+        graph.path_trees.put(key, tree)
+    return tree
+
+
+def _bfs_tree(graph: Graph, root: int, direction: str, allowed: set[int] | None,
+              max_hops: int | None) -> array:
+    tree = array("i", [UNREACHED]) * graph.node_count
+    tree[root] = ROOT
+    out_offsets, in_offsets, in_edges = graph.out_offsets, graph.in_offsets, graph.in_edges
+    edge_src, edge_dst, edge_type = graph.edge_src, graph.edge_dst, graph.edge_type
+    frontier, depth = [root], 0
+    while frontier and (max_hops is None or depth < max_hops):
+        depth += 1
+        nxt = []
+        for v in frontier:
+            if direction != "<":
+                for e in range(out_offsets[v], out_offsets[v + 1]):
+                    if allowed is not None and edge_type[e] not in allowed:
+                        continue
+                    w = edge_dst[e]
+                    if tree[w] == UNREACHED:
+                        tree[w] = e
+                        nxt.append(w)
+            if direction != ">":
+                for i in range(in_offsets[v], in_offsets[v + 1]):
+                    e = in_edges[i]
+                    if allowed is not None and edge_type[e] not in allowed:
+                        continue
+                    w = edge_src[e]
+                    if tree[w] == UNREACHED:
+                        tree[w] = e
+                        nxt.append(w)
+        frontier = nxt
+    return tree
+
+
+def walk_back(graph: Graph, tree: array, direction: str, target: int) -> tuple[list[int], list[int]]:
+    """(edges, nodes) from `target` back to the tree's root; `target` must be reached."""
+    edge_src, edge_dst = graph.edge_src, graph.edge_dst
+    edges, nodes, v = [], [target], target
+    while tree[v] != ROOT:
+        e = tree[v]
+        edges.append(e)
+        if direction == ">":
+            v = edge_src[e]
+        elif direction == "<":
+            v = edge_dst[e]
+        else:
+            v = edge_src[e] if edge_dst[e] == v else edge_dst[e]
+        nodes.append(v)
+    return edges, nodes
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+from typing import Iterator
+
+from util import yellowify, redify
+
+# plans are the raw Bolt metadata of a PROFILE / EXPLAIN summary: nested dicts
+# with operatorType, args (EstimatedRows, Details, …), identifiers and children;
+# PROFILE adds dbHits, rows, pageCacheHits/Misses and time.
+
+# operators that read every node (or every node of a label) – the usual
+# suspects when a catalog query is slow
+SCAN_OPERATORS = {"AllNodesScan", "NodeByLabelScan"}
+
+
+def _operator(plan: dict) -> str:
+    # Neo4j suffixes the runtime, e.g. "Expand(All)@neo4j"
+    return plan.get("operatorType", "?").split("@")[0]
+
+
+def walk(plan: dict, depth: int = 0) -> Iterator[tuple[int, dict]]:
+    """(depth, operator) pairs, parents before children."""
+    yield depth, plan
+    for child in plan.get("children", []):
+        yield from walk(child, depth + 1)
+
+
+def totals(plan: dict) -> dict:
+    """Summed db hits plus the rows produced by the root operator."""
+    return {
+        "db_hits": sum(op.get("dbHits", 0) for _, op in walk(plan)),
+        "rows":    plan.get("rows"),
+        "scans":   sorted({_operator(op) for _, op in walk(plan)} & SCAN_OPERATORS),
+    }
+
+
+def plan_lines(plan: dict) -> Iterator[str]:
+    """
+    One line per operator, indented by depth: name, actual vs estimated
+    rows and db hits (PROFILE only), then the operator details. Full scans
+    are highlighted.
+    """
+    for depth, op in walk(plan):
+        name = _operator(op)
+        args = op.get("args", {})
+        parts = [f"{'  ' * depth}+ {redify(name) if name in SCAN_OPERATORS else name}"]
+        if "rows" in op:
+            parts.append(f"rows {op['rows']:,}")
+        if "EstimatedRows" in args:
+            parts.append(f"est {args['EstimatedRows']:,.0f}")
+        if "dbHits" in op:
+            parts.append(f"db hits {op['dbHits']:,}")
+        if args.get("Details"):
+            parts.append(yellowify(str(args["Details"])))
+        yield "  ".join(parts)
@@ -1,33 +1,13 @@
 #!/usr/bin/env python3
 from __future__ import annotations
-import inspect
-import os, re, argparse, cmd2
+import os, re, shutil, argparse, cmd2
 from cmd2 import with_argparser  # pip install cmd2
 
-import database, util, log
+import database, util, log, sinks
 
 _VALID_KEY = re.compile(r"^[A-Za-z_][A-Za-z0-9_\.]*$")
 
 # ---------- helpers -------------------------------------------------
-def _id_list(value: str) -> list[int]:
-    """
-    Parse a single CLI token into a list of ints.
-    Accepts comma-separated values and ranges, e.g. 1,3,5-7
-    """
-    ids: set[int] = set()
-    for part in value.split(','):
-        part = part.strip()
-        if not part:
-            continue
-        if '-' in part:
-            a, b = part.split('-', 1)
-            ids.update(range(int(a), int(b) + 1))
-        else:
-            ids.add(int(part))
-    if not ids:
-        raise argparse.ArgumentTypeError('no valid IDs found')
-    return sorted(ids)
-
 def _is_valid_key(key: str) -> bool:
     return bool(_VALID_KEY.match(key))  # reuse same pattern as driver
 
@@ -41,6 +21,7 @@ class QueryShell(cmd2.Cmd):
         db: str,
         yaml_file: str,
         *,
+        options: dict | None = None,
         persistent_history_file: str | None = None,
         persistent_history_length: int = 1000,
     ) -> None:
@@ -52,6 +33,7 @@ class QueryShell(cmd2.Cmd):
             "allow_cli_args": False,  # disable cmd2's CLI args handling
         }
 
+        import inspect
         sig = inspect.signature(cmd2.Cmd.__init__)
         if "include_ipy" in sig.parameters:
             base_kwargs["include_ipy"] = False
@@ -60,7 +42,12 @@ class QueryShell(cmd2.Cmd):
 
         super().__init__(**base_kwargs)
 
-        self.driver = database.Driver(user, pwd, db, template_file=yaml_file)
+        self.driver = database.Driver(user, pwd, db, template_file=yaml_file, options=options)
+
+    def precmd(self, statement):
+        # cmd2 has applied any `> file` redirect by now; colour for where output goes
+        util.refresh_color()
+        return statement
 
     # `set` command
     set_parser = argparse.ArgumentParser(
@@ -82,7 +69,6 @@ class QueryShell(cmd2.Cmd):
         if not util.validate_common_config(value):
             self.perror(f'{label} is empty or missing "@!"')
             return
-        util.validate_user_input(value)
         self.driver.set_param(target, value)
         log.log_successful_set(label, value)
 
@@ -121,6 +107,12 @@ class QueryShell(cmd2.Cmd):
     # --------- `run` command ----------------------------------------------
     run_parser = argparse.ArgumentParser(prog='run', description='Execute a query')
     run_parser.add_argument('index', type=int, help='Query number to run')
+    run_parser.add_argument('--fetch-size', type=util.positive_int, metavar='N',
+                            help='Records to pull from Neo4j per batch')
+    run_parser.add_argument('--limit', type=util.positive_int, metavar='K',
+                            help='Stop after K rows')
+    run_parser.add_argument('--page', nargs='?', const=0, type=util.positive_int, metavar='ROWS',
+                            help='Pause after every ROWS rows (default: the terminal height)')
 
     @with_argparser(run_parser)
     def do_run(self, args):
@@ -128,13 +120,27 @@ class QueryShell(cmd2.Cmd):
         if not 1 <= args.index <= len(self.driver.queries):
             self.perror('Index out of range')
             return
-        self.driver.run_query(str(args.index), '')
+        page_size = None
+        if args.page is not None:
+            page_size = args.page or max(1, shutil.get_terminal_size().lines - 2)
+        self.driver.run_query(str(args.index), '', fetch_size=args.fetch_size,
+                              limit=args.limit, page_size=page_size)
+        last = self.driver.metrics.entries[-1] if self.driver.metrics.entries else None
+        if args.limit and last is not None and last.truncated:
+            log.log_yellow(f'[!] Stopped after {args.limit} rows (--limit)')
 
     # --------- `export` command -------------------------------------------
     export_parser = argparse.ArgumentParser(
         prog='export', description='Run a query and save its results')
     export_parser.add_argument('index', type=int)
     export_parser.add_argument('-o', '--output', help='Output file name', required=True)
+    export_parser.add_argument(
+        '-f', '--format',
+        choices=sinks.export_formats,
+        default='text',
+        help='text: rendered messages (default); jsonl/csv/parquet: raw result columns')
+    export_parser.add_argument('--fetch-size', type=util.positive_int, metavar='N',
+                               help='Records to pull from Neo4j per batch')
 
     @with_argparser(export_parser)
     def do_export(self, args):
@@ -142,8 +148,9 @@ class QueryShell(cmd2.Cmd):
         if not 1 <= args.index <= len(self.driver.queries):
             self.perror('Index out of range')
             return
-        outfile = util.validate_export_command(args.output)
-        self.driver.run_query(str(args.index), outfile)
+        ext = 'txt' if args.format == 'text' else args.format
+        outfile = util.validate_export_command(args.output, ext)
+        self.driver.run_query(str(args.index), outfile, args.format, args.fetch_size)
 
     # --- list/search/quit map directly to driver methods ------------------
     list_parser = argparse.ArgumentParser(prog='list')
@@ -164,6 +171,15 @@ class QueryShell(cmd2.Cmd):
             return
         self.driver.search_queries(arg)
 
+    def do_reload(self, _):
+        """Re-read the query YAML file."""
+        try:
+            self.driver.reload_queries()
+        except Exception as e:
+            self.perror(str(e))
+            return
+        log.log_green(f'[+] Loaded {len(self.driver.queries)} queries')
+
     # ---------- `report` command ---------------------------------------
     report_parser = argparse.ArgumentParser(
         prog='report',
@@ -172,7 +188,7 @@ class QueryShell(cmd2.Cmd):
     report_parser.add_argument(
         'ids',
         nargs='*',          # 0 → ALL queries, ≥1 → selected
-        type=_id_list,
+        type=util.id_list,
         metavar='ID[,ID|ID-ID] ...',
         help=('IDs of queries to include. '
               'You can pass multiple tokens and use ranges, '
@@ -185,6 +201,18 @@ class QueryShell(cmd2.Cmd):
         help='Base directory where the HTML report folder will be created '
              '(default: %(default)s)'
     )
+    report_parser.add_argument(
+        '-j', '--jobs',
+        type=util.positive_int,
+        default=1,
+        metavar='N',
+        help='Number of queries to run concurrently (default: %(default)s)'
+    )
+    report_parser.add_argument(
+        '--incremental',
+        metavar='PREV_DIR',
+        help='Reuse the pages of an earlier report whose query, params and graph are unchanged'
+    )
     report_parser.add_argument(
         '--open',
         action='store_true',
@@ -205,7 +233,9 @@ class QueryShell(cmd2.Cmd):
         try:
             self.driver.run_queries_to_html(
                 query_ids=[str(i) for i in flat_ids] if flat_ids else None,
-                report_root=args.output
+                report_root=args.output,
+                jobs=args.jobs,
+                previous=args.incremental
             )
             if args.open:
                 import webbrowser, pathlib
@@ -216,6 +246,130 @@ class QueryShell(cmd2.Cmd):
         except Exception as e:
             self.perror(str(e))
 
+    # ---------- `cache` command ----------------------------------------
+    cache_parser = argparse.ArgumentParser(
+        prog='cache', description='Manage the on-disk result cache')
+    cache_parser.add_argument('action', choices=['info', 'clear', 'on', 'off'])
+
+    @with_argparser(cache_parser)
+    def do_cache(self, args: argparse.Namespace):
+        """Show, clear, enable or disable the result cache."""
+        rc = self.driver.result_cache
+        if args.action == 'clear':
+            log.log_green(f'[+] Removed {self.driver.clear_result_cache()} cached results')
+        elif args.action in ('on', 'off'):
+            self.driver.cache_enabled = args.action == 'on'
+            log.log_successful_set('cache', args.action)
+        else:
+            entries, size = rc.stats()
+            state = 'on' if self.driver.cache_enabled else 'off'
+            self.poutput(f'{state}: {entries} entries, {size / 1048576:.1f} MiB in {rc.root} '
+                         f'(max {rc.max_entries} entries, {rc.max_bytes / 1048576:.0f} MiB)')
+
+    # ---------- `profile` command --------------------------------------
+    profile_parser = argparse.ArgumentParser(
+        prog='profile', description='Show the Neo4j query plan of a stored query')
+    profile_parser.add_argument('index', type=int, help='Query number to profile')
+    profile_parser.add_argument('--explain', action='store_true',
+                                help='Only plan the query (EXPLAIN) instead of running it (PROFILE)')
+    profile_parser.add_argument('-o', '--output', help='Also save the plan as exports/<name>.json')
+
+    @with_argparser(profile_parser)
+    def do_profile(self, args: argparse.Namespace):
+        """Print a query's operator tree with rows, estimates and db hits."""
+        if not 1 <= args.index <= len(self.driver.queries):
+            self.perror('Index out of range')
+            return
+        profile = self.driver.profile_query(str(args.index), explain=args.explain)
+        if not profile or not profile['plan']:
+            return
+
+        import query_plan
+        for line in query_plan.plan_lines(profile['plan']):
+            self.poutput(line)
+        profile['totals'] = query_plan.totals(profile['plan'])
+        if args.explain:
+            self.poutput(f"planned in {profile['available_after_ms']} ms")
+        else:
+            self.poutput(f"{profile['totals']['db_hits']:,} total db hits, "
+                         f"{profile['totals']['rows']:,} rows, "
+                         f"{profile['available_after_ms'] + profile['consumed_after_ms']} ms")
+        if profile['totals']['scans']:
+            log.log_yellow(f"[!] Full scans: {', '.join(profile['totals']['scans'])}")
+
+        if args.output:
+            import json
+            path = util.validate_export_command(args.output, 'json')
+            with open(path, 'w') as fh:
+                json.dump(profile, fh, indent=2, default=str)
+            log.log_successful_export(path)
+
+    # ---------- `advise` command ---------------------------------------
+    advise_parser = argparse.ArgumentParser(
+        prog='advise', description='Suggest Neo4j indexes for the loaded queries')
+    advise_parser.add_argument('--create', action='store_true',
+                               help='Create the missing indexes and wait for them to come online')
+    advise_parser.add_argument('--label', default='Base',
+                               help='Label to index for label-less filters (default: %(default)s)')
+
+    @with_argparser(advise_parser)
+    def do_advise(self, args: argparse.Namespace):
+        """Compare the queries' property filters with the database's indexes."""
+        import index_advisor
+        try:
+            index_advisor.run(self.driver, create=args.create, default_label=args.label)
+        except Exception as e:
+            self.perror(str(e))
+
+    # ---------- `enrich` command ---------------------------------------
+    enrich_parser = argparse.ArgumentParser(
+        prog='enrich', description='Precompute derived facts in the graph after an ingest')
+    enrich_parser.add_argument('--steps', type=lambda v: v.split(','), metavar='STEP[,STEP]',
+                               help='wellknown, tier0, owned, membership '
+                                    '(default: wellknown,tier0,owned)')
+    enrich_parser.add_argument('--batch-size', type=util.positive_int, default=10_000, metavar='N',
+                               help='Rows per transaction (default: %(default)s)')
+
+    @with_argparser(enrich_parser)
+    def do_enrich(self, args: argparse.Namespace):
+        """Write well-known SID flags, tier labels and membership shortcuts."""
+        import enrich
+        unknown = set(args.steps or []) - set(enrich.STEPS)
+        if unknown:
+            self.perror(f"Unknown step(s): {', '.join(sorted(unknown))}")
+            return
+        enrich.run(self.driver, args.steps, args.batch_size)
+
+    # ---------- `snapshot` command -------------------------------------
+    snapshot_parser = argparse.ArgumentParser(
+        prog='snapshot', description='Write the graph to a snapshot file (open one with '
+                                     '`cypherhound.py snapshot load PATH`)')
+    snapshot_parser.add_argument('path', metavar='PATH')
+    snapshot_parser.add_argument('--properties', type=lambda v: v.split(','), default=[],
+                                 metavar='PROP[,PROP]',
+                                 help='Node properties to keep besides the key ones and those the queries read')
+
+    @with_argparser(snapshot_parser)
+    def do_snapshot(self, args: argparse.Namespace):
+        """Save the graph to a memory-mapped snapshot file."""
+        import snapshot
+        try:
+            snapshot.run_save(self.driver, args.path, args.properties)
+        except Exception as e:
+            self.perror(str(e))
+
+    # ---------- `color` command ----------------------------------------
+    color_parser = argparse.ArgumentParser(
+        prog='color', description='Choose when query output is coloured')
+    color_parser.add_argument('mode', choices=util.color_modes,
+                              help='auto: only on a terminal (default)')
+
+    @with_argparser(color_parser)
+    def do_color(self, args: argparse.Namespace):
+        """Set the colour mode (auto|always|never)."""
+        util.set_color_mode(args.mode)
+        log.log_successful_set('color', args.mode)
+
     # aliases for clean exit
     def do_quit(self, _):  return True
     do_q = do_exit = do_stop = do_quit
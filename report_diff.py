@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+import heapq, json, sys, tempfile
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from log import log_error, log_green, log_yellow
+from util import greenify, redify, yellowify
+
+# Raw result files written with every report, and `report diff` between two
+# reports. Each details page gets data/<key>.jsonl: its rows as canonical
+# JSON (sorted keys, compact), one per line, in sorted order. Two reports
+# are paired on the page key (see database.page_key), which unlike the
+# query id survives catalog edits, and compared query by query with a
+# single merge pass over both files, which takes time linear in the rows
+# and constant memory however large the results are.
+
+# rows sorted in memory before a run is spilled to a temporary file
+RUN_ROWS = 200_000
+
+
+def canonical(row: dict) -> str:
+    """One row as a line of JSON that is equal for equal rows."""
+    return json.dumps(row, sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+                      default=str) + "\n"
+
+
+class SortedRows:
+    """
+    Collects rows and writes them to `path` as sorted canonical JSON lines.
+    Past RUN_ROWS rows, sorted runs are spilled to temporary files and
+    merged on close, so memory stays bounded.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._run: list[str] = []
+        self._spills = []
+
+    def add(self, row: dict) -> None:
+        self._run.append(canonical(row))
+        if len(self._run) >= RUN_ROWS:
+            self._spill()
+
+    def _spill(self) -> None:
+        self._run.sort()
+        fh = tempfile.TemporaryFile("w+", encoding="utf-8")
+        fh.writelines(self._run)
+        fh.seek(0)
+        self._spills.append(fh)
+        self._run = []
+
+    def close(self, write: bool = True) -> None:
+        """Write the file, or with `write` False just drop what was collected."""
+        self._run.sort()
+        try:
+            if write:
+                with self.path.open("w", encoding="utf-8") as out:
+                    out.writelines(heapq.merge(self._run, *self._spills))
+        finally:
+            for fh in self._spills:
+                fh.close()
+            self._run, self._spills = [], []
+
+
+# ------------------------------------------------------------------------- #
+# diff
+# ------------------------------------------------------------------------- #
+def merge_diff(old: Iterable[str], new: Iterable[str]) -> Iterator[tuple[str, str]]:
+    """
+    ("-", line) for lines only in `old` and ("+", line) for lines only in
+    `new`, both sorted; repeated lines count as often as they occur.
+    """
+    old, new = iter(old), iter(new)
+    a, b = next(old, None), next(new, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a < b):
+            yield "-", a
+            a = next(old, None)
+        elif a is None or b < a:
+            yield "+", b
+            b = next(new, None)
+        else:
+            a, b = next(old, None), next(new, None)
+
+
+def _manifest(report: Path) -> dict:
+    from database import MANIFEST_NAME
+    try:
+        return json.loads((report / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"{report} has no usable manifest: {e}") from e
+
+
+def _pages(report: Path) -> dict[str, tuple[str, dict]]:
+    """A report's pages as page key → (query id, page); ids shift between catalogs, keys do not."""
+    from database import page_key
+    return {page.get("key") or page_key(page["desc"]): (qid, page)
+            for qid, page in _manifest(report)["pages"].items()}
+
+
+def _lines(report: Path, page: dict) -> Iterator[str]:
+    with (report / page["data"]).open(encoding="utf-8") as fh:
+        yield from fh
+
+
+def run(old_dir: str, new_dir: str, out=None, fmt: str = "text", show: int = 10) -> int:
+    """
+    Compare the reports in `old_dir` and `new_dir` and write the per-query
+    added/removed rows to `out` (stdout): up to `show` of each per query as
+    text, or every one as JSON lines. Returns the number of queries that
+    differ.
+    """
+    out = out or sys.stdout
+    # colour only what goes to the terminal
+    green, red, yellow = (greenify, redify, yellowify) if out is sys.stdout else (str, str, str)
+    old_dir, new_dir = Path(old_dir), Path(new_dir)
+    old, new = _pages(old_dir), _pages(new_dir)
+
+    def order(key: str):
+        # the new report's queries by id, then those only the old one has
+        qid = (new.get(key) or old[key])[0]
+        return key not in new, len(qid), qid
+
+    keys = sorted(old.keys() | new.keys(), key=order)
+    changed = 0
+    for key in keys:
+        new_qid, b = new.get(key, (None, None))
+        old_qid, a = old.get(key, (None, None))
+        qid = new_qid or old_qid       # shown by its id in the new report
+        desc = (b or a)["desc"]
+        if a is None or b is None:
+            changed += 1
+            if fmt == "jsonl":
+                out.write(canonical({"id": qid, "desc": desc, "change": "query only in old report"
+                                     if b is None else "query only in new report"}))
+            else:
+                side = "old" if b is None else "new"
+                out.write(yellow(f"[~] {qid:>4}  {desc}: only in the {side} report "
+                                 f"({(a or b)['count']} rows)") + "\n")
+            continue
+        if "data" not in a or "data" not in b:
+            log_yellow(f"[!] Query {qid} has no raw data in one of the reports; skipping")
+            continue
+
+        added = removed = 0
+        sample = []
+        for sign, line in merge_diff(_lines(old_dir, a), _lines(new_dir, b)):
+            if sign == "+":
+                added += 1
+            else:
+                removed += 1
+            if fmt == "jsonl":
+                out.write(canonical({"id": qid, "desc": desc,
+                                     "change": "added" if sign == "+" else "removed",
+                                     "row": json.loads(line)}))
+            elif len(sample) < show:
+                sample.append((sign, line))
+        if not (added or removed):
+            continue
+        changed += 1
+        if fmt == "jsonl":
+            continue
+        old_inputs, new_inputs = a.get("inputs") or {}, b.get("inputs") or {}
+        notes = [f"{key} changed" for key in ("query", "params")
+                 if old_inputs.get(key) != new_inputs.get(key)]
+        note = f" ({', '.join(notes)})" if notes else ""
+        out.write(f"{green('[+]')} {qid:>4}  {desc}{note}: {green(f'+{added}')} {red(f'-{removed}')}\n")
+        for sign, line in sample:
+            out.write(f"      {(green if sign == '+' else red)(sign)} {line}")
+        if added + removed > len(sample):
+            out.write(f"      … {added + removed - len(sample)} more\n")
+
+    if fmt != "jsonl":
+        if changed:
+            log_green(f"[+] {changed} of {len(keys)} queries differ")
+        else:
+            log_green(f"[+] No differences across {len(keys)} queries")
+    return changed
+
+
+def write_diff(old_dir: str, new_dir: str, output: str | None, fmt: str, show: int) -> int | None:
+    """
+    `report diff` entry point: the number of queries that differ, or None
+    if either report cannot be read.
+    """
+    try:
+        if output:
+            with open(output, "w", encoding="utf-8") as fh:
+                return run(old_dir, new_dir, fh, fmt, show)
+        return run(old_dir, new_dir, None, fmt, show)
+    except (OSError, RuntimeError) as e:
+        log_error(e)
+        return None
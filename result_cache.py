@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+import os, json, hashlib, pickle, threading
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator
+
+# bump whenever the shape of cached rows changes
+_RESULT_CACHE_VERSION = 1
+
+# rows are pickled in batches to keep per-row overhead low
+_BATCH_ROWS = 1000
+
+
+class ResultCache:
+    """
+    On-disk cache of query result rows.
+
+    Each entry is one file of pickled row batches named after its key. A hit
+    bumps the file's mtime, so eviction drops the least recently used entries
+    first once the cache holds more than `max_entries` files or `max_bytes`.
+    Rows are only cached once a result has been read to the end; a query that
+    fails or is abandoned half-way leaves nothing behind.
+    """
+
+    SUFFIX = ".rows"
+
+    def __init__(self, root: str | Path, max_entries: int = 500, max_bytes: int = 1 << 30):
+        self.root = Path(root)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Stable key from JSON-able parts (query id, cypher, params, fingerprint …)."""
+        blob = json.dumps([_RESULT_CACHE_VERSION, *parts], sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / (key + self.SUFFIX)
+
+    def get(self, key: str) -> Iterator[dict] | None:
+        """Replay the rows stored under `key`, or None on a miss."""
+        path = self._path(key)
+        try:
+            fh = path.open("rb")
+        except OSError:
+            return None
+        try:
+            os.utime(path)          # LRU: a hit makes the entry recent again
+        except OSError:
+            pass
+        return self._replay(fh)
+
+    @staticmethod
+    def _replay(fh) -> Iterator[dict]:
+        with fh:
+            while True:
+                try:
+                    batch = pickle.load(fh)
+                except EOFError:
+                    return
+                yield from batch
+
+    def record(self, key: str, rows: Iterable[dict]) -> Iterator[dict]:
+        """
+        Pass `rows` through unchanged while writing them under `key`.
+        The entry is committed only if the caller exhausts the iterator.
+        """
+        writer = _EntryWriter(self, key)
+        try:
+            for row in rows:
+                writer.add(row)
+                yield row
+            writer.commit()
+        finally:
+            writer.abort()
+
+    async def arecord(self, key: str, rows: AsyncIterable[dict]) -> AsyncIterator[dict]:
+        """`record` for an async row source."""
+        writer = _EntryWriter(self, key)
+        try:
+            async for row in rows:
+                writer.add(row)
+                yield row
+            writer.commit()
+        finally:
+            writer.abort()
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        out = []
+        for path in self.root.glob("*" + self.SUFFIX):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            out.append((st.st_mtime, st.st_size, path))
+        return out
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = sorted(self._entries())          # oldest first
+            total = sum(size for _, size, _ in entries)
+            while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+                _, size, path = entries.pop(0)
+                path.unlink(missing_ok=True)
+                total -= size
+
+    def stats(self) -> tuple[int, int]:
+        """(number of entries, total bytes)"""
+        entries = self._entries()
+        return len(entries), sum(size for _, size, _ in entries)
+
+    def clear(self) -> int:
+        """Delete every entry; returns how many were removed."""
+        removed = 0
+        with self._lock:
+            for _, _, path in self._entries():
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+
+class _EntryWriter:
+    """
+    Temp file collecting the rows of one cache entry. `commit` moves it into
+    place; `abort` (a no-op after commit) throws it away. An entry that
+    outgrows the cache is dropped early and further rows are ignored.
+    """
+
+    def __init__(self, cache: ResultCache, key: str):
+        cache.root.mkdir(parents=True, exist_ok=True)
+        self._cache = cache
+        self._final = cache._path(key)
+        self._tmp = self._final.with_name(
+            f"{self._final.name}.{os.getpid()}.{threading.get_ident()}.{id(self)}.tmp")
+        self._fh = self._tmp.open("wb")
+        self._batch: list[dict] = []
+
+    def add(self, row: dict) -> None:
+        if self._fh is None:
+            return
+        self._batch.append(row)
+        if len(self._batch) >= _BATCH_ROWS:
+            self._flush()
+            if self._fh.tell() > self._cache.max_bytes:
+                # too large to ever fit – stop caching, keep streaming
+                self.abort()
+
+    def _flush(self) -> None:
+        pickle.dump(self._batch, self._fh, protocol=pickle.HIGHEST_PROTOCOL)
+        self._batch = []
+
+    def commit(self) -> None:
+        if self._fh is None:
+            return
+        if self._batch:
+            self._flush()
+        self._fh.close()
+        self._fh = None
+        os.replace(self._tmp, self._final)
+        self._cache._evict()
+
+    def abort(self) -> None:
+        if self._fh is None:
+            return
+        self._fh.close()
+        self._fh = None
+        self._tmp.unlink(missing_ok=True)
@@ -63,5 +63,12 @@ if __name__ == "__main__":
 
         d.driver.close()
 
+        # the result cache cannot see marks (see database._FINGERPRINT_CYPHER)
+        from result_cache import ResultCache
+        cache_dir = config.get("result_cache", {}).get("dir", ".cache/results")
+        removed = ResultCache(cache_dir).clear()
+        if removed:
+            print(f'{log.yellow}[!] Cleared {removed} cached results{log.reset}')
+
     except Exception as e:
         log.log_error(e)
\ No newline at end of file
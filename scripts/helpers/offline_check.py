@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+offline_check.py
+================
+Run every catalog query against an offline graph (see `--offline`) and
+report which ones the in-memory engine cannot evaluate, plus the slowest.
+
+Useful both as a smoke test of a queries file without a Neo4j server and as
+a benchmark of the catalog against a given collection. Query parameters
+that entries reference ($params.X) are set with --set; entries whose
+parameters are missing are listed as skipped.
+
+Usage: python3 scripts/helpers/offline_check.py COLLECTION [-y ad-queries.yaml]
+                                               [--set KEY=VALUE ...] [--top 10]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT))
+
+from database import Driver           # noqa: E402
+from offline_cypher import CypherError  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the query catalog against an offline graph")
+    ap.add_argument("collection", help="SharpHound JSON (file, directory or zip) or APOC JSON export")
+    ap.add_argument("-y", "--yaml", default=str(ROOT / "ad-queries.yaml"), help="Query YAML to load")
+    ap.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                    help="Set params.KEY (repeatable)")
+    ap.add_argument("--top", type=int, default=10, help="Slowest queries to list (default: 10)")
+    args = ap.parse_args()
+
+    options = {"offline": args.collection, "metrics": {"enabled": False},
+               "result_cache": {"enabled": False}}
+    driver = Driver("", "", "offline", template_file=args.yaml, options=options)
+    for assignment in args.set:
+        key, _, value = assignment.partition("=")
+        driver.set_param(key.strip(), value)
+    driver.driver   # load the graph up front so it is not timed with the first query
+
+    timings, failed, skipped = [], [], []
+    for qid, q in driver.queries.items():
+        start = time.perf_counter()
+        try:
+            rows = sum(1 for _ in driver._iter_rows(q))
+        except CypherError as e:
+            failed.append((qid, q["desc"], str(e)))
+            continue
+        except RuntimeError as e:
+            if "is not set" not in str(e):
+                raise
+            skipped.append(qid)
+            continue
+        timings.append((time.perf_counter() - start, qid, q["desc"], rows))
+
+    print(f"{len(timings)} ran, {len(failed)} unsupported, {len(skipped)} skipped (missing params)")
+    for qid, desc, error in failed:
+        print(f"  ✗ {qid:>4}  {desc}\n         {error}")
+    if skipped:
+        print(f"  skipped: {', '.join(skipped)}")
+    print(f"total {sum(t for t, *_ in timings):.2f}s; slowest:")
+    for elapsed, qid, desc, rows in sorted(timings, reverse=True)[:args.top]:
+        print(f"  {elapsed * 1000:9.1f} ms  {qid:>4}  {rows:>6} rows  {desc}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+rewrite_sid_regex.py
+====================
+Rewrite well-known-SID regex filters in a queries file into STARTS WITH /
+ENDS WITH predicates, which Neo4j can answer from an index instead of
+evaluating a regex against every node:
+
+• x.objectid =~ "(?i).*-S-1-5-11"      → x.objectid ENDS WITH "-S-1-5-11"
+• x.objectid =~ "(?i)S-1-5-21-.*-513"  → (x.objectid STARTS WITH "S-1-5-21-" AND x.objectid ENDS WITH "-513")
+• x.objectid =~ "(?i)S-1-5-32-544"     → x.objectid = "S-1-5-32-544"
+
+Only patterns made of SID characters around a single `.*` are touched;
+anything else is left as it is. BloodHound stores object IDs upper-case, so
+the (?i) flag is dropped and the literals are upper-cased. The file is edited
+as text, so YAML formatting and comments are kept; JSON files with escaped
+quotes (e.g. ad-queries.json) work too.
+
+Usage: python3 scripts/helpers/rewrite_sid_regex.py ad-queries.yaml [more files] [--check]
+"""
+
+import argparse
+import re
+import sys
+from pathlib import Path
+
+# <var>.objectid =~ "(?i)<pattern>"  – the quote may be JSON-escaped (\")
+SID_REGEX = re.compile(
+    r'(?P<prop>\b[A-Za-z_]\w*\.objectid)\s*=~\s*(?P<q>\\?")(?:\(\?i\))?(?P<pattern>[A-Za-z0-9.*-]+)(?P=q)'
+)
+SID_LITERAL = re.compile(r"[A-Za-z0-9-]*")
+
+
+def rewrite_predicate(m: re.Match) -> str:
+    prop, q, pattern = m.group("prop"), m.group("q"), m.group("pattern")
+    head, star, tail = pattern.partition(".*")
+    if ".*" in tail or not SID_LITERAL.fullmatch(head) or not SID_LITERAL.fullmatch(tail):
+        return m.group(0)
+    head, tail = head.upper(), tail.upper()
+
+    def lit(s: str) -> str:
+        return f"{q}{s}{q}"
+
+    if not star:
+        return f"{prop} = {lit(head)}"
+    if head and tail:
+        return f"({prop} STARTS WITH {lit(head)} AND {prop} ENDS WITH {lit(tail)})"
+    if tail:
+        return f"{prop} ENDS WITH {lit(tail)}"
+    if head:
+        return f"{prop} STARTS WITH {lit(head)}"
+    return m.group(0)  # ".*" alone matches everything; leave it be
+
+
+def rewrite(text: str) -> tuple[str, int]:
+    """Return the rewritten text and how many predicates changed."""
+    changed = 0
+
+    def sub(m: re.Match) -> str:
+        nonlocal changed
+        new = rewrite_predicate(m)
+        changed += new != m.group(0)
+        return new
+
+    return SID_REGEX.sub(sub, text), changed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Rewrite objectid SID regexes as STARTS/ENDS WITH")
+    ap.add_argument("files", nargs="+", type=Path, help="Queries YAML/JSON files to rewrite in place")
+    ap.add_argument("--check", action="store_true",
+                    help="Only report what would change; exit 1 if anything would")
+    args = ap.parse_args()
+
+    pending = 0
+    for path in args.files:
+        text = path.read_text(encoding="utf-8")
+        new, changed = rewrite(text)
+        pending += changed
+        if args.check:
+            print(f"{path}: {changed} predicate(s) to rewrite")
+        elif changed:
+            path.write_text(new, encoding="utf-8")
+            print(f"{path}: rewrote {changed} predicate(s)")
+        else:
+            print(f"{path}: nothing to rewrite")
+    if args.check and pending:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
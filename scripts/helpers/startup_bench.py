@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+startup_bench.py
+================
+Measure how long cypherhound takes to get going, using `python -X importtime`.
+
+Each scenario is run in a fresh interpreter several times; the median wall
+time is reported together with the slowest imports (cumulative µs) of the
+last run. Scenarios:
+
+• help   – `cypherhound.py --help` (argument parsing only)
+• batch  – import `database` and load the query catalog, as `run`/`report` do
+• shell  – import `query_shell` (cmd2, readline) on top of the batch path
+
+No connection to Neo4j is required; the driver is created on first query.
+
+Usage: python3 scripts/helpers/startup_bench.py -y ad-queries.yaml [-n 5] [--top 15]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def scenarios(yaml_file: str) -> dict[str, list[str]]:
+    load = ("import database; "
+            f"database.Driver('neo4j', 'x', 'neo4j', template_file={yaml_file!r})")
+    return {
+        "help":  [str(ROOT / "cypherhound.py"), "-c", "config.json", "--help"],
+        "batch": ["-c", load],
+        "shell": ["-c", load + "; import query_shell"],
+    }
+
+
+def run_once(args: list[str]) -> tuple[float, str]:
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args],
+                          cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    return elapsed, proc.stderr
+
+
+def top_imports(importtime: str, n: int) -> list[tuple[int, str]]:
+    """Parse `import time: self | cumulative | name` lines → top-n top-level imports."""
+    rows = []
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (p.strip() for p in line[len("import time:"):].split("|"))
+        # nested imports are indented; keep only what the program imports itself
+        if not name.startswith(" "):
+            rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark cypherhound start-up time")
+    ap.add_argument("-y", "--yaml", default="ad-queries.yaml", help="Query YAML to load")
+    ap.add_argument("-n", "--runs", type=int, default=5, help="Runs per scenario (default: 5)")
+    ap.add_argument("--top", type=int, default=10, help="Slowest imports to list (default: 10)")
+    args = ap.parse_args()
+
+    for name, cmd in scenarios(args.yaml).items():
+        times, importtime = [], ""
+        for _ in range(max(1, args.runs)):
+            elapsed, importtime = run_once(cmd)
+            times.append(elapsed)
+        print(f"[{name}] median {statistics.median(times) * 1000:.1f} ms "
+              f"(min {min(times) * 1000:.1f} ms, {len(times)} runs)")
+        for cumulative, module in top_imports(importtime, args.top):
+            print(f"    {cumulative / 1000:8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+import sys, csv, json, tempfile
+
+# path that makes a structured sink write to standard output
+STDOUT = "-"
+
+
+def _open_output(path: str, **kwargs):
+    """Open `path` for writing, or wrap stdout (left open on close) for STDOUT."""
+    if path == STDOUT:
+        return open(sys.stdout.fileno(), 'w', closefd=False, **kwargs)
+    return open(path, 'w', **kwargs)
+
+
+class TextSink:
+    """
+    Destination for the rendered messages of one query.
+
+    Every message is echoed to the terminal unless `echo` is off. When a
+    path is given the file is opened once and truncated, like the
+    structured sinks' files, and messages are written through a large
+    buffer instead of reopening the file for every row. Messages for a file
+    are rendered without colour, so they are written as-is.
+
+    With `page_size` set, terminal output stops every `page_size` messages
+    until the user asks for more; `stopped` turns true once they decline.
+    """
+
+    BUFFER_SIZE = 1 << 16
+
+    def __init__(self, path: str = "", echo: bool = True, page_size: int | None = None):
+        self.path = path
+        self.echo = echo
+        self.page_size = page_size if echo and not path else None
+        self.stopped = False
+        self.bytes_written = 0
+        self._on_page = 0
+        self._fh = None
+
+    def __enter__(self):
+        if self.path:
+            self._fh = open(self.path, 'w', encoding=sys.getfilesystemencoding(),
+                            errors='replace', buffering=self.BUFFER_SIZE)
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, message: str) -> None:
+        if self.echo:
+            print(message)
+        if self._fh:
+            self._fh.write(message + '\n')
+        self.bytes_written += len(message.encode()) + 1
+
+    def write_batch(self, messages: list[str]) -> int:
+        """
+        Write several messages with one terminal write and one file write.
+        Returns how many were written, fewer when paging was stopped.
+        """
+        if not messages or self.stopped:
+            return 0
+        if self.page_size:
+            return self._write_paged(messages)
+        block = '\n'.join(messages) + '\n'
+        if self.echo:
+            sys.stdout.write(block)
+        if self._fh:
+            self._fh.write(block)
+        self.bytes_written += len(block.encode())
+        return len(messages)
+
+    def _write_paged(self, messages: list[str]) -> int:
+        written = 0
+        for message in messages:
+            if self._on_page >= self.page_size:
+                if not self._more():
+                    self.stopped = True
+                    break
+                self._on_page = 0
+            print(message)
+            self.bytes_written += len(message.encode()) + 1
+            self._on_page += 1
+            written += 1
+        return written
+
+    @staticmethod
+    def _more() -> bool:
+        try:
+            answer = input('-- More -- [Enter] next page, [q] quit: ')
+        except (EOFError, KeyboardInterrupt):
+            print()
+            return False
+        return answer.strip().lower() not in ('q', 'quit')
+
+    def close(self) -> None:
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+
+
+# --------------------------------------------------------------------- #
+# structured sinks – raw result columns, no colour or msg_template
+# --------------------------------------------------------------------- #
+# keys of one hop of a path row (see database._path_hops)
+_HOP_FIELDS = ("src", "src_labels", "type", "dst", "dst_labels")
+
+
+def _explode_hops(row: dict):
+    """
+    Yield one flat row per hop of a path row; other rows pass through.
+    Used by the tabular formats, which cannot hold a nested hops list. A
+    zero-hop path (start and end are the same node) gives one row with
+    hop_num 0 and empty hop columns.
+    """
+    hops = row.get("hops")
+    if not isinstance(hops, list):
+        yield row
+        return
+    base = {k: v for k, v in row.items() if k != "hops"}
+    if not hops:
+        yield {**base, "hop_num": 0, **dict.fromkeys(_HOP_FIELDS)}
+    for hop_num, hop in enumerate(hops, 1):
+        yield {**base, "hop_num": hop_num, **hop}
+
+
+def _cell(value):
+    """CSV cell for a raw value – lists and maps are written as JSON."""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str, ensure_ascii=False)
+    return value
+
+
+class JsonlSink:
+    """One JSON object per result row; path rows keep their nested hops."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = _open_output(self.path, encoding='utf-8', buffering=TextSink.BUFFER_SIZE)
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write_row(self, row: dict) -> None:
+        self._fh.write(json.dumps(row, default=str, ensure_ascii=False) + '\n')
+
+    def close(self) -> None:
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+
+
+class CsvSink:
+    """CSV with a header taken from the first row; path rows are exploded per hop."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = None
+        self._writer = None
+
+    def __enter__(self):
+        self._fh = _open_output(self.path, encoding='utf-8', newline='',
+                                buffering=TextSink.BUFFER_SIZE)
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write_row(self, row: dict) -> None:
+        for flat in _explode_hops(row):
+            if self._writer is None:
+                self._writer = csv.DictWriter(self._fh, fieldnames=list(flat),
+                                              extrasaction='ignore')
+                self._writer.writeheader()
+            self._writer.writerow({k: _cell(v) for k, v in flat.items()})
+
+    def close(self) -> None:
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+
+
+def _text(value):
+    """String form of a parquet cell whose column fell back to text."""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, default=str, ensure_ascii=False)
+
+
+class ParquetSink:
+    """
+    Parquet file written in row groups of BATCH_ROWS; path rows are
+    exploded per hop. Needs the optional pyarrow package.
+
+    A Parquet file has one schema, but a later batch can bring a new column
+    or another type. A single batch is written as it is; with more, every
+    batch is spilled to a temporary Parquet file and the schemas are merged
+    on close (a column whose types cannot be reconciled becomes a string),
+    then the batches are copied into the output, conformed to that schema.
+    """
+
+    BATCH_ROWS = 50_000
+
+    def __init__(self, path: str):
+        if path == STDOUT:
+            raise RuntimeError("parquet export needs an output file")
+        self.path = path
+        self._rows: list[dict] = []
+        self._spills = []
+        try:
+            import pyarrow, pyarrow.parquet
+        except ImportError as e:
+            raise RuntimeError("parquet export requires pyarrow (pip install pyarrow)") from e
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write_row(self, row: dict) -> None:
+        self._rows.extend(_explode_hops(row))
+        if len(self._rows) >= self.BATCH_ROWS:
+            self._spill()
+
+    def _column(self, values: list):
+        pa = self._pa
+        try:
+            return pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # mixed types within the batch: keep the column as text
+            return pa.array([_text(v) for v in values], pa.string())
+
+    def _table(self):
+        # columns from every row of the batch, not just the first one
+        names = dict.fromkeys(k for row in self._rows for k in row)
+        table = self._pa.table({k: self._column([row.get(k) for row in self._rows]) for k in names})
+        self._rows = []
+        return table
+
+    def _spill(self) -> None:
+        fh = tempfile.TemporaryFile()
+        self._pq.write_table(self._table(), fh)
+        fh.seek(0)
+        self._spills.append(fh)
+
+    def _schema(self, schemas):
+        pa = self._pa
+        fields = {}
+        for schema in schemas:
+            for field in schema:
+                known = fields.get(field.name)
+                if known is None or known.type == field.type:
+                    fields[field.name] = known or field
+                    continue
+                try:
+                    fields[field.name] = pa.unify_schemas(
+                        [pa.schema([known]), pa.schema([field])], promote_options="permissive")[0]
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    fields[field.name] = pa.field(field.name, pa.string())
+        return pa.schema(list(fields.values()))
+
+    def _conform(self, table, schema):
+        pa = self._pa
+        columns = []
+        for field in schema:
+            if field.name not in table.column_names:
+                columns.append(pa.nulls(len(table), field.type))
+                continue
+            column = table[field.name]
+            if column.type != field.type:
+                try:
+                    column = column.cast(field.type)
+                except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                    column = pa.array([_text(v) for v in column.to_pylist()], field.type)
+            columns.append(column)
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    def close(self) -> None:
+        try:
+            if not self._spills:
+                if self._rows:
+                    self._pq.write_table(self._table(), self.path, row_group_size=self.BATCH_ROWS)
+                return
+            if self._rows:
+                self._spill()
+            files = [self._pq.ParquetFile(fh) for fh in self._spills]
+            schema = self._schema(f.schema_arrow for f in files)
+            with self._pq.ParquetWriter(self.path, schema) as writer:
+                for f in files:
+                    for batch in f.iter_batches(batch_size=self.BATCH_ROWS):
+                        writer.write_table(self._conform(self._pa.Table.from_batches([batch]), schema))
+        finally:
+            for fh in self._spills:
+                fh.close()
+            self._spills, self._rows = [], []
+
+
+STRUCTURED_SINKS = {
+    "jsonl":   JsonlSink,
+    "csv":     CsvSink,
+    "parquet": ParquetSink,
+}
+export_formats = ["text", *STRUCTURED_SINKS]
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+import json, mmap, os, sys, time
+from array import array
+from pathlib import Path as FilePath
+from typing import Iterator
+
+from log import log_green
+from offline_graph import Graph
+
+# Graph snapshots: an offline Graph written as one file so a stored
+# engagement can be reopened without re-ingesting it. The file is
+#
+#   MAGIC | header length (8 bytes, little-endian) | JSON header | sections
+#
+# where every section is a raw array, 8-byte aligned, located by
+# (typecode, offset, length) in the header. Loading maps the file and
+# casts each section to a memoryview in place; nothing is parsed or copied
+# until a query reads it, and string properties are decoded per lookup.
+
+MAGIC = b"CHSNAP1\n"
+
+# always kept; properties the catalog reads are added on save
+KEY_PROPERTIES = ("name", "objectid", "owned", "highvalue", "enabled")
+
+
+# ------------------------------------------------------------------------- #
+# property columns over mapped sections
+# ------------------------------------------------------------------------- #
+class _ScalarColumn:
+    """bool / int property: one value per node, `present` marks the set ones."""
+
+    def __init__(self, present, values, convert):
+        self.present, self.values, self.convert = present, values, convert
+
+    def get(self, node: int):
+        return self.convert(self.values[node]) if self.present[node] else None
+
+    def items(self) -> Iterator[tuple[int, object]]:
+        values, convert = self.values, self.convert
+        for node, flag in enumerate(self.present):
+            if flag:
+                yield node, convert(values[node])
+
+
+class _BlobColumn:
+    """str / other property: node i's encoded value is blob[offsets[i]:offsets[i+1]]."""
+
+    def __init__(self, present, offsets, blob, decode):
+        self.present, self.offsets, self.blob, self.decode = present, offsets, blob, decode
+
+    def get(self, node: int):
+        if not self.present[node]:
+            return None
+        return self.decode(self.blob[self.offsets[node]:self.offsets[node + 1]])
+
+    def items(self) -> Iterator[tuple[int, object]]:
+        offsets, blob, decode = self.offsets, self.blob, self.decode
+        for node, flag in enumerate(self.present):
+            if flag:
+                yield node, decode(blob[offsets[node]:offsets[node + 1]])
+
+
+def _utf8(raw) -> str:
+    return str(raw, "utf-8")
+
+
+def _json(raw):
+    return json.loads(str(raw, "utf-8"))
+
+
+_DECODERS = {"str": _utf8, "json": _json}
+_CONVERTERS = {"bool": bool, "int": int}
+
+
+# ------------------------------------------------------------------------- #
+# save / load
+# ------------------------------------------------------------------------- #
+def _kind(values: list) -> str:
+    if all(isinstance(v, bool) for v in values):
+        return "bool"
+    if all(isinstance(v, int) and not isinstance(v, bool) and -2**63 <= v < 2**63 for v in values):
+        return "int"
+    if all(isinstance(v, str) for v in values):
+        return "str"
+    return "json"
+
+
+def save(graph: Graph, path: str | FilePath, properties: set[str] | None = None,
+         source: str = "") -> int:
+    """
+    Write `graph` to `path` with the given node `properties` (all of them if
+    None). Returns the file size in bytes.
+    """
+    n = graph.node_count
+    sections: list[tuple[str, memoryview]] = [
+        ("label_mask", memoryview(graph.label_mask)),
+        ("out_offsets", memoryview(graph.out_offsets)),
+        ("edge_src", memoryview(graph.edge_src)),
+        ("edge_dst", memoryview(graph.edge_dst)),
+        ("edge_type", memoryview(graph.edge_type)),
+        ("in_offsets", memoryview(graph.in_offsets)),
+        ("in_edges", memoryview(graph.in_edges)),
+    ]
+    columns = {}
+    for name, column in sorted(graph.props.items()):
+        if properties is not None and name not in properties:
+            continue
+        values = dict(column.items())
+        if not values:
+            continue
+        kind = _kind(list(values.values()))
+        present = array("B", bytes(n))
+        for node in values:
+            present[node] = 1
+        sections.append((f"{name}.present", memoryview(present)))
+        if kind in _CONVERTERS:
+            scalars = array("q", bytes(8 * n))
+            for node, value in values.items():
+                scalars[node] = value
+            sections.append((f"{name}.values", memoryview(scalars)))
+        else:
+            offsets, blob = array("Q", bytes(8 * (n + 1))), bytearray()
+            for node in range(n):
+                if node in values:
+                    value = values[node]
+                    blob += (value if kind == "str" else json.dumps(value)).encode("utf-8")
+                offsets[node + 1] = len(blob)
+            sections.append((f"{name}.offsets", memoryview(offsets)))
+            sections.append((f"{name}.blob", memoryview(blob)))
+        columns[name] = kind
+
+    header = {
+        "version": 1,
+        "byteorder": sys.byteorder,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "source": source,
+        "nodes": n,
+        "edges": graph.edge_count,
+        "labels": graph.label_names,
+        "types": graph.type_names,
+        "columns": columns,
+        "sections": {},
+    }
+    # the header records section offsets, which depend on the header's own
+    # length: lay out against a padded estimate, then pad to it exactly
+    placeholder = len(json.dumps({**header, "sections": {
+        name: [view.format, 2**63, 2**63] for name, view in sections}}).encode())
+    offset = _align(len(MAGIC) + 8 + placeholder)
+    for name, view in sections:
+        header["sections"][name] = [view.format, offset, view.nbytes]
+        offset = _align(offset + view.nbytes)
+    raw_header = json.dumps(header).encode().ljust(placeholder)
+
+    tmp = FilePath(f"{path}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + len(raw_header).to_bytes(8, "little") + raw_header)
+        for name, view in sections:
+            f.seek(header["sections"][name][1])
+            f.write(view.cast("B") if view.nbytes else b"")
+        f.truncate(offset)
+    os.replace(tmp, path)
+    return offset
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def is_snapshot(path: str | FilePath) -> bool:
+    path = FilePath(path)
+    if not path.is_file():
+        return False
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_header(path: str | FilePath) -> dict:
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise RuntimeError(f"{path} is not a cypherhound snapshot")
+        size = int.from_bytes(f.read(8), "little")
+        return json.loads(f.read(size))
+
+
+def load(path: str | FilePath) -> Graph:
+    """Map the snapshot at `path` read-only and return a Graph over it."""
+    header = read_header(path)
+    if header["version"] != 1:
+        raise RuntimeError(f"{path}: unsupported snapshot version {header['version']}")
+    if header["byteorder"] != sys.byteorder:
+        raise RuntimeError(f"{path}: snapshot was written on a {header['byteorder']}-endian machine")
+
+    with open(path, "rb") as f:
+        # the mapping outlives the file object and lives as long as the views on it
+        data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def section(name: str) -> memoryview:
+        fmt, offset, length = header["sections"][name]
+        return data[offset:offset + length].cast(fmt)
+
+    props = {}
+    for name, kind in header["columns"].items():
+        present = section(f"{name}.present")
+        if kind in _CONVERTERS:
+            props[name] = _ScalarColumn(present, section(f"{name}.values"), _CONVERTERS[kind])
+        else:
+            props[name] = _BlobColumn(present, section(f"{name}.offsets"), section(f"{name}.blob"),
+                                      _DECODERS[kind])
+    return Graph(header["labels"], section("label_mask"), props, header["types"],
+                 section("out_offsets"), section("edge_src"), section("edge_dst"),
+                 section("edge_type"), section("in_offsets"), section("in_edges"))
+
+
+# ------------------------------------------------------------------------- #
+# `snapshot save`
+# ------------------------------------------------------------------------- #
+def run_save(driver, path: str, extra: list[str] | None = None) -> None:
+    """
+    Snapshot `driver`'s graph (Neo4j, or the offline source) to `path`,
+    keeping KEY_PROPERTIES, every property the loaded catalog reads and
+    `extra`, so the whole catalog runs against the snapshot.
+    """
+    properties = {*KEY_PROPERTIES, *driver.query_properties(), *(extra or [])}
+    start = time.perf_counter()
+    graph = driver.in_memory_graph(properties)
+    size = save(graph, path, properties, source=driver.offline or driver.uri)
+    log_green(f"[+] Saved {graph.node_count:,} nodes, {graph.edge_count:,} edges and "
+              f"{len(properties)} properties to {path} ({size / 2**20:.1f} MiB) "
+              f"in {time.perf_counter() - start:.1f}s")
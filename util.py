@@ -1,14 +1,47 @@
 import log
 import re
+import argparse
 import os
+import sys
 
 
 list_options = ["general", "user", "group", "computer", "regex", "all"]
 set_options = ["user", "group", "computer", "regex"]
 
 
-def validate_export_command(f):
-    result = 'exports/' + re.sub(r'(.txt|/)', '', f) + '.txt'
+def id_list(value: str) -> list[int]:
+    """
+    Parse a single CLI token into a list of ints.
+    Accepts comma-separated values and ranges, e.g. 1,3,5-7
+    """
+    ids: set[int] = set()
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            a, b = part.split('-', 1)
+            ids.update(range(int(a), int(b) + 1))
+        else:
+            ids.add(int(part))
+    if not ids:
+        raise argparse.ArgumentTypeError('no valid IDs found')
+    return sorted(ids)
+
+
+def positive_int(value: str) -> int:
+    """argparse type for options such as --jobs and --fetch-size."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a number")
+    if number < 1:
+        raise argparse.ArgumentTypeError('must be at least 1')
+    return number
+
+
+def validate_export_command(f, ext='txt'):
+    result = 'exports/' + re.sub(rf'(\.{ext}|/)', '', f) + f'.{ext}'
     return result
 
 
@@ -53,25 +86,66 @@ def handle_export(count, path):
         log.log_successful_export(path)
 
 
+_ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+
+
 def strip_ansi_escape_sequences(text):
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_escape.sub('', text)        
+    return _ANSI_ESCAPE.sub('', text)
 
 
 # Color work
+color_modes = ["auto", "always", "never"]
+_color_mode = "auto"
+# the mode resolved against stdout, so wrapping a value costs no isatty() call
+_color = sys.stdout.isatty()
+
+
+def _resolve(stream) -> bool:
+    if _color_mode == "auto":
+        return hasattr(stream, "isatty") and stream.isatty()
+    return _color_mode == "always"
+
+
+def set_color_mode(mode):
+    global _color_mode
+    if mode not in color_modes:
+        raise ValueError(f"Color mode must be one of: {', '.join(color_modes)}")
+    _color_mode = mode
+    refresh_color()
+
+
+def refresh_color():
+    """Resolve the mode again for stdout and the status stream, e.g. after the shell redirected stdout."""
+    global _color
+    _color = _resolve(sys.stdout)
+    log.set_color(_resolve(log.stream or sys.stdout))
+
+
+def color_enabled():
+    """True when terminal output should carry ANSI colour codes."""
+    return _color
+
+
 def redify(value):
+    if not _color:
+        return str(value)
     return f"{log.red}{value}{log.reset}"
 
 
 def greenify(value):
+    if not _color:
+        return str(value)
     return f"{log.green}{value}{log.reset}"
 
 
 def yellowify(value):
+    if not _color:
+        return str(value)
     return f"{log.yellow}{value}{log.reset}"
 
 
 def deep_redify(obj):
+    # callers check color_enabled() once per query rather than per value
     if isinstance(obj, (str, int, float, bool)):
         return log.red + str(obj) + log.reset
     if isinstance(obj, list):